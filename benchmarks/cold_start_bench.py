@@ -0,0 +1,93 @@
+"""Cold start of a fresh process: import, create_app and the schema check.
+
+Each run is a new interpreter against the same SQLite file, so the first
+run creates and stamps the schema and the rest take the fast path. Exits
+with status 1 when the median import + create_app + schema time is over
+the budget, so CI catches startup regressions.
+
+    python benchmarks/cold_start_bench.py --runs 10 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import json, time
+started = time.perf_counter()
+from wanderlust import create_app, db
+from wanderlust.schema import ensure_schema
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+with app.app_context():
+    schema = ensure_schema(db)
+finished = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'schema_ms': (finished - created) * 1000,
+    'schema': schema,
+    'steps': app.extensions['startup'].stats()['steps']
+}))
+"""
+
+
+def run_once(env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', SCRIPT], capture_output=True, text=True, env=env, cwd=ROOT)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = wall_ms
+    sample['total_ms'] = sample['import_ms'] + sample['create_app_ms'] + sample['schema_ms']
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('COLD_START_BUDGET_MS', 1500)),
+                        help='Fail when the median import + create_app + schema time exceeds this.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ,
+                   PYTHONPATH=ROOT,
+                   DATABASE_URL=f"sqlite:///{os.path.join(directory, 'cold_start.db')}",
+                   ASSET_BUILD_DIR=os.path.join(directory, 'assets'),
+                   EXPIRY_SCHEDULER='0',
+                   CONTENT_POOL_SIZE='0',
+                   STARTUP_PROFILE='0')
+        first = run_once(env)
+        samples = [run_once(env) for _ in range(args.runs)]
+
+    print(f"first run (schema {first['schema']}): {first['total_ms']:.1f} ms, "
+          f"process {first['process_ms']:.1f} ms")
+    print(f"{args.runs} warm runs (schema {samples[-1]['schema']})")
+    print(f"{'phase':14s} {'p50 ms':>8s} {'max ms':>8s}")
+    for phase in ('import_ms', 'create_app_ms', 'schema_ms', 'total_ms', 'process_ms'):
+        values = [sample[phase] for sample in samples]
+        print(f"{phase[:-3]:14s} {statistics.median(values):8.1f} {max(values):8.1f}")
+
+    print('\nslowest create_app steps (p50 ms)')
+    steps = {name: statistics.median(sample['steps'][name] for sample in samples) for name in samples[0]['steps']}
+    for name, elapsed_ms in sorted(steps.items(), key=lambda step: -step[1])[:8]:
+        print(f"  {elapsed_ms:8.1f}  {name}")
+
+    median = statistics.median(sample['total_ms'] for sample in samples)
+    if median > args.budget_ms:
+        print(f"\nFAIL: cold start p50 {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+        sys.exit(1)
+    print(f"\nok: cold start p50 {median:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
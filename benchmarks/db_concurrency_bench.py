@@ -0,0 +1,111 @@
+"""SQLite write throughput under concurrency, before and after the engine tuning.
+
+Writer threads award points (ledger insert plus an atomic balance UPDATE,
+one transaction each) while reader threads run the per-user list queries.
+The "baseline" engine uses SQLite's defaults (rollback journal,
+synchronous=FULL); "tuned" applies the pragmas from wanderlust.database
+(WAL, synchronous=NORMAL, busy_timeout, mmap and cache size).
+
+    python benchmarks/db_concurrency_bench.py --writers 8 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from wanderlust.database import configure_engine, engine_options, init_database_config
+
+SCHEMA = [
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, points INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE points_ledger (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, source_id INTEGER NOT NULL, delta INTEGER NOT NULL)',
+    'CREATE INDEX ix_points_ledger_user ON points_ledger (user_id, id)',
+]
+
+
+def run(mode, args):
+    path = os.path.join(tempfile.mkdtemp(), f'{mode}.db')
+    uri = f'sqlite:///{path}'
+    app = Flask('bench')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    init_database_config(app)
+    if mode == 'tuned':
+        engine = create_engine(uri, **engine_options(uri, app.config))
+        configure_engine(engine, app.config)
+    else:
+        # What create_app() used before: default engine options and pragmas
+        engine = create_engine(uri)
+
+    with engine.begin() as conn:
+        for statement in SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(text('INSERT INTO user (id) VALUES (:id)'), [{'id': i} for i in range(1, args.users + 1)])
+
+    counts = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + args.seconds
+
+    def count(name):
+        with lock:
+            counts[name] += 1
+
+    def writer(worker):
+        sequence = 0
+        while time.monotonic() < stop:
+            sequence += 1
+            user_id = (worker * 7919 + sequence) % args.users + 1
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text('INSERT INTO points_ledger (user_id, source_id, delta) VALUES (:user_id, :source_id, 10)'),
+                                 {'user_id': user_id, 'source_id': worker * 10 ** 7 + sequence})
+                    conn.execute(text('UPDATE user SET points = points + 10 WHERE id = :user_id'), {'user_id': user_id})
+                count('writes')
+            except OperationalError:
+                count('write_errors')
+
+    def reader(worker):
+        sequence = 0
+        while time.monotonic() < stop:
+            sequence += 1
+            user_id = (worker * 104729 + sequence) % args.users + 1
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text('SELECT id, delta FROM points_ledger WHERE user_id = :user_id ORDER BY id DESC LIMIT 20'),
+                                 {'user_id': user_id}).fetchall()
+                    conn.execute(text('SELECT points FROM user WHERE id = :user_id'), {'user_id': user_id}).scalar()
+                count('reads')
+            except OperationalError:
+                count('read_errors')
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(f"{mode:9s} writes {counts['writes'] / args.seconds:8.0f}/s  errors {counts['write_errors']:6d}   "
+          f"reads {counts['reads'] / args.seconds:8.0f}/s  errors {counts['read_errors']:6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    for mode in ('baseline', 'tuned'):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Local stand-in for the OpenRouter chat completions API.
+
+Answers ``POST /chat/completions`` with well-formed activity, quest,
+challenge and batch JSON (the same for the same seed and request), so the
+generation paths run without network access. Latency, jitter and the
+share of failed calls (503, or 429 with a ``Retry-After``) are
+configurable. ``"stream": true`` requests get the content as server-sent
+event deltas.
+
+    python benchmarks/fake_openrouter.py --port 8090 --latency-ms 300 --error-rate 0.05
+    OPENROUTER_BASE_URL=http://127.0.0.1:8090 OPENROUTER_API_KEY=fake python run.py
+"""
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+
+
+def fake_item(kind, rng, n):
+    if kind == 'activity':
+        return {
+            'title': f"Churchgate walk #{n}",
+            'description': 'Start at the station, follow the Oval Maidan and finish with chai. ' * rng.randint(1, 4),
+            'duration': rng.choice([45, 60, 90, 120]),
+            'location': 'Churchgate, Mumbai'
+        }
+    if kind == 'quest':
+        return {
+            'title': f"Quest of the old fort #{n}",
+            'description': 'A trail through the Fort precinct. ' * rng.randint(1, 4),
+            'duration': rng.choice([90, 150, 210]),
+            'steps': [{'title': f"Step {i + 1}", 'description': 'Find the landmark and take a photo.'}
+                      for i in range(rng.randint(3, 5))]
+        }
+    activities = [{'description': f"Task {i + 1}: ask a local about the area.", 'time_limit': rng.choice([15, 30, 45]),
+                   'completed': False, 'points': rng.choice([10, 20, 30])} for i in range(rng.randint(3, 6))]
+    return {
+        'title': f"Marine Drive dash #{n}",
+        'description': 'Beat the clock along the promenade.',
+        'activities': activities,
+        'total_time_limit': sum(activity['time_limit'] for activity in activities),
+        'time_limit': sum(activity['time_limit'] for activity in activities),
+        'points_reward': sum(activity['points'] for activity in activities)
+    }
+
+
+def detect_kind(payload):
+    """The generation kind (and batch size) from the request's prompts."""
+    messages = payload.get('messages') or [{}]
+    system = messages[0].get('content', '')
+    prompt = messages[-1].get('content', '')
+    kind = 'activity'
+    if 'challenge' in system:
+        kind = 'challenge'
+    elif 'ONLY return a JSON object' in system:
+        kind = 'quest'
+    batch = re.match(r'Create (\d+) distinct', prompt)
+    return kind, int(batch.group(1)) if batch else None
+
+
+class FakeOpenRouter:
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, chunk_ms=5.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.chunk_ms = chunk_ms
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'streams': 0, 'errors': 0}
+        self.server = None
+        self.thread = None
+
+    def start(self, host='127.0.0.1', port=0):
+        """Serve in a background thread; returns the base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                fake.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-openrouter', daemon=True)
+        self.thread.start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def handle(self, handler):
+        body = handler.rfile.read(int(handler.headers.get('Content-Length') or 0))
+        payload = json.loads(body or b'{}')
+        with self.lock:
+            self.counters['requests'] += 1
+            n = self.counters['requests']
+            failed = self.rng.random() < self.error_rate
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+        # Content depends only on the seed and the request, not on the order
+        # concurrent requests arrive in
+        rng = random.Random(f"{self.seed}:{body.decode('utf-8', 'replace')}")
+        kind, batch = detect_kind(payload)
+        if batch:
+            content = {'items': [fake_item(kind, rng, rng.randint(1, 9999)) for _ in range(batch)]}
+        else:
+            content = fake_item(kind, rng, rng.randint(1, 9999))
+
+        if failed:
+            with self.lock:
+                self.counters['errors'] += 1
+            status = 429 if n % 2 else 503
+            self.respond(handler, status, {'error': {'message': 'Simulated upstream failure'}},
+                         {'Retry-After': '0.05'} if status == 429 else {})
+            return
+
+        text = json.dumps(content)
+        if payload.get('stream'):
+            with self.lock:
+                self.counters['streams'] += 1
+            self.stream(handler, text, delay)
+            return
+        time.sleep(delay)
+        self.respond(handler, 200, {
+            'id': f"fake-{n}",
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(json.dumps(payload)) // 4, 'completion_tokens': len(text) // 4,
+                      'total_tokens': (len(json.dumps(payload)) + len(text)) // 4}
+        })
+
+    def respond(self, handler, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def stream(self, handler, text, first_token_delay):
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        time.sleep(first_token_delay)
+        for start in range(0, len(text), 40):
+            chunk = {'choices': [{'index': 0, 'delta': {'content': text[start:start + 40]}}]}
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+            time.sleep(self.chunk_ms / 1000)
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--chunk-ms', type=float, default=5, help='Delay between streamed chunks.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(args.latency_ms, args.jitter_ms, args.error_rate, args.chunk_ms, args.seed)
+    print(f"Fake OpenRouter listening on {fake.start(args.host, args.port)}")
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
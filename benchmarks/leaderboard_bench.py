@@ -0,0 +1,75 @@
+"""Leaderboard lookup latency with a large synthetic user base.
+
+Loads a ``RankedSet`` with power-law point totals, then times incremental
+awards, rank lookups and top-K pages, and compares a rank lookup with the
+naive "count users with more points" scan.
+
+    python benchmarks/leaderboard_bench.py --users 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wanderlust.leaderboard import RankedSet
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(int(len(samples) * q), len(samples) - 1)]
+    return f"p50 {pick(0.5):7.2f}us  p95 {pick(0.95):7.2f}us  p99 {pick(0.99):7.2f}us"
+
+
+def timed(operation, count):
+    samples = []
+    for _ in range(count):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--operations', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scores = {user_id: int(rng.paretovariate(1.2) * 10) for user_id in range(1, args.users + 1)}
+
+    started = time.perf_counter()
+    board = RankedSet()
+    board.load(scores)
+    print(f"load {args.users} users: {time.perf_counter() - started:.2f}s")
+
+    user_ids = [rng.randint(1, args.users) for _ in range(args.operations)]
+    points = [rng.choice((10, 25, 50, 100, 200, 300)) for _ in range(args.operations)]
+    position = iter(range(args.operations))
+
+    def award():
+        i = next(position)
+        board.add(user_ids[i], points[i])
+
+    print(f"award    {percentiles(timed(award, args.operations))}")
+    lookups = iter(user_ids)
+    print(f"rank     {percentiles(timed(lambda: board.rank(next(lookups)), args.operations))}")
+    print(f"top 10   {percentiles(timed(lambda: board.top(10), args.operations))}")
+    offsets = iter(rng.randint(0, args.users - 50) for _ in range(args.operations))
+    print(f"page 50  {percentiles(timed(lambda: board.top(50, next(offsets)), args.operations))}")
+
+    # What "what's my rank" costs without the index: one pass over every user
+    user_id = user_ids[0]
+    started = time.perf_counter()
+    mine = board.scores[user_id]
+    rank = 1 + sum(1 for other, score in board.scores.items()
+                   if score > mine or (score == mine and other < user_id))
+    print(f"scan     {(time.perf_counter() - started) * 1e6:9.0f}us (rank {rank} == {board.rank(user_id)})")
+
+
+if __name__ == '__main__':
+    main()
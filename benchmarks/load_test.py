@@ -0,0 +1,262 @@
+"""Seeded load test of the main user journey against a local fake LLM.
+
+Every virtual user registers, logs in, and then for each iteration:
+- generates an activity and completes it;
+- generates a quest and completes it;
+- generates a challenge, accepts it and completes its activities;
+- streams one generation;
+- views the home, profile, quests and challenges pages and the JSON lists.
+
+Users run in a thread pool of ``--concurrency`` workers. Each one drives the
+app in-process with its own test client, so the numbers are server-side
+time without network or WSGI server overhead. Generation calls go to
+``fake_openrouter.FakeOpenRouter``. Queued jobs are timed from submit to
+finish as ``job <kind>``.
+
+The report gives p50/p95/p99 latency, throughput and SQL queries per request
+for each route. ``--save-baseline`` stores the report, and ``--check``
+compares a run with the stored one. The comparison exits 1 when a route
+runs more queries, has more errors, or its p50 is over ``--tolerance``
+slower. Query counts are exact across machines, while latencies are only
+comparable on the machine that recorded the baseline.
+
+    python benchmarks/load_test.py --users 20 --concurrency 4 --iterations 2 --check
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openrouter import FakeOpenRouter
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'load_test.json')
+# Absolute slack on top of --tolerance, so sub-millisecond routes don't flap
+SLACK_MS = 10.0
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Recorder:
+    """Per-route latency samples, errors and SQL statement counts."""
+
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def count_query(self, *args):
+        if getattr(self.local, 'queries', None) is not None:
+            self.local.queries += 1
+
+    def request(self, client, method, path, route, expect=(200,), **kwargs):
+        self.local.queries = 0
+        started = time.perf_counter()
+        response = getattr(client, method)(path, **kwargs)
+        response.get_data()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        queries, self.local.queries = self.local.queries, None
+        self.add(route, elapsed_ms, queries, response.status_code not in expect)
+        return response
+
+    def add(self, route, elapsed_ms, queries=None, error=False):
+        with self.lock:
+            sample = self.samples.setdefault(route, {'ms': [], 'queries': [], 'errors': 0})
+            sample['ms'].append(elapsed_ms)
+            if queries is not None:
+                sample['queries'].append(queries)
+            sample['errors'] += error
+
+    def report(self, elapsed_s):
+        routes = {}
+        for route, sample in sorted(self.samples.items()):
+            values = sample['ms']
+            routes[route] = {
+                'requests': len(values),
+                'errors': sample['errors'],
+                'p50_ms': round(percentile(values, 0.50), 2),
+                'p95_ms': round(percentile(values, 0.95), 2),
+                'p99_ms': round(percentile(values, 0.99), 2),
+                'throughput_rps': round(len(values) / elapsed_s, 1),
+                'queries_per_request': round(statistics.mean(sample['queries']), 2) if sample['queries'] else None
+            }
+        total = sum(route['requests'] for name, route in routes.items() if not name.startswith('job '))
+        return {'elapsed_s': round(elapsed_s, 2), 'requests': total,
+                'throughput_rps': round(total / elapsed_s, 1), 'routes': routes}
+
+
+class Scenario:
+    def __init__(self, app, recorder, args):
+        self.app = app
+        self.recorder = recorder
+        self.args = args
+
+    def generate(self, client, path, route, kind, data):
+        """Start a generation and wait for its job; returns the stored item."""
+        from wanderlust import generation_queue
+
+        response = self.recorder.request(client, 'post', path, route, expect=(200, 202), data=dict(data, cache='bypass'))
+        body = response.get_json() or {}
+        if response.status_code == 200:
+            return body.get(kind)
+        if response.status_code != 202:
+            return None
+        started = time.perf_counter()
+        job = generation_queue.get(body['job_id'])
+        job.done.wait(60)
+        self.recorder.add(f"job {kind}", (time.perf_counter() - started) * 1000, error=job.status != 'done')
+        status = self.recorder.request(client, 'get', f"/jobs/{body['job_id']}", 'GET /jobs/<id>').get_json()
+        result = status['job']['result'] or {}
+        return result.get(kind)
+
+    def run(self, user_number):
+        rng = random.Random(self.args.seed * 100003 + user_number)
+        request = self.recorder.request
+        client = self.app.test_client()
+        name = f"load{user_number}"
+        request(client, 'post', '/register', 'POST /register', expect=(302,), data=dict(
+            username=name, email=f"{name}@example.com", password='secret', confirm_password='secret', terms='1'))
+        request(client, 'get', '/logout', 'GET /logout', expect=(302,))
+        request(client, 'post', '/login', 'POST /login', expect=(302,), data=dict(username=name, password='secret'))
+
+        for _ in range(self.args.iterations):
+            activity = self.generate(client, '/generate_activity', 'POST /generate_activity', 'activity', {
+                'category': rng.choice(['food', 'culture', 'adventure']),
+                'difficulty': rng.choice(['easy', 'medium', 'hard'])})
+            if activity:
+                request(client, 'post', f"/complete_activity/{activity['id']}", 'POST /complete_activity/<id>')
+
+            quest = self.generate(client, '/generate_quest', 'POST /generate_quest', 'quest', {
+                'difficulty': rng.choice(['easy', 'medium', 'hard'])})
+            if quest:
+                request(client, 'post', f"/complete_quest/{quest['id']}", 'POST /complete_quest/<id>')
+
+            challenge = self.generate(client, '/challenges/generate', 'POST /challenges/generate', 'challenge', {
+                'difficulty': rng.choice(['easy', 'medium', 'hard'])})
+            if challenge:
+                request(client, 'post', f"/challenges/accept/{challenge['id']}", 'POST /challenges/accept/<id>')
+                for index in range(len(challenge['activities'])):
+                    request(client, 'post', f"/challenges/complete-activity/{challenge['id']}/{index}",
+                            'POST /challenges/complete-activity/<id>/<index>')
+
+            request(client, 'post', '/generate_activity/stream', 'POST /generate_activity/stream',
+                    data={'category': 'food', 'difficulty': 'easy', 'cache': 'bypass'})
+
+            for path in ['/', '/profile', '/quests', '/challenges', '/active_quests', '/challenges/active',
+                         '/get_points', '/leaderboard']:
+                request(client, 'get', path, f"GET {path}")
+
+
+def compare(report, baseline, tolerance):
+    """Regressions of ``report`` against ``baseline``, as messages."""
+    problems = []
+    for route, base in baseline['routes'].items():
+        current = report['routes'].get(route)
+        if current is None:
+            continue
+        if base['queries_per_request'] is not None and current['queries_per_request'] is not None \
+                and current['queries_per_request'] > base['queries_per_request'] + 0.5:
+            problems.append(f"{route}: {current['queries_per_request']} queries per request "
+                            f"(baseline {base['queries_per_request']})")
+        # p50 rather than p95: tails of a short run are too noisy to gate on
+        limit = base['p50_ms'] * (1 + tolerance) + SLACK_MS
+        if current['p50_ms'] > limit:
+            problems.append(f"{route}: p50 {current['p50_ms']} ms (baseline {base['p50_ms']} ms, limit {limit:.1f} ms)")
+        if current['errors'] > base['errors']:
+            problems.append(f"{route}: {current['errors']} errors (baseline {base['errors']})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=2, help='Journeys per user.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--llm-latency-ms', type=float, default=20)
+    parser.add_argument('--llm-jitter-ms', type=float, default=5)
+    parser.add_argument('--llm-error-rate', type=float, default=0.0)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='Exit 1 on a regression against the baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed p50 slowdown, as a fraction.')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+    args = parser.parse_args()
+
+    fake = FakeOpenRouter(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, seed=args.seed)
+    base_url = fake.start()
+    directory = tempfile.mkdtemp()
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'load.db')}",
+        'ASSET_BUILD_DIR': os.path.join(directory, 'assets'),
+        'OPENROUTER_BASE_URL': base_url,
+        'OPENROUTER_API_KEY': 'fake',
+        'OPENROUTER_BACKOFF': '0.01',
+        'CONTENT_POOL_SIZE': '0',
+        'EXPIRY_SCHEDULER': '0',
+        'GENERATION_QUEUE_SIZE': str(max(100, args.concurrency * 4))
+    })
+
+    from sqlalchemy import event
+    from wanderlust import create_app, db
+    from wanderlust.schema import ensure_schema
+
+    app = create_app()
+    recorder = Recorder()
+    with app.app_context():
+        ensure_schema(db)
+        event.listen(db.engine, 'before_cursor_execute', recorder.count_query)
+
+    scenario = Scenario(app, recorder, args)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(scenario.run, range(args.users)))
+    report = recorder.report(time.perf_counter() - started)
+    report['config'] = {key: getattr(args, key) for key in
+                        ('users', 'concurrency', 'iterations', 'seed', 'llm_latency_ms', 'llm_error_rate')}
+    report['llm'] = fake.stats()
+    fake.stop()
+
+    if args.json:
+        print(json.dumps(report, indent=1))
+    else:
+        print(f"{report['requests']} requests in {report['elapsed_s']} s, {report['throughput_rps']} req/s "
+              f"({args.users} users, concurrency {args.concurrency}); LLM {report['llm']}")
+        print(f"{'route':50s} {'n':>5s} {'err':>4s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'req/s':>7s} {'queries':>8s}")
+        for route, row in report['routes'].items():
+            queries = '' if row['queries_per_request'] is None else f"{row['queries_per_request']:.1f}"
+            print(f"{route:50s} {row['requests']:5d} {row['errors']:4d} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} "
+                  f"{row['p99_ms']:8.1f} {row['throughput_rps']:7.1f} {queries:>8s}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print(f"Warning: baseline was recorded with {baseline.get('config')}")
+        problems = compare(report, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print('No regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
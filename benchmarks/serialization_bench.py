@@ -0,0 +1,98 @@
+"""Latency and allocations of a 1000-row list response, per serialization path.
+
+"orm" is the old path: full Quest entities (with their step rows loaded
+by selectin) turned into dicts with ``to_dict()`` and encoded with the
+stdlib provider. "projected" selects only the response columns as tuples
+and loads the page's steps in one query; it is encoded with the stdlib
+provider and with orjson.
+
+    python benchmarks/serialization_bench.py --rows 1000 --steps 4 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('CONTENT_POOL_SIZE', '0')
+os.environ.setdefault('EXPIRY_SCHEDULER', '0')
+
+from flask.json.provider import DefaultJSONProvider
+
+from wanderlust import create_app, db
+from wanderlust.models import Quest, QuestStep, User
+from wanderlust.serialization import OrjsonProvider, orjson, quest_dicts, quest_rows
+
+
+def seed(rows, steps):
+    db.session.add(User(username='bench', email='bench@example.com', password_hash='x'))
+    db.session.flush()
+    for i in range(rows):
+        quest = Quest(title=f'Quest {i}', description='A walk through the old town. ' * 20,
+                      difficulty='medium', duration=120, user_id=1, points=200)
+        quest.step_rows = [QuestStep(position=n, title=f'Step {n}', description='Find the market. ' * 5)
+                           for n in range(steps)]
+        quest.steps_total = steps
+        db.session.add(quest)
+    db.session.commit()
+
+
+def orm_path(provider, limit):
+    quests = Quest.query.filter_by(user_id=1).order_by(Quest.created_at.desc(), Quest.id.desc()).limit(limit).all()
+    return provider.response({'items': [quest.to_dict() for quest in quests], 'next': None})
+
+
+def projected_path(provider, limit):
+    rows = quest_rows().filter(Quest.user_id == 1).order_by(Quest.created_at.desc(), Quest.id.desc()).limit(limit).all()
+    return provider.response({'items': quest_dicts(rows), 'next': None})
+
+
+def measure(path, provider, args):
+    timings = []
+    for _ in range(args.repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        body = path(provider, args.rows).get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    path(provider, args.rows).get_data()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return statistics.median(timings), min(timings), blocks, peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed(args.rows, args.steps)
+        paths = [('orm + json', orm_path, DefaultJSONProvider(app)),
+                 ('projected + json', projected_path, DefaultJSONProvider(app))]
+        if orjson is not None:
+            paths.append(('projected + orjson', projected_path, OrjsonProvider(app)))
+        else:
+            print('orjson is not installed; skipping the orjson path')
+
+        print(f"{args.rows} rows, {args.steps} steps each")
+        print(f"{'path':20s} {'p50 ms':>8s} {'min ms':>8s} {'alloc blocks':>13s} {'peak KiB':>9s} {'bytes':>9s}")
+        for name, path, provider in paths:
+            p50, fastest, blocks, peak, size = measure(path, provider, args)
+            print(f"{name:20s} {p50:8.1f} {fastest:8.1f} {blocks:13d} {peak / 1024:9.0f} {size:9d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+"""Add completed_at to Activity
+
+Records when an activity was completed, so time-windowed leaderboards can
+be rebuilt from the database. Activities completed before this migration
+keep a NULL timestamp and only count towards all-time boards.
+"""
+from sqlalchemy import text
+from wanderlust.schema import column_names
+
+def upgrade(db):
+    """Add the completed_at column"""
+    if 'completed_at' in column_names(db, 'activity'):
+        return
+    db.session.execute(text('ALTER TABLE activity ADD COLUMN completed_at DATETIME'))
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the completed_at column"""
+    db.session.execute(text('ALTER TABLE activity DROP COLUMN completed_at'))
+    db.session.commit()
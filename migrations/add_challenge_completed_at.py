@@ -4,9 +4,12 @@ This migration adds the completed_at datetime field to the Challenge model
 to track when challenges are completed.
 """
 from sqlalchemy import text
+from wanderlust.schema import column_names
 
 def upgrade(db):
     """Add completed_at column to challenge table"""
+    if 'completed_at' in column_names(db, 'challenge'):
+        return
     # Add the completed_at column
     db.session.execute(text('ALTER TABLE challenge ADD COLUMN completed_at DATETIME'))
     
@@ -0,0 +1,37 @@
+"""Add acceptance and expiry columns to Challenge
+
+Adds accepted / accepted_at, the expires_at deadline (filled in as
+created_at plus time_limit minutes) and expired_at, which the expiry
+scheduler sets. Challenges already past their deadline are marked expired
+by the scheduler when the app next starts.
+"""
+from sqlalchemy import text
+from wanderlust.schema import column_names
+
+COLUMNS = [
+    ('accepted', 'BOOLEAN NOT NULL DEFAULT 0'),
+    ('accepted_at', 'DATETIME'),
+    ('expires_at', 'DATETIME'),
+    ('expired_at', 'DATETIME'),
+]
+
+def upgrade(db):
+    """Add the columns, fill expires_at and index pending deadlines"""
+    existing = column_names(db, 'challenge')
+    for column, definition in COLUMNS:
+        if column not in existing:
+            db.session.execute(text(f'ALTER TABLE challenge ADD COLUMN {column} {definition}'))
+    # Same text format SQLAlchemy writes, so comparisons stay lexical
+    db.session.execute(text(
+        "UPDATE challenge SET expires_at = strftime('%Y-%m-%d %H:%M:%f000', created_at, '+' || time_limit || ' minutes') "
+        "WHERE expires_at IS NULL"))
+    db.session.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_challenge_pending_expiry ON challenge (completed, expired_at, expires_at)'))
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the columns"""
+    db.session.execute(text('DROP INDEX IF EXISTS ix_challenge_pending_expiry'))
+    for column, _ in COLUMNS:
+        db.session.execute(text(f'ALTER TABLE challenge DROP COLUMN {column}'))
+    db.session.commit()
@@ -0,0 +1,38 @@
+"""Add composite indexes for the per-user hot queries
+
+This migration adds the (user_id, status, timestamp) indexes used by the
+home, profile, quest and challenge pages, and a unique (user_id, title)
+index on achievements. Duplicate achievements are removed first, keeping
+the earliest unlock.
+"""
+from sqlalchemy import text
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_activity_user_completed_created ON activity (user_id, completed, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_activity_user_created ON activity (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_quest_user_completed_created ON quest (user_id, completed_at, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_quest_user_created ON quest (user_id, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_challenge_user_completed_created ON challenge (user_id, completed, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_challenge_user_completed_completed_at ON challenge (user_id, completed, completed_at)',
+    'CREATE UNIQUE INDEX IF NOT EXISTS uq_achievement_user_title ON achievement (user_id, title)',
+]
+
+def upgrade(db):
+    """Create the indexes"""
+    # The unique index cannot be built while duplicates exist
+    db.session.execute(text('''
+        DELETE FROM achievement
+        WHERE id NOT IN (SELECT MIN(id) FROM achievement GROUP BY user_id, title)
+    '''))
+
+    for statement in INDEXES:
+        db.session.execute(text(statement))
+
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the indexes"""
+    for statement in INDEXES:
+        name = statement.split(' ON ')[0].split()[-1]
+        db.session.execute(text(f'DROP INDEX IF EXISTS {name}'))
+    db.session.commit()
@@ -0,0 +1,17 @@
+"""Add an index for paging completed quests
+
+Completed quests are paged on (completed_at, id). The existing
+(user_id, completed_at, created_at) index puts created_at between the two,
+which forces a sort; this index keeps the rowid right after completed_at.
+"""
+from sqlalchemy import text
+
+def upgrade(db):
+    """Create the index"""
+    db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_quest_user_completed_at ON quest (user_id, completed_at)'))
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the index"""
+    db.session.execute(text('DROP INDEX IF EXISTS ix_quest_user_completed_at'))
+    db.session.commit()
@@ -0,0 +1,18 @@
+"""Add the points_ledger table
+
+This migration creates the ledger of points awards and fills it from the
+completed activities, quests and challenges and the unlocked achievements.
+Any difference from a user's current balance is recorded as an
+adjustment, so balances are unchanged.
+"""
+from wanderlust.models import PointsLedger
+from wanderlust.points import backfill_ledger
+
+def upgrade(db):
+    """Create and backfill points_ledger"""
+    PointsLedger.__table__.create(db.engine, checkfirst=True)
+    backfill_ledger()
+
+def downgrade(db):
+    """Drop points_ledger"""
+    PointsLedger.__table__.drop(db.engine, checkfirst=True)
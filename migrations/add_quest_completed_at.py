@@ -3,22 +3,26 @@
 This migration adds the completed_at timestamp field to the Quest model
 and removes the completed boolean field.
 """
-from alembic import op
-import sqlalchemy as sa
-from datetime import datetime
+from sqlalchemy import text
+from wanderlust.schema import column_names
 
-def upgrade():
+def upgrade(db):
+    """Add completed_at and points, and drop completed"""
+    existing = column_names(db, 'quest')
     # Add completed_at column
-    op.add_column('quest', sa.Column('completed_at', sa.DateTime, nullable=True))
-    op.add_column('quest', sa.Column('points', sa.Integer, nullable=False, server_default='0'))
-    
+    if 'completed_at' not in existing:
+        db.session.execute(text('ALTER TABLE quest ADD COLUMN completed_at DATETIME'))
+    if 'points' not in existing:
+        db.session.execute(text('ALTER TABLE quest ADD COLUMN points INTEGER NOT NULL DEFAULT 0'))
+
     # Drop completed column
-    op.drop_column('quest', 'completed')
+    if 'completed' in existing:
+        db.session.execute(text('ALTER TABLE quest DROP COLUMN completed'))
+    db.session.commit()
 
-def downgrade():
-    # Add back completed column
-    op.add_column('quest', sa.Column('completed', sa.Boolean, nullable=False, server_default='0'))
-    
-    # Drop completed_at column
-    op.drop_column('quest', 'completed_at')
-    op.drop_column('quest', 'points')
+def downgrade(db):
+    """Add back completed and drop completed_at and points"""
+    db.session.execute(text('ALTER TABLE quest ADD COLUMN completed BOOLEAN NOT NULL DEFAULT 0'))
+    db.session.execute(text('ALTER TABLE quest DROP COLUMN completed_at'))
+    db.session.execute(text('ALTER TABLE quest DROP COLUMN points'))
+    db.session.commit()
@@ -0,0 +1,97 @@
+"""Store challenge activities and quest steps as rows
+
+This migration creates the challenge_step and quest_step tables and adds
+steps_total / steps_completed counters to challenge and quest. It then
+explodes the JSON lists in challenge.activities and quest.steps into rows
+(keeping completion flags and times) and drops the JSON columns.
+"""
+from datetime import datetime
+import json
+from sqlalchemy import text
+from wanderlust.models import ChallengeStep, QuestStep
+from wanderlust.schema import column_names
+
+# (parent table, JSON column, step model, foreign key column)
+PARENTS = [
+    ('challenge', 'activities', ChallengeStep, 'challenge_id'),
+    ('quest', 'steps', QuestStep, 'quest_id'),
+]
+CHUNK_SIZE = 1000
+
+
+def _completed_at(item, fallback):
+    if not isinstance(item, dict) or not item.get('completed'):
+        return None
+    try:
+        return datetime.fromisoformat(item['completed_at'])
+    except (KeyError, TypeError, ValueError):
+        return fallback
+
+
+def explode(db, parent, column, step_model, parent_key):
+    last_id = 0
+    while True:
+        rows = db.session.execute(text(
+            f'SELECT id, {column}, created_at FROM {parent} WHERE id > :last_id ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': CHUNK_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        step_rows, counters = [], []
+        for parent_id, value, created_at in rows:
+            items = json.loads(value) if isinstance(value, str) else value
+            items = items if isinstance(items, list) else []
+            fallback = datetime.fromisoformat(created_at) if isinstance(created_at, str) else created_at
+            completed = 0
+            for item, step in zip(items, step_model.from_items(items)):
+                step_rows.append({
+                    parent_key: parent_id,
+                    'position': step.position,
+                    'title': step.title,
+                    'description': step.description,
+                    'time_limit': step.time_limit,
+                    'points': step.points,
+                    'completed_at': _completed_at(item, fallback)
+                })
+                completed += step_rows[-1]['completed_at'] is not None
+            counters.append({'id': parent_id, 'total': len(items), 'completed': completed})
+
+        if step_rows:
+            db.session.execute(step_model.__table__.insert(), step_rows)
+        db.session.execute(text(
+            f'UPDATE {parent} SET steps_total = :total, steps_completed = :completed WHERE id = :id'), counters)
+        db.session.commit()
+
+
+def upgrade(db):
+    """Create the step tables, fill them from the JSON columns and drop those"""
+    for parent, column, step_model, parent_key in PARENTS:
+        existing = column_names(db, parent)
+        if column not in existing:
+            # Already converted
+            continue
+        step_model.__table__.create(db.engine, checkfirst=True)
+        for counter in ('steps_total', 'steps_completed'):
+            if counter not in existing:
+                db.session.execute(text(f'ALTER TABLE {parent} ADD COLUMN {counter} INTEGER NOT NULL DEFAULT 0'))
+        db.session.commit()
+        explode(db, parent, column, step_model, parent_key)
+        db.session.execute(text(f'ALTER TABLE {parent} DROP COLUMN {column}'))
+        db.session.commit()
+
+
+def downgrade(db):
+    """Rebuild the JSON columns from the step rows and drop the step tables"""
+    for parent, column, step_model, parent_key in PARENTS:
+        db.session.execute(text(f"ALTER TABLE {parent} ADD COLUMN {column} JSON NOT NULL DEFAULT '[]'"))
+        items = {}
+        for step in step_model.query.order_by(getattr(step_model, parent_key), step_model.position):
+            items.setdefault(getattr(step, parent_key), []).append(step.to_dict())
+        if items:
+            db.session.execute(text(f'UPDATE {parent} SET {column} = :items WHERE id = :id'),
+                               [{'id': parent_id, 'items': json.dumps(value)} for parent_id, value in items.items()])
+        db.session.execute(text(f'ALTER TABLE {parent} DROP COLUMN steps_total'))
+        db.session.execute(text(f'ALTER TABLE {parent} DROP COLUMN steps_completed'))
+        db.session.commit()
+        step_model.__table__.drop(db.engine, checkfirst=True)
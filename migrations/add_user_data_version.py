@@ -0,0 +1,22 @@
+"""Add data_version and data_updated_at to User
+
+These columns back the ETag / Last-Modified headers on the list views.
+They are bumped whenever one of the user's activities, quests, challenges
+or achievements, or the user row itself, is written.
+"""
+from sqlalchemy import text
+from wanderlust.schema import column_names
+
+def upgrade(db):
+    """Add the version columns"""
+    if 'data_version' in column_names(db, 'user'):
+        return
+    db.session.execute(text('ALTER TABLE user ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'))
+    db.session.execute(text('ALTER TABLE user ADD COLUMN data_updated_at DATETIME'))
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the version columns"""
+    db.session.execute(text('ALTER TABLE user DROP COLUMN data_updated_at'))
+    db.session.execute(text('ALTER TABLE user DROP COLUMN data_version'))
+    db.session.commit()
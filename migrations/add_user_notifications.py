@@ -4,12 +4,15 @@ This migration adds email_notifications and push_notifications boolean fields
 to the User model.
 """
 from sqlalchemy import text
+from wanderlust.schema import column_names
 
 def upgrade(db):
     """Add notification columns to user table"""
     # Add the notification columns
-    db.session.execute(text('ALTER TABLE user ADD COLUMN email_notifications BOOLEAN DEFAULT 1'))
-    db.session.execute(text('ALTER TABLE user ADD COLUMN push_notifications BOOLEAN DEFAULT 1'))
+    existing = column_names(db, 'user')
+    for column in ('email_notifications', 'push_notifications'):
+        if column not in existing:
+            db.session.execute(text(f'ALTER TABLE user ADD COLUMN {column} BOOLEAN DEFAULT 1'))
     db.session.commit()
 
 def downgrade(db):
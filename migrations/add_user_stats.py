@@ -0,0 +1,16 @@
+"""Add the user_stats table
+
+This migration creates the per-user counters table and fills it from the
+activity, quest, challenge and achievement tables.
+"""
+from wanderlust.models import UserStats
+from wanderlust.stats import rebuild_user_stats
+
+def upgrade(db):
+    """Create and backfill user_stats"""
+    UserStats.__table__.create(db.engine, checkfirst=True)
+    rebuild_user_stats()
+
+def downgrade(db):
+    """Drop user_stats"""
+    UserStats.__table__.drop(db.engine, checkfirst=True)
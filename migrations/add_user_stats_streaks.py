@@ -0,0 +1,30 @@
+"""Add streak columns to user_stats
+
+This migration adds current_streak, longest_streak and last_active_on,
+used by the streak achievement rules. Streaks start from zero. Columns that
+already exist are skipped: ``add_user_stats`` creates the table from the
+current model, which already has them.
+"""
+from sqlalchemy import text
+from wanderlust.schema import column_names
+
+COLUMNS = [
+    ('current_streak', 'INTEGER NOT NULL DEFAULT 0'),
+    ('longest_streak', 'INTEGER NOT NULL DEFAULT 0'),
+    ('last_active_on', 'DATE'),
+]
+
+def upgrade(db):
+    """Add the streak columns"""
+    existing = column_names(db, 'user_stats')
+    for name, definition in COLUMNS:
+        if name in existing:
+            continue
+        db.session.execute(text(f'ALTER TABLE user_stats ADD COLUMN {name} {definition}'))
+    db.session.commit()
+
+def downgrade(db):
+    """Drop the streak columns"""
+    for name, _ in COLUMNS:
+        db.session.execute(text(f'ALTER TABLE user_stats DROP COLUMN {name}'))
+    db.session.commit()
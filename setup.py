@@ -13,6 +13,7 @@ setup(
         'python-dotenv==1.0.0',
         'Pillow==10.1.0',
         'requests==2.31.0',
+        'sortedcontainers==2.4.0',
         'werkzeug==3.0.1'
     ],
 )
@@ -1,33 +1,144 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from dotenv import load_dotenv
+from functools import partial
 import os
 
 load_dotenv()
+_import_ms = (time.perf_counter() - _import_started) * 1000
 
 db = SQLAlchemy()
 login_manager = LoginManager()
 
+# Created by create_extensions()
+EXTENSIONS = ('generation_queue', 'openrouter_client', 'local_llm_client', 'llm_router', 'content_pool', 'llm_cache',
+              'achievement_engine', 'change_tracker', 'leaderboards', 'user_cache', 'push_channel',
+              'expiry_scheduler', 'fragment_cache', 'asset_pipeline')
+
+
+def __getattr__(name):
+    # ``from wanderlust import leaderboards`` before create_app()
+    if name in EXTENSIONS:
+        create_extensions()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_extensions():
+    """Import the extension modules and create the shared instances, once.
+
+    Kept out of the package import, so importing ``wanderlust`` (or just its
+    models) doesn't load sortedcontainers, the HTTP clients and the rest.
+    """
+    global generation_queue, openrouter_client, local_llm_client, llm_router, content_pool, llm_cache
+    global achievement_engine, change_tracker, leaderboards, user_cache, push_channel, expiry_scheduler
+    global fragment_cache, asset_pipeline
+    if 'asset_pipeline' in globals():
+        return
+    from .achievements import AchievementEngine
+    from .assets import AssetPipeline
+    from .content_pool import ContentPool
+    from .expiry import ExpiryScheduler
+    from .fragment_cache import FragmentCache
+    from .jobs import GenerationQueue
+    from .leaderboard import Leaderboards
+    from .llm import LLMRouter
+    from .llm_cache import LLMCache
+    from .openrouter import OpenRouterClient
+    from .push import PushChannel
+    from .user_cache import UserCache
+    from .versioning import ChangeTracker
+
+    # Assigned after the imports, which set the same names to the submodules
+    generation_queue = GenerationQueue()
+    openrouter_client = OpenRouterClient()
+    local_llm_client = OpenRouterClient(prefix='LOCAL_LLM', base_url='http://localhost:8000/v1', require_api_key=False,
+                                        label='The local LLM server')
+    llm_router = LLMRouter(openrouter=openrouter_client, local=local_llm_client)
+    content_pool = ContentPool()
+    llm_cache = LLMCache()
+    achievement_engine = AchievementEngine()
+    change_tracker = ChangeTracker()
+    leaderboards = Leaderboards()
+    user_cache = UserCache()
+    push_channel = PushChannel()
+    expiry_scheduler = ExpiryScheduler()
+    fragment_cache = FragmentCache()
+    asset_pipeline = AssetPipeline()
+
 def create_app():
+    from .database import configure_engine, init_database_config
+    from .startup import StartupTimer
+
+    timer = StartupTimer()
+    timer.add('import wanderlust', _import_ms)
     app = Flask(__name__,
                 template_folder='templates',
                 static_folder='static')
                 
     app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///wanderlust.db'
+    init_database_config(app)
+    app.config.setdefault('PAGE_SIZE', int(os.getenv('PAGE_SIZE', 20)))
+    app.config.setdefault('PAGE_SIZE_MAX', int(os.getenv('PAGE_SIZE_MAX', 100)))
+    app.config.setdefault('STARTUP_PROFILE', os.getenv('STARTUP_PROFILE', '0').lower() in ('1', 'true', 'yes'))
+    app.extensions['startup'] = timer
     
-    db.init_app(app)
+    with timer.step('database'):
+        db.init_app(app)
+        with app.app_context():
+            configure_engine(db.engine, app.config)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
+    with timer.step('extensions'):
+        create_extensions()
+    for name, extension in [('generation_queue', generation_queue), ('openrouter', openrouter_client),
+                            ('local_llm', local_llm_client), ('llm_router', llm_router),
+                            ('content_pool', content_pool), ('llm_cache', llm_cache),
+                            ('achievements', achievement_engine), ('change_tracker', change_tracker),
+                            ('leaderboards', leaderboards), ('user_cache', user_cache),
+                            ('push_channel', push_channel), ('expiry_scheduler', expiry_scheduler),
+                            ('fragment_cache', fragment_cache), ('assets', asset_pipeline)]:
+        with timer.step(name):
+            extension.init_app(app)
     
-    from .models import User
+    with timer.step('models'):
+        from .serialization import init_json
+        init_json(app)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.load(user_id)
+    
+    with timer.step('generation'):
+        from . import generation
+        generation_queue.register('activity', generation.generate_activity)
+        generation_queue.register('quest', generation.generate_quest)
+        generation_queue.register('challenge', generation.generate_challenge)
+        generation_queue.register('activity_batch', generation.generate_activity_batch)
+        generation_queue.register('quest_batch', generation.generate_quest_batch)
+    
+        # Pool refills always want fresh content rather than a cached reply
+        difficulties = ['easy', 'medium', 'hard']
+        content_pool.register('activity', partial(generation.fetch_activity_data, cache_mode='bypass'),
+                              [{'category': category, 'difficulty': difficulty}
+                               for category in ['food', 'culture', 'adventure'] for difficulty in difficulties])
+        content_pool.register('quest', partial(generation.fetch_quest_data, cache_mode='bypass'),
+                              [{'difficulty': difficulty} for difficulty in difficulties])
+        content_pool.register('challenge', partial(generation.fetch_challenge_data, cache_mode='bypass'),
+                              [{'difficulty': difficulty} for difficulty in difficulties])
+    
+    with timer.step('routes'):
+        from .routes import main
+        app.register_blueprint(main)
     
-    from .routes import main
-    app.register_blueprint(main)
+    from .commands import register_commands
+    register_commands(app)
     
+    timer.finish()
+    if app.config['STARTUP_PROFILE']:
+        print(timer.report())
     return app
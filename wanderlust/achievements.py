@@ -0,0 +1,192 @@
+"""Declarative achievement rules.
+
+Each rule is a threshold over one metric of a user's stats snapshot
+(``activities``, ``quests``, ``challenges``, ``points`` or ``streak``). A
+user's unlocked titles are loaded once and cached, so checking every rule
+after a completion only needs the ``user_stats`` row.
+"""
+from collections import OrderedDict
+import os
+import threading
+from sqlalchemy.exc import IntegrityError
+
+RULES = [
+    {'title': 'Adventure Beginner', 'description': 'Complete 5 activities', 'metric': 'activities', 'threshold': 5, 'points': 50},
+    {'title': 'Explorer', 'description': 'Complete 10 activities', 'metric': 'activities', 'threshold': 10, 'points': 100},
+    {'title': 'Wanderlust Master', 'description': 'Complete 25 activities', 'metric': 'activities', 'threshold': 25, 'points': 250},
+    {'title': 'Quest Starter', 'description': 'Complete your first quest', 'metric': 'quests', 'threshold': 1, 'points': 25},
+    {'title': 'Quest Seeker', 'description': 'Complete 10 quests', 'metric': 'quests', 'threshold': 10, 'points': 150},
+    {'title': 'Challenge Accepted', 'description': 'Complete your first challenge', 'metric': 'challenges', 'threshold': 1, 'points': 25},
+    {'title': 'Challenge Champion', 'description': 'Complete 10 challenges', 'metric': 'challenges', 'threshold': 10, 'points': 200},
+    {'title': 'Point Collector', 'description': 'Earn 1000 points', 'metric': 'points', 'threshold': 1000, 'points': 100},
+    {'title': 'On a Roll', 'description': 'Complete something 3 days in a row', 'metric': 'streak', 'threshold': 3, 'points': 30},
+    {'title': 'Week Warrior', 'description': 'Complete something 7 days in a row', 'metric': 'streak', 'threshold': 7, 'points': 70},
+]
+
+METRICS = ('activities', 'quests', 'challenges', 'points', 'streak')
+
+
+def snapshot(stats, points):
+    """Map a ``UserStats`` row and the user's point total to rule metrics."""
+    return {
+        'activities': stats.completed_activities or 0,
+        'quests': stats.completed_quests or 0,
+        'challenges': stats.completed_challenges or 0,
+        'points': points or 0,
+        'streak': stats.longest_streak or 0
+    }
+
+
+def due_rules(rules, metrics, unlocked):
+    """Rules whose threshold is met and which are not unlocked yet."""
+    return [rule for rule in rules
+            if rule['title'] not in unlocked and metrics[rule['metric']] >= rule['threshold']]
+
+
+class AchievementEngine:
+    def __init__(self, app=None, rules=None):
+        self.rules = list(rules or RULES)
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.app = None
+        self.counters = {'hits': 0, 'misses': 0, 'unlocked': 0}
+        for rule in self.rules:
+            if rule['metric'] not in METRICS:
+                raise Exception(f"Unknown achievement metric: {rule['metric']}")
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ACHIEVEMENT_CACHE_SIZE', int(os.getenv('ACHIEVEMENT_CACHE_SIZE', 10000)))
+        self.app = app
+        app.extensions['achievements'] = self
+
+    def unlocked(self, user_id):
+        """Titles the user has unlocked, loaded once and then cached."""
+        with self.lock:
+            titles = self.cache.get(user_id)
+            if titles is not None:
+                self.cache.move_to_end(user_id)
+                self.counters['hits'] += 1
+                return titles
+        self.counters['misses'] += 1
+
+        from . import db
+        from .models import Achievement
+        titles = {row[0] for row in db.session.query(Achievement.title).filter_by(user_id=user_id)}
+        self._remember(user_id, titles)
+        return titles
+
+    def forget(self, user_id=None):
+        """Drop the cached unlocked set for one user (or everyone)."""
+        with self.lock:
+            if user_id is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(user_id, None)
+
+    def check(self, user):
+        """Award every rule the user now qualifies for; the caller commits.
+
+        Returns the newly unlocked rules.
+        """
+        from .stats import get_stats
+        stats = get_stats(user.id)
+        unlocked = self.unlocked(user.id)
+        awarded = []
+        # Achievement points can push the total over a points threshold
+        while True:
+            due = due_rules(self.rules, snapshot(stats, user.points), unlocked)
+            if not due:
+                return awarded
+            for rule in due:
+                if self._award(user, rule):
+                    awarded.append(rule)
+                unlocked.add(rule['title'])
+
+    def backfill(self, chunk_size=500):
+        """Evaluate every rule for every user, awarding retroactively.
+
+        Works through users in id order, ``chunk_size`` per transaction.
+        Returns ``(users_checked, achievements_awarded)``.
+        """
+        from . import db
+        from .models import Achievement, User, UserStats
+        from .stats import compute_stats
+
+        checked = awarded = 0
+        last_id = 0
+        while True:
+            users = User.query.filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+            if not users:
+                break
+            last_id = users[-1].id
+            user_ids = [user.id for user in users]
+
+            stats = {row.user_id: row for row in UserStats.query.filter(UserStats.user_id.in_(user_ids))}
+            missing = [user_id for user_id in user_ids if user_id not in stats]
+            if missing:
+                computed = compute_stats(missing)
+                for user_id in missing:
+                    stats[user_id] = UserStats(user_id=user_id, **computed.get(user_id, {}))
+            unlocked = {user_id: set() for user_id in user_ids}
+            for user_id, title in db.session.query(Achievement.user_id, Achievement.title).filter(
+                    Achievement.user_id.in_(user_ids)):
+                unlocked[user_id].add(title)
+
+            for user in users:
+                checked += 1
+                while True:
+                    due = due_rules(self.rules, snapshot(stats[user.id], user.points), unlocked[user.id])
+                    if not due:
+                        break
+                    for rule in due:
+                        if self._award(user, rule):
+                            awarded += 1
+                        unlocked[user.id].add(rule['title'])
+            db.session.commit()
+        self.forget()
+        return checked, awarded
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return dict(
+            self.counters,
+            rules=len(self.rules),
+            cached_users=len(self.cache),
+            hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else None
+        )
+
+    def _award(self, user, rule):
+        from . import db, push_channel
+        from .models import Achievement
+        from .points import award_points
+        from .stats import bump_stats
+
+        achievement = Achievement(
+            title=rule['title'],
+            description=rule['description'],
+            points_value=rule['points'],
+            user_id=user.id
+        )
+        try:
+            # The unique (user_id, title) index stops another worker's award
+            # from being duplicated
+            with db.session.begin_nested():
+                db.session.add(achievement)
+        except IntegrityError:
+            return False
+        award_points(user, 'achievement', achievement.id, rule['points'])
+        bump_stats(user.id, achievement_points=rule['points'])
+        push_channel.notify(user.id, 'achievement', {
+            'title': rule['title'], 'description': rule['description'], 'points': rule['points']})
+        self.counters['unlocked'] += 1
+        return True
+
+    def _remember(self, user_id, titles):
+        size = self.app.config['ACHIEVEMENT_CACHE_SIZE'] if self.app else 10000
+        with self.lock:
+            self.cache[user_id] = titles
+            self.cache.move_to_end(user_id)
+            while len(self.cache) > size:
+                self.cache.popitem(last=False)
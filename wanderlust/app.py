@@ -1,8 +1,9 @@
 from . import create_app, db
+from .schema import ensure_schema
 
 app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        ensure_schema(db)
     app.run(debug=True)
@@ -0,0 +1,335 @@
+"""Fingerprinted, precompressed static assets.
+
+``flask build-assets`` (run at deploy) copies every file under ``static/``
+into ``ASSET_BUILD_DIR`` under a name that carries a hash of its content,
+e.g. ``css/style.1a2b3c4d5e.css``, and writes a ``manifest.json``. At
+startup the manifest is only loaded. The build runs at startup only when
+there is no manifest yet or a static file is newer than it, in one process
+at a time; a ``build.lock`` older than ``ASSET_BUILD_LOCK_TIMEOUT`` seconds
+is left over from a crashed build and is taken over. The pipeline is off by
+default in debug mode, so edits show up straight from ``/static``. CSS and JavaScript
+are minified with rcssmin / rjsmin when installed. Without them, CSS gets
+comments and whitespace stripped outside strings and ``url()``, and
+JavaScript is left as is. Text files get ``.gz`` (and ``.br``, when the
+brotli package is installed) siblings. Images also get resized WebP variants when Pillow is
+installed. Output files are named by content, so a build only writes what
+changed and pages cached against an older build keep working.
+
+Templates link assets with ``asset_url('css/style.css')``, which resolves
+the hashed name. ``/assets/<name>`` serves the precompressed copy the
+browser accepts with ``Cache-Control: immutable``: a changed file gets a
+new URL, so browsers never need to revalidate.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import time
+from flask import current_app, request, send_from_directory, url_for
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+TEXT_TYPES = ('.css', '.js', '.svg', '.json', '.txt')
+IMAGE_TYPES = ('.jpg', '.jpeg', '.png')
+SKIPPED = ('.py', '.pyc')
+MAX_AGE = 365 * 24 * 3600
+
+
+# Strings, url() and comments, which whitespace squeezing must not touch
+CSS_PROTECTED = re.compile(r'''"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|url\(\s*(?:"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[^)]*)\s*\)|/\*.*?\*/''',
+                           re.S | re.I)
+
+
+def minify_css(source):
+    if rcssmin is not None:
+        return rcssmin.cssmin(source)
+    parts = []
+    position = 0
+    for match in CSS_PROTECTED.finditer(source):
+        parts.append(_squeeze_css(source[position:match.start()]))
+        before, after = source[match.start() - 1:match.start()], source[match.end():match.end() + 1]
+        if not match.group().startswith('/*'):
+            parts.append(match.group())
+        elif _word(before) and _word(after):
+            # Dropping it would join two tokens, and a space would add a combinator
+            parts.append(match.group())
+        position = match.end()
+    parts.append(_squeeze_css(source[position:]))
+    return ''.join(parts).strip()
+
+
+def _word(char):
+    return char.isalnum() or char in '-_\\'
+
+
+def _squeeze_css(source):
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r' ?([{};,]) ?', r'\1', source)
+    return source.replace(';}', '}')
+
+
+def minify_js(source):
+    # Without a real tokenizer no line-level rewrite is safe for template
+    # literals, regexes and comments, so only rjsmin minifies
+    if rjsmin is not None:
+        return rjsmin.jsmin(source)
+    return source
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class AssetPipeline:
+    def __init__(self, app=None):
+        self.app = None
+        self.manifest = {}
+        self.variants = {}
+        self.encodings = {}
+        self.counters = {'files': 0, 'written': 0, 'source_bytes': 0, 'minified_bytes': 0,
+                         'gzip_bytes': 0, 'brotli_bytes': 0, 'variants': 0, 'errors': 0}
+        self.build_ms = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSET_PIPELINE', os.getenv('ASSET_PIPELINE', '0' if app.debug else '1').lower()
+                              in ('1', 'true', 'yes'))
+        app.config.setdefault('ASSET_BUILD_DIR', os.getenv('ASSET_BUILD_DIR', os.path.join(app.instance_path, 'assets')))
+        app.config.setdefault('ASSET_BUILD_LOCK_TIMEOUT', int(os.getenv('ASSET_BUILD_LOCK_TIMEOUT', 300)))
+        app.config.setdefault('ASSET_IMAGE_WIDTHS', [int(width) for width in
+                                                     os.getenv('ASSET_IMAGE_WIDTHS', '640,1280,1920').split(',')])
+        self.app = app
+        app.extensions['asset_pipeline'] = self
+        app.jinja_env.globals.update(asset_url=asset_url, asset_image_set=asset_image_set)
+        if app.config['ASSET_PIPELINE']:
+            try:
+                if not self.load():
+                    self.build_once()
+            except Exception:
+                # e.g. a read-only deploy; templates fall back to /static
+                app.logger.exception('Error building assets')
+                self.counters['errors'] += 1
+
+    def load(self):
+        """Use the manifest of an earlier build; returns whether there was a
+        current one."""
+        path = os.path.join(self.app.config['ASSET_BUILD_DIR'], 'manifest.json')
+        if not os.path.exists(path):
+            return False
+        built_at = os.path.getmtime(path)
+        if any(os.path.getmtime(source) > built_at for _, source in self.sources()):
+            return False
+        with open(path) as f:
+            built = json.load(f)
+        if 'encodings' not in built:
+            # Written by an older build, which didn't record the encodings
+            return False
+        self.manifest, self.variants, self.encodings = built['files'], built['variants'], built['encodings']
+        self.counters['files'] = len(self.manifest)
+        return True
+
+    def build_once(self):
+        """Build unless another process is already building; that process's
+        manifest is picked up on the next start."""
+        lock = os.path.join(self.app.config['ASSET_BUILD_DIR'], 'build.lock')
+        os.makedirs(os.path.dirname(lock), exist_ok=True)
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.path.getmtime(lock)
+            except FileNotFoundError:
+                age = 0
+            if age < self.app.config['ASSET_BUILD_LOCK_TIMEOUT']:
+                self.app.logger.info('Assets are being built by another process')
+                return None
+            # A crashed build; taking its lock over is safe even if two
+            # processes do, since every file is written atomically
+            self.app.logger.warning(f"Removing asset build lock left {round(age)}s ago")
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return None
+        try:
+            return self.build()
+        finally:
+            os.close(fd)
+            os.remove(lock)
+
+    def build(self):
+        """Fingerprint, minify and compress every static file; returns the
+        manifest of source name -> hashed name."""
+        started = time.perf_counter()
+        for name in ('files', 'source_bytes', 'minified_bytes', 'gzip_bytes', 'brotli_bytes', 'variants'):
+            self.counters[name] = 0
+        manifest, variants, encodings = {}, {}, {}
+        for logical, path in self.sources():
+            with open(path, 'rb') as f:
+                data = f.read()
+            hashed = self.add(logical, data, encodings)
+            manifest[logical] = hashed
+            if logical.lower().endswith(IMAGE_TYPES) and Image is not None:
+                variants[logical] = self.add_image_variants(logical, path, hashed, encodings)
+        self.manifest, self.variants, self.encodings = manifest, variants, encodings
+        self.counters['files'] = len(manifest)
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        self._write('manifest.json', json.dumps({'files': manifest, 'variants': variants, 'encodings': encodings},
+                                                indent=1).encode('utf-8'))
+        return manifest
+
+    def sources(self):
+        """``(logical name, path)`` for every file under ``static/``."""
+        static_dir = self.app.static_folder
+        for root, dirs, files in os.walk(static_dir):
+            dirs[:] = [name for name in dirs if name != '__pycache__']
+            for name in sorted(files):
+                if name.endswith(SKIPPED):
+                    continue
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, static_dir).replace(os.sep, '/'), path
+
+    def add(self, logical, data, encodings):
+        """Write one asset (and its compressed siblings) under its hashed name."""
+        base, ext = os.path.splitext(logical)
+        self.counters['source_bytes'] += len(data)
+        minify = MINIFIERS.get(ext.lower())
+        if minify is not None:
+            data = minify(data.decode('utf-8')).encode('utf-8')
+        self.counters['minified_bytes'] += len(data)
+
+        hashed = f"{base}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+        self._write(hashed, data)
+        encodings[hashed] = []
+        if ext.lower() in TEXT_TYPES:
+            compressed = [('br', '.br', brotli.compress(data, quality=11) if brotli else None),
+                          ('gzip', '.gz', gzip.compress(data, 9, mtime=0))]
+            for encoding, suffix, body in compressed:
+                # Not worth it for tiny files that don't shrink
+                if body is not None and len(body) < len(data):
+                    self._write(hashed + suffix, body)
+                    encodings[hashed].append(encoding)
+                    self.counters[f"{'brotli' if encoding == 'br' else 'gzip'}_bytes"] += len(body)
+        return hashed
+
+    def add_image_variants(self, logical, path, hashed, encodings):
+        """WebP copies of an image at each configured width below its own
+        (and at its own); ``[[width, hashed name], ...]``, narrowest first."""
+        base = os.path.splitext(hashed)[0]
+        try:
+            with Image.open(path) as image:
+                image.load()
+                widths = sorted({width for width in self.app.config['ASSET_IMAGE_WIDTHS'] if width < image.width}
+                                | {image.width})
+                result = []
+                for width in widths:
+                    name = f"{base}.{width}w.webp"
+                    target = os.path.join(self.app.config['ASSET_BUILD_DIR'], name)
+                    if not os.path.exists(target):
+                        height = round(image.height * width / image.width)
+                        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                        temporary = f"{target}.{os.getpid()}.tmp"
+                        resized.convert('RGB').save(temporary, 'WEBP', quality=80, method=6)
+                        os.replace(temporary, target)
+                        self.counters['written'] += 1
+                    result.append([width, name])
+                    encodings[name] = []
+                self.counters['variants'] += len(result)
+                return result
+        except Exception as e:
+            # Not a decodable image (or a placeholder); serve the original only
+            self.app.logger.warning(f"Error making variants of {logical}: {e}")
+            self.counters['errors'] += 1
+            return []
+
+    def url(self, filename):
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('main.asset', filename=hashed)
+
+    def send(self, filename):
+        """Response for a hashed asset: the best precompressed copy the
+        client accepts, cached for a year as immutable."""
+        encodings = self.encodings.get(filename)
+        if encodings is None:
+            return None
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        path, encoding = filename, None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if candidate in encodings and request.accept_encodings[candidate]:
+                path, encoding = filename + suffix, candidate
+                break
+        response = send_from_directory(self.app.config['ASSET_BUILD_DIR'], path, mimetype=mimetype, max_age=MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def stats(self):
+        return dict(
+            self.counters,
+            enabled=bool(self.manifest),
+            build_ms=self.build_ms,
+            brotli=brotli is not None,
+            images=Image is not None
+        )
+
+    def _write(self, name, data):
+        """Write ``data`` to ``name`` in the build directory unless it is
+        already there; returns whether it wrote."""
+        target = os.path.join(self.app.config['ASSET_BUILD_DIR'], name)
+        if name != 'manifest.json' and os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Other processes may be building at the same time
+        temporary = f"{target}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, target)
+        self.counters['written'] += 1
+        return True
+
+
+def asset_url(filename):
+    """``url_for`` for a static file, resolved to its fingerprinted copy."""
+    return current_app.extensions['asset_pipeline'].url(filename)
+
+
+def asset_image_set(filename, max_width=None):
+    """CSS ``image-set()`` for an image: its widest WebP variant up to
+    ``max_width``, with the original as the fallback."""
+    pipeline = current_app.extensions['asset_pipeline']
+    original = f"url('{asset_url(filename)}') type('{mimetypes.guess_type(filename)[0]}')"
+    variants = [name for width, name in pipeline.variants.get(filename, [])
+                if max_width is None or width <= max_width]
+    if not variants:
+        return Markup(f"image-set({original})")
+    webp = url_for('main.asset', filename=variants[-1])
+    return Markup(f"image-set(url('{webp}') type('image/webp'), {original})")
@@ -0,0 +1,131 @@
+"""Maintenance commands, run with ``flask --app wanderlust.app <command>``."""
+import click
+
+
+def register_commands(app):
+    @app.cli.command('check-query-plans')
+    @click.option('--user-id', default=1, help='User id to plug into the queries.')
+    def check_query_plans(user_id):
+        """Verify that every per-user hot query is served by an index."""
+        from .query_plans import check_hot_queries
+
+        failed = 0
+        for name, (ok, plan) in check_hot_queries(user_id).items():
+            click.echo(f"{'ok  ' if ok else 'SCAN'} {name}")
+            for detail in plan:
+                click.echo(f"       {detail}")
+            failed += not ok
+        if failed:
+            raise click.ClickException(f"{failed} hot queries are not using an index")
+
+    @app.cli.command('migrate')
+    @click.option('--directory', default=None, help='Directory of the migration scripts (default: migrations/).')
+    def migrate(directory):
+        """Bring an existing database up to date by running every migration in order."""
+        import os
+        from . import db
+        from .schema import ensure_schema, run_migrations
+
+        directory = directory or os.path.join(os.path.dirname(app.root_path), 'migrations')
+        run_migrations(db, directory, progress=lambda name: click.echo(f"upgrade {name}"))
+        click.echo(f"schema {ensure_schema(db)}")
+
+    @app.cli.command('repair-stats')
+    @click.option('--chunk-size', default=1000, help='Users recomputed per transaction.')
+    @click.option('--dry-run', is_flag=True, help='Only report users whose stats are out of date.')
+    def repair_stats(chunk_size, dry_run):
+        """Rebuild the user_stats counters and streaks from the source tables."""
+        from .stats import rebuild_user_stats
+
+        checked, repaired = rebuild_user_stats(chunk_size, dry_run)
+        verb = 'out of date' if dry_run else 'repaired'
+        click.echo(f"{checked} users checked, {repaired} {verb}")
+
+    @app.cli.command('award-achievements')
+    @click.option('--chunk-size', default=500, help='Users evaluated per transaction.')
+    def award_achievements(chunk_size):
+        """Evaluate every achievement rule for every user and award retroactively."""
+        from . import achievement_engine
+
+        checked, awarded = achievement_engine.backfill(chunk_size)
+        click.echo(f"{checked} users checked, {awarded} achievements awarded")
+
+    @app.cli.command('reconcile-points')
+    @click.option('--chunk-size', default=1000, help='Users reconciled per transaction.')
+    @click.option('--dry-run', is_flag=True, help='Only report balances that disagree with the ledger.')
+    def reconcile_points(chunk_size, dry_run):
+        """Recompute every user's points balance from the points ledger."""
+        from .points import reconcile_balances
+
+        checked, fixed = reconcile_balances(chunk_size, dry_run)
+        verb = 'out of balance' if dry_run else 'fixed'
+        click.echo(f"{checked} users checked, {fixed} {verb}")
+
+    @app.cli.command('warm-pool')
+    def warm_pool():
+        """Fill every warm content pool bucket up to CONTENT_POOL_SIZE."""
+        from . import content_pool
+
+        if not content_pool.enabled:
+            raise click.ClickException('The content pool is disabled (CONTENT_POOL_SIZE=0)')
+        content_pool.warm(wait=True)
+        stats = content_pool.stats()
+        click.echo(f"{stats['refilled']} items generated, {stats['refill_errors']} errors")
+        for bucket, level in stats['levels'].items():
+            click.echo(f"{level:4d}  {bucket}")
+
+    @app.cli.command('build-assets')
+    def build_assets():
+        """Fingerprint, minify and precompress the static files."""
+        from . import asset_pipeline
+
+        manifest = asset_pipeline.build()
+        stats = asset_pipeline.stats()
+        click.echo(f"{len(manifest)} assets, {stats['written']} files written in {stats['build_ms']} ms")
+        click.echo(f"{stats['source_bytes']} bytes -> {stats['minified_bytes']} minified, "
+                   f"{stats['gzip_bytes']} gzip, {stats['brotli_bytes']} brotli")
+
+    @app.cli.command('profile-startup')
+    @click.option('--top', default=20, help='Slowest imports to list.')
+    def profile_startup(top):
+        """Report import time per module and time per create_app step."""
+        from .startup import profile_startup
+
+        import_ms, modules, timer = profile_startup(top)
+        click.echo(f"import wanderlust: {import_ms:.1f} ms")
+        click.echo(f"{'cumulative ms':>14s} {'self ms':>9s}  module")
+        for name, self_ms, cumulative_ms in modules:
+            click.echo(f"{cumulative_ms:14.1f} {self_ms:9.1f}  {name}")
+        click.echo()
+        click.echo(timer.report())
+
+    @app.cli.command('generate-data')
+    @click.option('--users', default=1000, help='Users to create.')
+    @click.option('--seed', default=0, help='Random seed; the same seed gives the same data.')
+    @click.option('--end-date', type=click.DateTime(['%Y-%m-%d']), default=None,
+                  help='Latest timestamp in the data (default: today).')
+    @click.option('--chunk-size', default=1000, help='Users inserted per transaction.')
+    @click.option('--activities', default=20.0, help='Mean activities per user.')
+    @click.option('--quests', default=5.0, help='Mean quests per user.')
+    @click.option('--challenges', default=5.0, help='Mean challenges per user.')
+    @click.option('--max-per-user', default=2000, help='Cap on each kind of item per user.')
+    def generate_data(users, seed, end_date, chunk_size, activities, quests, challenges, max_per_user):
+        """Bulk-insert synthetic users with power-law activity counts."""
+        import time
+        from . import db
+        from .schema import ensure_schema
+        from .synthetic import generate
+
+        ensure_schema(db)
+        started = time.perf_counter()
+
+        def progress(done, rows):
+            elapsed = time.perf_counter() - started
+            click.echo(f"{done}/{users} users, {rows} rows, {rows / max(elapsed, 1e-9):.0f} rows/s")
+
+        totals = generate(users, seed, chunk_size, end_date, progress, mean_activities=activities,
+                          mean_quests=quests, mean_challenges=challenges, max_per_user=max_per_user)
+        elapsed = time.perf_counter() - started
+        for table, count in totals.items():
+            click.echo(f"{count:12d}  {table}")
+        click.echo(f"{sum(totals.values())} rows in {elapsed:.1f} s")
@@ -0,0 +1,188 @@
+"""Warm pool of pre-generated content.
+
+Each (kind, category, difficulty) bucket keeps a few ready-made LLM results in
+the ``pooled_content`` table. Requests take one in the same transaction that
+creates the user's row, and a small background executor tops the bucket back
+up once it falls below the low-water mark.
+
+Every bucket is filled once per process, in the background after the first
+request, so the first user in a bucket doesn't wait on the LLM.
+``CONTENT_POOL_WARM=0`` turns that off. ``flask warm-pool`` fills the pool
+ahead of a deploy.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+
+class ContentPool:
+    def __init__(self, app=None):
+        self.app = None
+        self.fetchers = {}
+        self.bucket_params = {}
+        self.refilling = set()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.warmed = False
+        self.hits = 0
+        self.misses = 0
+        self.refilled = 0
+        self.refill_errors = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CONTENT_POOL_SIZE', int(os.getenv('CONTENT_POOL_SIZE', 5)))
+        app.config.setdefault('CONTENT_POOL_LOW_WATER', int(os.getenv('CONTENT_POOL_LOW_WATER', 2)))
+        app.config.setdefault('CONTENT_POOL_REFILL_CONCURRENCY', int(os.getenv('CONTENT_POOL_REFILL_CONCURRENCY', 2)))
+        app.config.setdefault('CONTENT_POOL_WARM', os.getenv('CONTENT_POOL_WARM', '1').lower() in ('1', 'true', 'yes'))
+        self.app = app
+        app.extensions['content_pool'] = self
+        if app.config['CONTENT_POOL_WARM']:
+            # After the first request rather than at import, so the schema check has run
+            app.before_request(self._warm_once)
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['CONTENT_POOL_SIZE'] > 0
+
+    def register(self, kind, fetcher, buckets):
+        """Register how to generate content of ``kind`` for each bucket.
+
+        ``buckets`` is a list of keyword-argument dicts for ``fetcher``,
+        e.g. ``[{'category': 'food', 'difficulty': 'easy'}, ...]``.
+        """
+        self.fetchers[kind] = fetcher
+        for params in buckets:
+            self.bucket_params[_bucket_key(kind, **params)] = params
+
+    def take(self, kind, **params):
+        """Remove the oldest pooled item of the bucket and return its payload.
+
+        The delete is left uncommitted so it lands in the caller's transaction.
+        Returns None (and schedules a refill) when the bucket is empty.
+        """
+        from . import db
+        from .models import PooledContent
+
+        if not self.enabled:
+            return None
+
+        key = _bucket_key(kind, **params)
+        for _ in range(3):
+            item = PooledContent.query.filter_by(
+                kind=key[0], category=key[1], difficulty=key[2]
+            ).order_by(PooledContent.id).first()
+            if item is None:
+                break
+            # Another request may have taken the same row; only one delete wins
+            deleted = PooledContent.query.filter_by(id=item.id).delete(synchronize_session=False)
+            if deleted:
+                self.hits += 1
+                return item.payload
+            db.session.expire(item)
+
+        self.misses += 1
+        self.request_refill(kind, **params)
+        return None
+
+    def request_refill(self, kind, **params):
+        """Top up the bucket in the background if it is below the low-water mark."""
+        key = _bucket_key(kind, **params)
+        if not self.enabled or key not in self.bucket_params:
+            return
+        if self.level(key) >= self.app.config['CONTENT_POOL_LOW_WATER']:
+            return
+        self._schedule(key)
+
+    def _schedule(self, key):
+        with self.lock:
+            if key in self.refilling:
+                return
+            self.refilling.add(key)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['CONTENT_POOL_REFILL_CONCURRENCY'],
+                    thread_name_prefix='content-pool')
+        self.executor.submit(self._refill, key)
+
+    def warm(self, wait=False):
+        """Fill every registered bucket that is below ``CONTENT_POOL_SIZE``;
+        with ``wait``, block until the refills have finished. Call inside an
+        app context."""
+        if not self.enabled:
+            return
+        for key in list(self.bucket_params):
+            if self.level(key) < self.app.config['CONTENT_POOL_SIZE']:
+                self._schedule(key)
+        if wait and self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def _warm_once(self):
+        if self.warmed or not self.enabled:
+            return
+        with self.lock:
+            if self.warmed:
+                return
+            self.warmed = True
+        threading.Thread(target=self._warm_in_background, name='content-pool-warm', daemon=True).start()
+
+    def _warm_in_background(self):
+        try:
+            with self.app.app_context():
+                self.warm()
+        except Exception:
+            self.app.logger.exception('Error warming content pool')
+
+    def level(self, key):
+        from .models import PooledContent
+        return PooledContent.query.filter_by(kind=key[0], category=key[1], difficulty=key[2]).count()
+
+    def levels(self):
+        from . import db
+        from .models import PooledContent
+        rows = db.session.query(
+            PooledContent.kind, PooledContent.category, PooledContent.difficulty, db.func.count(PooledContent.id)
+        ).group_by(PooledContent.kind, PooledContent.category, PooledContent.difficulty).all()
+        counts = {(kind, category, difficulty): count for kind, category, difficulty, count in rows}
+        return {':'.join(part for part in key if part): counts.get(key, 0) for key in self.bucket_params}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': self.app.config['CONTENT_POOL_SIZE'] if self.app else 0,
+            'low_water': self.app.config['CONTENT_POOL_LOW_WATER'] if self.app else 0,
+            'refill_concurrency': self.app.config['CONTENT_POOL_REFILL_CONCURRENCY'] if self.app else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'refilled': self.refilled,
+            'refill_errors': self.refill_errors,
+            'refilling': len(self.refilling),
+            'levels': self.levels() if self.enabled else {}
+        }
+
+    def _refill(self, key):
+        from . import db
+        from .models import PooledContent
+
+        params = self.bucket_params[key]
+        try:
+            with self.app.app_context():
+                while self.level(key) < self.app.config['CONTENT_POOL_SIZE']:
+                    data = self.fetchers[key[0]](**params)
+                    db.session.add(PooledContent(
+                        kind=key[0], category=key[1], difficulty=key[2], payload=data))
+                    db.session.commit()
+                    self.refilled += 1
+        except Exception:
+            self.app.logger.exception(f"Error refilling content pool {key}")
+            self.refill_errors += 1
+        finally:
+            with self.lock:
+                self.refilling.discard(key)
+
+
+def _bucket_key(kind, category=None, difficulty=None):
+    return (kind, category, difficulty)
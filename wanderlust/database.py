@@ -0,0 +1,74 @@
+"""Database engine configuration.
+
+The URI and connection pool come from the environment, so the same code
+runs on SQLite in development and on Postgres in production. SQLite
+connections get pragmas on connect: WAL lets readers run alongside a
+writer, and busy_timeout makes a writer wait for the lock instead of
+failing with "database is locked".
+"""
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_DATABASE_URI = 'sqlite:///wanderlust.db'
+
+
+def init_database_config(app):
+    """Fill in the SQLAlchemy settings from environment variables."""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', os.getenv('DATABASE_URL', DEFAULT_DATABASE_URI))
+    app.config.setdefault('DB_POOL_SIZE', int(os.getenv('DB_POOL_SIZE', 5)))
+    app.config.setdefault('DB_MAX_OVERFLOW', int(os.getenv('DB_MAX_OVERFLOW', 10)))
+    app.config.setdefault('DB_POOL_TIMEOUT', float(os.getenv('DB_POOL_TIMEOUT', 30)))
+    app.config.setdefault('DB_POOL_RECYCLE', int(os.getenv('DB_POOL_RECYCLE', 1800)))
+    app.config.setdefault('DB_POOL_PRE_PING', os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('SQLITE_JOURNAL_MODE', os.getenv('SQLITE_JOURNAL_MODE', 'WAL'))
+    app.config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)))
+    app.config.setdefault('SQLITE_MMAP_SIZE', int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)))
+    app.config.setdefault('SQLITE_CACHE_SIZE', int(os.getenv('SQLITE_CACHE_SIZE', -64000)))
+
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', options)
+
+
+def engine_options(uri, config):
+    """``create_engine`` keyword arguments for ``uri``."""
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'pool_recycle': config['DB_POOL_RECYCLE']
+    }
+    url = make_url(uri)
+    # In-memory SQLite uses a single shared connection, so there is no pool to size
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT']
+        )
+    return options
+
+
+def sqlite_pragmas(config):
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    ]
+
+
+def configure_engine(engine, config):
+    """Apply the SQLite pragmas to every new connection; a no-op elsewhere."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
@@ -0,0 +1,220 @@
+"""Server-side expiry of timed challenges.
+
+A background thread keeps a min-heap of pending challenge deadlines
+(``Challenge.expires_at``). It is loaded from the database when the first
+request arrives, and generation and acceptance add entries once their
+transaction commits. When deadlines pass, the thread marks the challenges
+expired in one ``UPDATE`` per batch and sends a ``challenge_expired`` event
+to the user's open pages.
+
+The UPDATE only matches rows that are still open and due, so a deadline
+moved by a later accept or a challenge completed in the meantime is simply
+skipped. Several processes can run the scheduler against one database
+without double-expiring anything.
+
+List queries don't depend on the thread having run: ``expired_sql()``
+computes the same status in SQL.
+"""
+from datetime import datetime
+import heapq
+import os
+import threading
+import time
+from sqlalchemy import and_, event, or_
+
+
+class ExpiryScheduler:
+    def __init__(self, app=None):
+        self.app = None
+        self.heap = []
+        self.deadlines = {}
+        self.ready = threading.Condition()
+        self.thread = None
+        self.counters = {'scheduled': 0, 'expired': 0, 'batches': 0, 'errors': 0}
+        self.loaded_at = None
+        self.last_batch_ms = None
+        self.max_lag_ms = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EXPIRY_SCHEDULER', os.getenv('EXPIRY_SCHEDULER', '1').lower() in ('1', 'true', 'yes'))
+        app.config.setdefault('EXPIRY_BATCH_SIZE', int(os.getenv('EXPIRY_BATCH_SIZE', 500)))
+        app.config.setdefault('EXPIRY_MAX_SLEEP', float(os.getenv('EXPIRY_MAX_SLEEP', 60)))
+        self.app = app
+        app.extensions['expiry_scheduler'] = self
+        app.before_request(self.start)
+
+        from . import db
+        if not event.contains(db.session, 'after_commit', schedule_pending):
+            event.listen(db.session, 'after_commit', schedule_pending)
+            event.listen(db.session, 'after_soft_rollback', discard_pending)
+
+    def start(self):
+        """Start the scheduler thread, once; runs before every request."""
+        if self.thread is not None or not self.app.config['EXPIRY_SCHEDULER']:
+            return
+        with self.ready:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name='challenge-expiry', daemon=True)
+            self.thread.start()
+
+    def schedule(self, challenge):
+        """Queue the challenge's deadline, added when the session commits."""
+        from . import db
+        db.session.info.setdefault('expiry_schedule', []).append((challenge.id, challenge.expires_at))
+
+    def unschedule(self, challenge):
+        """Drop the challenge's deadline when the session commits."""
+        from . import db
+        db.session.info.setdefault('expiry_schedule', []).append((challenge.id, None))
+
+    def add(self, challenge_id, expires_at):
+        with self.ready:
+            self.deadlines[challenge_id] = expires_at
+            heapq.heappush(self.heap, (expires_at, challenge_id))
+            self.counters['scheduled'] += 1
+            # Wake the thread if this is now the earliest deadline
+            if self.heap[0][1] == challenge_id:
+                self.ready.notify()
+
+    def cancel(self, challenge_id):
+        """Forget a completed challenge; its heap entry is skipped when due."""
+        with self.ready:
+            self.deadlines.pop(challenge_id, None)
+
+    def load(self):
+        """Fill the heap with every open challenge that has a deadline."""
+        from . import db
+        from .models import Challenge
+
+        rows = db.session.query(Challenge.id, Challenge.expires_at).filter(
+            Challenge.completed == False, Challenge.expired_at.is_(None),
+            Challenge.expires_at.isnot(None)).all()
+        db.session.close()
+        with self.ready:
+            # Merge, since deadlines committed meanwhile may already be in
+            for challenge_id, expires_at in rows:
+                self.deadlines.setdefault(challenge_id, expires_at)
+            self.heap.extend((expires_at, challenge_id) for challenge_id, expires_at in rows)
+            heapq.heapify(self.heap)
+            self.loaded_at = datetime.utcnow()
+
+    def due(self, now):
+        """Pop up to a batch of due challenge ids, skipping stale entries."""
+        batch = []
+        with self.ready:
+            while self.heap and self.heap[0][0] <= now and len(batch) < self.app.config['EXPIRY_BATCH_SIZE']:
+                expires_at, challenge_id = heapq.heappop(self.heap)
+                if self.deadlines.get(challenge_id) == expires_at:
+                    del self.deadlines[challenge_id]
+                    batch.append(challenge_id)
+                    self.max_lag_ms = max(self.max_lag_ms, (now - expires_at).total_seconds() * 1000)
+        return batch
+
+    def expire(self, challenge_ids, now=None):
+        """Mark the challenges expired in one UPDATE and announce them.
+
+        Returns the rows that were actually expired.
+        """
+        from . import db, push_channel
+        from .models import Challenge
+        from .versioning import bump_user_versions
+
+        now = now or datetime.utcnow()
+        table = Challenge.__table__
+        started = time.perf_counter()
+        rows = db.session.execute(table.update().where(
+            table.c.id.in_(challenge_ids),
+            table.c.completed == False,
+            table.c.expired_at.is_(None),
+            table.c.expires_at <= now
+        ).values(expired_at=now).returning(table.c.id, table.c.user_id, table.c.title, table.c.expires_at)).fetchall()
+        if rows:
+            bump_user_versions(db.session, {row.user_id for row in rows})
+        db.session.commit()
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+        self.counters['batches'] += 1
+        self.counters['expired'] += len(rows)
+
+        for row in rows:
+            push_channel.publish(row.user_id, 'challenge_expired', {
+                'id': row.id, 'title': row.title, 'expires_at': row.expires_at.isoformat()})
+        return rows
+
+    def stats(self):
+        with self.ready:
+            pending = len(self.deadlines)
+            heap_size = len(self.heap)
+            next_deadline = self.heap[0][0].isoformat() if self.heap else None
+        return dict(
+            self.counters,
+            running=self.thread is not None and self.thread.is_alive(),
+            pending=pending,
+            heap_size=heap_size,
+            next_deadline=next_deadline,
+            loaded_at=self.loaded_at.isoformat() if self.loaded_at else None,
+            last_batch_ms=self.last_batch_ms,
+            max_lag_ms=round(self.max_lag_ms, 1)
+        )
+
+    def _run(self):
+        from . import db
+
+        with self.app.app_context():
+            while True:
+                if self.loaded_at is None:
+                    try:
+                        self.load()
+                    except Exception:
+                        # e.g. the schema isn't migrated yet; retried after a sleep
+                        self.app.logger.exception('Error loading challenge deadlines')
+                        self.counters['errors'] += 1
+                        db.session.remove()
+                now = datetime.utcnow()
+                batch = self.due(now)
+                if batch:
+                    try:
+                        self.expire(batch, now)
+                    except Exception:
+                        self.app.logger.exception(f"Error expiring {len(batch)} challenges")
+                        self.counters['errors'] += 1
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+                    continue
+                with self.ready:
+                    timeout = self.app.config['EXPIRY_MAX_SLEEP']
+                    if self.heap:
+                        timeout = min(timeout, max(0.0, (self.heap[0][0] - datetime.utcnow()).total_seconds()))
+                    self.ready.wait(timeout)
+
+
+def expired_sql(now=None):
+    """SQL expression for "this challenge has expired", for list queries.
+
+    It also covers deadlines that have passed but haven't been marked yet.
+    """
+    from .models import Challenge
+
+    now = now or datetime.utcnow()
+    return or_(Challenge.expired_at.isnot(None),
+               and_(Challenge.completed == False, Challenge.expires_at <= now))
+
+
+def schedule_pending(session):
+    """``after_commit`` hook: apply the deadlines set during the transaction."""
+    from . import expiry_scheduler
+
+    entries = session.info.pop('expiry_schedule', None)
+    for challenge_id, expires_at in entries or []:
+        if expires_at is None:
+            expiry_scheduler.cancel(challenge_id)
+        else:
+            expiry_scheduler.add(challenge_id, expires_at)
+
+
+def discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('expiry_schedule', None)
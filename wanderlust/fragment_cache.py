@@ -0,0 +1,137 @@
+"""Cached page fragments and per-template render timing.
+
+The main content of the home, profile and quests pages is rendered from a
+partial through ``FragmentCache.render``. The rendered HTML is kept per user
+and change version (``User.data_version``, see ``versioning``) and URL, so
+a repeat view of an unchanged page runs neither the view's queries nor the
+Jinja render; only the layout around it (navigation, flashed messages) is
+rendered. A commit that touches the user's rows bumps the version, and
+the user's fragments are dropped when it commits. Other processes stop
+serving theirs as soon as their user cache sees the new version
+(``USER_CACHE_TTL``). At most ``FRAGMENT_CACHE_BYTES`` of HTML is kept, least
+recently used first out.
+
+Every ``render_template`` call is timed through Flask's template signals,
+so ``stats()`` also shows how long each template takes to render.
+"""
+from collections import OrderedDict
+import os
+import threading
+import time
+from flask import before_render_template, g, render_template, request, template_rendered
+from flask_login import current_user
+from markupsafe import Markup
+
+
+class FragmentCache:
+    def __init__(self, app=None):
+        self.app = None
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0, 'evictions': 0}
+        self.timings = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_BYTES', int(os.getenv('FRAGMENT_CACHE_BYTES', 16 * 1024 * 1024)))
+        self.app = app
+        app.extensions['fragment_cache'] = self
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def render(self, template, context):
+        """The current user's ``template`` rendered with ``context()``, or
+        the copy cached for their data version, without calling it."""
+        if not current_user.is_authenticated or self.app.config['FRAGMENT_CACHE_BYTES'] <= 0:
+            return Markup(render_template(template, **context()))
+
+        user_id = current_user.id
+        version = current_user.data_version or 0
+        key = (template, user_id, request.full_path)
+        with self.lock:
+            self._drop_older(user_id, version)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return Markup(entry[1])
+        self.counters['misses'] += 1
+
+        html = render_template(template, **context())
+        self._remember(key, version, html)
+        return Markup(html)
+
+    def invalidate(self, *user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self._drop_older(user_id, None)
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        with self.lock:
+            templates = {name: dict(timing, avg_ms=round(timing['total_ms'] / timing['renders'], 2),
+                                    total_ms=round(timing['total_ms'], 1), max_ms=round(timing['max_ms'], 2))
+                         for name, timing in self.timings.items()}
+            entries = len(self.entries)
+            size = self.size
+        return dict(
+            self.counters,
+            entries=entries,
+            bytes=size,
+            max_bytes=self.app.config['FRAGMENT_CACHE_BYTES'] if self.app else 0,
+            hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else None,
+            templates=templates
+        )
+
+    def _remember(self, key, version, html):
+        max_bytes = self.app.config['FRAGMENT_CACHE_BYTES']
+        size = len(html)
+        if size > max_bytes:
+            return
+        with self.lock:
+            user_id = key[1]
+            # A concurrent request may already have seen a newer version
+            if self.versions.get(user_id, version) > version:
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (version, html)
+            self.versions[user_id] = version
+            self.size += size
+            while self.size > max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.counters['evictions'] += 1
+
+    def _drop_older(self, user_id, version):
+        """Forget the user's fragments from before ``version`` (all of them
+        for ``None``). Call with the lock held."""
+        known = self.versions.get(user_id)
+        if known is None or (version is not None and known >= version):
+            return
+        for key in [key for key, entry in self.entries.items()
+                    if key[1] == user_id and (version is None or entry[0] < version)]:
+            self.size -= len(self.entries.pop(key)[1])
+            self.counters['invalidations'] += 1
+        if version is None:
+            del self.versions[user_id]
+        else:
+            self.versions[user_id] = version
+
+    def _render_started(self, sender, template, context, **extra):
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+    def _render_finished(self, sender, template, context, **extra):
+        started = g.get('_render_started')
+        if not started:
+            return
+        elapsed = (time.perf_counter() - started.pop()) * 1000
+        with self.lock:
+            timing = self.timings.setdefault(template.name, {'renders': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            timing['renders'] += 1
+            timing['total_ms'] += elapsed
+            timing['max_ms'] = max(timing['max_ms'], elapsed)
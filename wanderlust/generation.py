@@ -0,0 +1,656 @@
+"""LLM-backed generation of activities, quests and challenges.
+
+These helpers are shared by the request handlers and the background job
+workers, so they take an explicit ``user_id`` instead of reading
+``current_user``.
+"""
+from . import db, content_pool, expiry_scheduler, llm_cache, llm_router, push_channel
+from .llm_cache import BYPASS, cache_key
+from .models import Activity, Quest, Challenge, ChallengeStep, QuestStep
+from .stats import bump_stats
+from .stream_parser import FieldStreamParser
+from datetime import datetime
+import json
+import re
+import time
+
+ACTIVITY_SYSTEM_PROMPT = 'You are an expert local guide in Mumbai, specializing in creating personalized adventures. Always respond in the exact JSON format requested with these keys: title, description, duration, location'
+QUEST_SYSTEM_PROMPT = 'You are an expert local guide in Mumbai. You must ONLY return a JSON object with the exact format specified in the prompt. Do not include any other text or explanations.'
+CHALLENGE_SYSTEM_PROMPT = 'You are an expert local guide creating exciting challenges.'
+
+def generate_activity_prompt(category, difficulty):
+    """Generate a dynamic prompt based on category and difficulty."""
+    base_location = "Churchgate, Mumbai"
+    current_time = "daytime"  # You can make this dynamic based on actual time
+    
+    prompts = {
+        "food": {
+            "easy": f"Generate a casual dining experience in {base_location}. Focus on popular, easily accessible restaurants or cafes with average pricing. Include:\n"
+                   "1. Restaurant/cafe name\n"
+                   "2. Type of cuisine\n"
+                   "3. Must-try dishes (2-3 items)\n"
+                   "4. Average cost for two\n"
+                   "5. Exact location\n"
+                   "6. Best time to visit\n"
+                   "7. Duration: 30-60 minutes\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "medium": f"Create a food exploration activity in {base_location} that includes multiple stops. Consider:\n"
+                     "1. 2-3 different eateries\n"
+                     "2. Mix of street food and restaurants\n"
+                     "3. Specific food items to try at each stop\n"
+                     "4. Total budget range\n"
+                     "5. Suggested route\n"
+                     "6. Duration: 1-2 hours\n"
+                     "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "hard": f"Design a comprehensive food tour in {base_location} that includes:\n"
+                   "1. 4-5 diverse food establishments\n"
+                   "2. Mix of historic and modern eateries\n"
+                   "3. Special dishes and their history\n"
+                   "4. Cultural significance of each stop\n"
+                   "5. Detailed tasting notes\n"
+                   "6. Duration: 2-3 hours\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location"
+        },
+        "culture": {
+            "easy": f"Create a simple cultural activity in {base_location} suitable for {current_time}. Include:\n"
+                   "1. One main cultural site or institution\n"
+                   "2. Its historical significance\n"
+                   "3. Key things to observe\n"
+                   "4. Best time to visit\n"
+                   "5. Duration: 30-60 minutes\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "medium": f"Design a cultural exploration in {base_location} that includes:\n"
+                     "1. 2-3 cultural sites\n"
+                     "2. Historical background\n"
+                     "3. Cultural practices to observe\n"
+                     "4. Photo opportunities\n"
+                     "5. Local customs to be aware of\n"
+                     "6. Duration: 1-2 hours\n"
+                     "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "hard": f"Create an immersive cultural experience in {base_location} covering:\n"
+                   "1. Multiple historical sites\n"
+                   "2. Local art and architecture\n"
+                   "3. Cultural workshops or activities\n"
+                   "4. Traditional performances if available\n"
+                   "5. Cultural significance of each location\n"
+                   "6. Duration: 2-3 hours\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location"
+        },
+        "adventure": {
+            "easy": f"Design a light adventure activity in {base_location} suitable for {current_time}. Include:\n"
+                   "1. One main location or activity\n"
+                   "2. Required preparation\n"
+                   "3. Safety considerations\n"
+                   "4. Best time to do it\n"
+                   "5. Duration: 30-60 minutes\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "medium": f"Create an engaging adventure in {base_location} that includes:\n"
+                     "1. 2-3 different activities\n"
+                     "2. Required equipment or preparation\n"
+                     "3. Physical requirements\n"
+                     "4. Safety guidelines\n"
+                     "5. Alternative options\n"
+                     "6. Duration: 1-2 hours\n"
+                     "Format the response as JSON with these exact keys: title, description, duration, location",
+            
+            "hard": f"Design a challenging adventure experience in {base_location} that involves:\n"
+                   "1. Multiple challenging activities\n"
+                   "2. Detailed preparation requirements\n"
+                   "3. Physical fitness needs\n"
+                   "4. Safety protocols\n"
+                   "5. Emergency contacts\n"
+                   "6. Duration: 2-3 hours\n"
+                   "Format the response as JSON with these exact keys: title, description, duration, location"
+        }
+    }
+    
+    # Get the prompt for the selected category and difficulty
+    selected_category = prompts.get(category.lower())
+    if not selected_category:
+        raise Exception(f"Invalid category: {category}. Must be one of: {', '.join(prompts.keys())}")
+        
+    selected_prompt = selected_category.get(difficulty.lower())
+    if not selected_prompt:
+        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(selected_category.keys())}")
+    
+    return selected_prompt
+
+def generate_quest_prompt(difficulty):
+    """Generate a dynamic prompt for quest generation."""
+    base_location = "Churchgate, Mumbai"
+    current_time = "evening"  # You can make this dynamic based on actual time
+    
+    prompts = {
+        "easy": f"""Create a beginner-friendly quest in {base_location} with 3 connected steps. 
+Return ONLY a JSON object with this exact format:
+{{
+    "title": "Quest title here",
+    "description": "Overall quest description here",
+    "duration": 90,
+    "steps": [
+        {{
+            "title": "Step 1 title",
+            "description": "Step 1 description"
+        }},
+        {{
+            "title": "Step 2 title",
+            "description": "Step 2 description"
+        }},
+        {{
+            "title": "Step 3 title",
+            "description": "Step 3 description"
+        }}
+    ]
+}}
+
+The quest should:
+1. Take 1-2 hours total
+2. Include easy-to-find locations
+3. Mix of activities (e.g., food, sightseeing)
+4. Be suitable for any time of day""",
+        
+        "medium": f"""Design a moderate quest in {base_location} with 4 connected steps. 
+Return ONLY a JSON object with this exact format:
+{{
+    "title": "Quest title here",
+    "description": "Overall quest description here",
+    "duration": 150,
+    "steps": [
+        {{
+            "title": "Step 1 title",
+            "description": "Step 1 description"
+        }},
+        {{
+            "title": "Step 2 title",
+            "description": "Step 2 description"
+        }},
+        {{
+            "title": "Step 3 title",
+            "description": "Step 3 description"
+        }},
+        {{
+            "title": "Step 4 title",
+            "description": "Step 4 description"
+        }}
+    ]
+}}
+
+The quest should:
+1. Take 2-3 hours total
+2. Include some lesser-known spots
+3. Mix of activities and challenges
+4. Consider time of day for activities""",
+        
+        "hard": f"""Create a challenging quest in {base_location} with 5 connected steps. 
+Return ONLY a JSON object with this exact format:
+{{
+    "title": "Quest title here",
+    "description": "Overall quest description here",
+    "duration": 210,
+    "steps": [
+        {{
+            "title": "Step 1 title",
+            "description": "Step 1 description"
+        }},
+        {{
+            "title": "Step 2 title",
+            "description": "Step 2 description"
+        }},
+        {{
+            "title": "Step 3 title",
+            "description": "Step 3 description"
+        }},
+        {{
+            "title": "Step 4 title",
+            "description": "Step 4 description"
+        }},
+        {{
+            "title": "Step 5 title",
+            "description": "Step 5 description"
+        }}
+    ]
+}}
+
+The quest should:
+1. Take 3-4 hours total
+2. Include hidden gems and local secrets
+3. Complex mix of activities and challenges
+4. Strategic planning of timing and routes"""
+    }
+    
+    selected_prompt = prompts.get(difficulty.lower())
+    if not selected_prompt:
+        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(prompts.keys())}")
+    
+    return selected_prompt
+
+def generate_challenge_prompt(difficulty):
+    base_prompt = """Create an exciting mini-adventure challenge with multiple related activities. 
+    Format the response as a JSON object with the following structure:
+    {
+        "title": "Challenge title",
+        "description": "Overall challenge description",
+        "activities": [
+            {
+                "description": "Activity description",
+                "time_limit": minutes_to_complete,
+                "completed": false,
+                "points": points_for_activity
+            }
+        ],
+        "total_time_limit": total_minutes,
+        "points_reward": total_points
+    }"""
+    
+    difficulty_modifiers = {
+        "easy": "3-4 simple activities, 15-30 minutes each, total time 2 hours",
+        "medium": "4-5 moderate activities, 30-45 minutes each, total time 3 hours",
+        "hard": "5-6 challenging activities, 45-60 minutes each, total time 4 hours"
+    }
+    
+    if difficulty not in difficulty_modifiers:
+        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(difficulty_modifiers.keys())}")
+    
+    return f"{base_prompt}\n\nDifficulty level: {difficulty_modifiers[difficulty]}"
+
+PROMPT_BUILDERS = {
+    'activity': generate_activity_prompt,
+    'quest': generate_quest_prompt,
+    'challenge': generate_challenge_prompt
+}
+
+KINDS = {
+    'activity': {
+        'system_prompt': ACTIVITY_SYSTEM_PROMPT,
+        'title': 'Wanderlust Adventure Generator',
+        'required_fields': ['title', 'description']
+    },
+    'quest': {
+        'system_prompt': QUEST_SYSTEM_PROMPT,
+        'title': 'Wanderlust Quest Generator',
+        'required_fields': ['title', 'description', 'steps']
+    },
+    'challenge': {
+        'system_prompt': CHALLENGE_SYSTEM_PROMPT,
+        'title': 'Wanderlust Challenge Generator',
+        'required_fields': ['title', 'description', 'activities']
+    }
+}
+
+
+def chat_payload(kind, system_prompt, prompt, items=None):
+    """Build the chat completion request body for a generation prompt, with
+    the model and max_tokens routed for ``kind`` (see ``llm.ROUTES``)."""
+    return {
+        'model': llm_router.route(kind)['model'],
+        'messages': [
+            {
+                'role': 'system',
+                'content': system_prompt
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        'temperature': 0.7,
+        'max_tokens': llm_router.max_tokens(kind, items),
+        'response_format': { 'type': 'json_object' }
+    }
+
+def complete(kind, request_data, title, cache_mode=None, items=None):
+    """Send a chat completion request through the response cache and return
+    the decoded API response."""
+    def fetch():
+        api_response = llm_router.chat(kind, request_data, title, items)
+        if not api_response.get('choices') or not api_response['choices'][0].get('message'):
+            raise Exception("Invalid API response format")
+        return api_response
+
+    return llm_cache.get_or_fetch(request_data, fetch, mode=cache_mode)
+
+def call_llm(kind, system_prompt, prompt, title, cache_mode=None):
+    """Send a chat completion request and return the message content."""
+    api_response = complete(kind, chat_payload(kind, system_prompt, prompt), title, cache_mode)
+    return api_response['choices'][0]['message']['content']
+
+def parse_json_content(text, kind):
+    """Parse the model output as JSON, falling back to the first {...} block."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        json_match = re.search(r'\{.*\}', text, re.DOTALL)
+        if json_match:
+            return json.loads(json_match.group(0))
+        raise Exception(f"Could not parse {kind} data as JSON")
+
+def require_fields(data, required_fields, kind):
+    missing_fields = [field for field in required_fields if field not in data]
+    if missing_fields:
+        raise Exception(f"Missing required fields in {kind} data: {', '.join(missing_fields)}")
+
+def parse_duration(value, default):
+    """Duration in minutes from the model's value: 90, "90", "90 minutes" or
+    "2 hours" (the leading number, in hours if an hour unit follows it)."""
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else default
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*(h(?:ou)?rs?\b|h\b)?', str(value or ''), re.IGNORECASE)
+    if not match or float(match.group(1)) <= 0:
+        return default
+    minutes = float(match.group(1)) * (60 if match.group(2) else 1)
+    return int(round(minutes))
+
+def activity_to_dict(activity):
+    return {
+        'id': activity.id,
+        'title': activity.title,
+        'description': activity.description,
+        'category': activity.category,
+        'difficulty': activity.difficulty,
+        'duration': activity.duration,
+        'location': activity.location
+    }
+
+def quest_to_dict(quest):
+    return {
+        'id': quest.id,
+        'title': quest.title,
+        'description': quest.description,
+        'difficulty': quest.difficulty,
+        'duration': quest.duration,
+        'steps': quest.steps
+    }
+
+def challenge_to_dict(challenge):
+    return {
+        'id': challenge.id,
+        'title': challenge.title,
+        'description': challenge.description,
+        'activities': challenge.activities,
+        'time_limit': challenge.time_limit,
+        'points_reward': challenge.points_reward
+    }
+
+def fetch_data(kind, cache_mode=None, **params):
+    """Ask the LLM for content of the given kind and return the parsed JSON."""
+    spec = KINDS[kind]
+    prompt = PROMPT_BUILDERS[kind](**params)
+    text = call_llm(kind, spec['system_prompt'], prompt, spec['title'], cache_mode)
+    data = parse_json_content(text, kind)
+    require_fields(data, spec['required_fields'], kind)
+    return data
+
+def fetch_activity_data(category, difficulty, cache_mode=None):
+    """Ask the LLM for an activity and return the parsed JSON."""
+    return fetch_data('activity', cache_mode, category=category, difficulty=difficulty)
+
+def fetch_quest_data(difficulty, cache_mode=None):
+    """Ask the LLM for a quest and return the parsed JSON."""
+    return fetch_data('quest', cache_mode, difficulty=difficulty)
+
+def fetch_challenge_data(difficulty, cache_mode=None):
+    """Ask the LLM for a challenge and return the parsed JSON."""
+    return fetch_data('challenge', cache_mode, difficulty=difficulty)
+
+def create_activity(user_id, activity_data, category, difficulty):
+    """Add an Activity built from generated data to the session."""
+    new_activity = Activity(
+        title=activity_data['title'],
+        description=activity_data['description'],
+        category=category,
+        difficulty=difficulty,
+        duration=parse_duration(activity_data.get('duration'), 60),
+        location=activity_data.get('location', 'Churchgate, Mumbai'),
+        user_id=user_id
+    )
+    db.session.add(new_activity)
+    return new_activity
+
+def create_quest(user_id, quest_data, difficulty):
+    """Add a Quest built from generated data to the session."""
+    new_quest = Quest(
+        title=quest_data['title'],
+        description=quest_data['description'],
+        difficulty=difficulty,
+        duration=parse_duration(quest_data.get('duration'), 120),  # Default 2 hours in minutes
+        user_id=user_id
+    )
+    new_quest.step_rows = QuestStep.from_items(quest_data['steps'])
+    new_quest.steps_total = len(new_quest.step_rows)
+    db.session.add(new_quest)
+    bump_stats(user_id, active_quests=1)
+    return new_quest
+
+def create_challenge(user_id, challenge_data, difficulty):
+    """Add a Challenge built from generated data to the session."""
+    new_challenge = Challenge(
+        title=challenge_data['title'],
+        description=challenge_data['description'],
+        time_limit=int(challenge_data.get('time_limit', 120)),  # Default 2 hours in minutes
+        points_reward=int(challenge_data.get('points_reward', 0)),
+        user_id=user_id
+    )
+    new_challenge.step_rows = ChallengeStep.from_items(challenge_data['activities'])
+    new_challenge.steps_total = len(new_challenge.step_rows)
+    new_challenge.created_at = datetime.utcnow()
+    new_challenge.start_clock(new_challenge.created_at)
+    db.session.add(new_challenge)
+    bump_stats(user_id, active_challenges=1)
+    # Flushed for the id the scheduler and the notice need
+    db.session.flush()
+    expiry_scheduler.schedule(new_challenge)
+    push_channel.notify(user_id, 'challenge', {
+        'id': new_challenge.id, 'title': new_challenge.title,
+        'expires_at': new_challenge.expires_at.isoformat()})
+    return new_challenge
+
+CREATORS = {
+    'activity': (create_activity, activity_to_dict),
+    'quest': (create_quest, quest_to_dict),
+    'challenge': (create_challenge, challenge_to_dict)
+}
+
+def generate(kind, user_id, cache_mode=None, **params):
+    """Generate content of the given kind live and store it for the user."""
+    data = fetch_data(kind, cache_mode, **params)
+    create, to_dict = CREATORS[kind]
+    obj = create(user_id, data, **params)
+    db.session.commit()
+    return {kind: to_dict(obj)}
+
+def generate_from_pool(kind, user_id, **params):
+    """Store pre-generated content for the user, or return None when the
+    pool bucket is empty. The pool row is consumed in the same transaction."""
+    data = content_pool.take(kind, **params)
+    if data is None:
+        return None
+    create, to_dict = CREATORS[kind]
+    obj = create(user_id, data, **params)
+    db.session.commit()
+    content_pool.request_refill(kind, **params)
+    return {kind: to_dict(obj)}
+
+def generate_activity(user_id, category, difficulty, cache_mode=None):
+    """Generate an activity with the LLM and store it for the user."""
+    return generate('activity', user_id, cache_mode, category=category, difficulty=difficulty)
+
+def generate_quest(user_id, difficulty, cache_mode=None):
+    """Generate a quest with the LLM and store it for the user."""
+    return generate('quest', user_id, cache_mode, difficulty=difficulty)
+
+def generate_challenge(user_id, difficulty, cache_mode=None):
+    """Generate a challenge with the LLM and store it for the user."""
+    return generate('challenge', user_id, cache_mode, difficulty=difficulty)
+
+def stream_generation(kind, user_id, cache_mode=None, **params):
+    """Generate content while streaming the completion.
+
+    Yields ``('field', {'key', 'value', 'partial'})`` as top-level string
+    fields arrive, then ``('done', result)`` once the full object has been
+    validated and stored exactly like a non-streamed generation.
+    """
+    spec = KINDS[kind]
+    request_data = chat_payload(kind, spec['system_prompt'], PROMPT_BUILDERS[kind](**params))
+    key = cache_key(request_data)
+    parser = FieldStreamParser()
+    started = time.perf_counter()
+    first_token_ms = None
+
+    cached = llm_cache.get(key) if llm_cache.enabled and not cache_mode else None
+    if cached is not None:
+        text = cached['choices'][0]['message']['content']
+        first_token_ms = (time.perf_counter() - started) * 1000
+        for update in parser.feed(text):
+            yield 'field', update
+    else:
+        chunks = []
+        for delta in llm_router.stream_chat(kind, request_data, spec['title']):
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            chunks.append(delta)
+            for update in parser.feed(delta):
+                yield 'field', update
+        text = ''.join(chunks)
+        if llm_cache.enabled and cache_mode != BYPASS:
+            llm_cache.put(key, request_data['model'], {'choices': [{'message': {'role': 'assistant', 'content': text}}]},
+                          (time.perf_counter() - started) * 1000)
+
+    data = parse_json_content(text, kind)
+    require_fields(data, spec['required_fields'], kind)
+    create, to_dict = CREATORS[kind]
+    obj = create(user_id, data, **params)
+    db.session.commit()
+
+    yield 'done', {
+        kind: to_dict(obj),
+        'first_token_ms': round(first_token_ms, 1) if first_token_ms is not None else None,
+        'total_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+BATCH_LIMIT = 10
+
+CATEGORIES = ['food', 'culture', 'adventure']
+
+PLURALS = {'activity': 'activities', 'quest': 'quests'}
+
+def batch_specs(count, category, difficulty):
+    """Work out the (category, difficulty) of each item in a batch.
+
+    ``category`` and ``difficulty`` may be ``'mixed'`` to cycle through the
+    available values; ``category`` is None for quests.
+    """
+    difficulties = ['easy', 'medium', 'hard']
+    categories = CATEGORIES
+    if not 1 <= count <= BATCH_LIMIT:
+        raise Exception(f"Invalid count: {count}. Must be between 1 and {BATCH_LIMIT}")
+    if difficulty != 'mixed' and difficulty not in difficulties:
+        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(difficulties + ['mixed'])}")
+    if category is not None and category != 'mixed' and category not in categories:
+        raise Exception(f"Invalid category: {category}. Must be one of: {', '.join(categories + ['mixed'])}")
+
+    specs = []
+    for i in range(count):
+        spec = {'difficulty': difficulties[i % 3] if difficulty == 'mixed' else difficulty}
+        if category is not None:
+            spec['category'] = categories[i % 3] if category == 'mixed' else category
+        specs.append(spec)
+    return specs
+
+def batch_brief(kind, spec):
+    """Condense the single-item prompt into a one-line brief, dropping its
+    output format instructions."""
+    lines = [line.strip() for line in PROMPT_BUILDERS[kind](**spec).strip().split('\n')]
+    if kind == 'quest':
+        # Keep the opening sentence and the "The quest should:" list
+        lines = [lines[0]] + lines[lines.index('The quest should:'):]
+    return ' '.join(line for line in lines if line and not line.startswith('Format the response'))
+
+def generate_batch_prompt(kind, specs):
+    """Ask for several items in one JSON object, one brief per item."""
+    if kind == 'activity':
+        keys = 'title, description, duration, location'
+    else:
+        keys = 'title, description, duration, steps (a list of objects with title and description)'
+
+    briefs = []
+    for i, spec in enumerate(specs, 1):
+        label = ', '.join(spec[key] for key in ('category', 'difficulty') if key in spec)
+        briefs.append(f"{i}. ({label}) {batch_brief(kind, spec)}")
+
+    return (f"Create {len(specs)} distinct {PLURALS[kind]} in Churchgate, Mumbai, one for each brief below.\n"
+            + '\n'.join(briefs)
+            + f"\n\nReturn ONLY a JSON object of the form {{\"items\": [...]}} with exactly {len(specs)} items "
+            f"in the same order as the briefs. Each item must have these exact keys: {keys}. "
+            "Durations are in minutes.")
+
+def generate_batch(kind, user_id, count, difficulty, category=None, cache_mode=None):
+    """Generate several activities or quests with a single LLM call.
+
+    Items are validated one by one; the valid ones are inserted together in
+    one commit and the invalid ones are reported in ``errors``.
+    """
+    specs = batch_specs(count, category, difficulty)
+    spec = KINDS[kind]
+    request_data = chat_payload(kind, spec['system_prompt'], generate_batch_prompt(kind, specs), items=len(specs))
+
+    started = time.perf_counter()
+    api_response = complete(kind, request_data, spec['title'], cache_mode, items=len(specs))
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    text = api_response['choices'][0]['message']['content']
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = parse_json_content(text, kind)
+    items = parsed.get('items') if isinstance(parsed, dict) else parsed
+    if not isinstance(items, list):
+        raise Exception(f"Could not find a list of {PLURALS[kind]} in the response")
+
+    create, to_dict = CREATORS[kind]
+    created, errors = [], []
+    for index, item_spec in enumerate(specs):
+        try:
+            if index >= len(items):
+                raise Exception('Missing from the response')
+            if not isinstance(items[index], dict):
+                raise Exception(f"Expected an object, got {type(items[index]).__name__}")
+            require_fields(items[index], spec['required_fields'], kind)
+            created.append(create(user_id, items[index], **item_spec))
+        except Exception as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    # All valid rows go in with one flush and one commit
+    db.session.flush()
+    db.session.commit()
+
+    total_tokens = (api_response.get('usage') or {}).get('total_tokens')
+    per_item = len(created) or 1
+    return {
+        PLURALS[kind]: [to_dict(obj) for obj in created],
+        'errors': errors,
+        'requested': len(specs),
+        'usage': {
+            'latency_ms': round(latency_ms, 1),
+            'latency_ms_per_item': round(latency_ms / per_item, 1),
+            'total_tokens': total_tokens,
+            'tokens_per_item': round(total_tokens / per_item, 1) if total_tokens else None
+        }
+    }
+
+def generate_activity_batch(user_id, count, difficulty, category, cache_mode=None):
+    return generate_batch('activity', user_id, count, difficulty, category, cache_mode)
+
+def generate_quest_batch(user_id, count, difficulty, cache_mode=None):
+    return generate_batch('quest', user_id, count, difficulty, cache_mode=cache_mode)
+
+def validate_params(kind, **params):
+    """Raise if the parameters of a generation request are invalid."""
+    if kind.endswith('_batch'):
+        batch_specs(params['count'], params.get('category'), params['difficulty'])
+    else:
+        PROMPT_BUILDERS[kind](**params)
@@ -0,0 +1,189 @@
+"""Background job queue for LLM generation.
+
+Generation requests are handed to a small pool of worker threads so a slow
+model reply never ties up a web worker. Each job runs inside an app context
+and its result is kept in memory until it is polled or evicted.
+"""
+from collections import OrderedDict, deque
+from datetime import datetime
+import os
+import queue
+import threading
+import time
+import uuid
+
+
+class QueueFull(Exception):
+    """Raised when the job queue has no room for another job."""
+
+
+class Job:
+    def __init__(self, kind, user_id, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.params = params
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class GenerationQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers = []
+        self.queue = None
+        self.latencies = deque(maxlen=500)
+        self.wait_times = deque(maxlen=500)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GENERATION_WORKERS', int(os.getenv('GENERATION_WORKERS', 4)))
+        app.config.setdefault('GENERATION_QUEUE_SIZE', int(os.getenv('GENERATION_QUEUE_SIZE', 100)))
+        app.config.setdefault('GENERATION_JOB_HISTORY', int(os.getenv('GENERATION_JOB_HISTORY', 1000)))
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['GENERATION_QUEUE_SIZE'])
+        app.extensions['generation_queue'] = self
+
+    def register(self, kind, handler):
+        """Register the function that runs jobs of the given kind."""
+        self.handlers[kind] = handler
+
+    def submit(self, kind, user_id, **params):
+        """Queue a job and return it without waiting for it to run."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        self._start_workers()
+
+        job = Job(kind, user_id, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                self.jobs.pop(job.id, None)
+            raise QueueFull('Too many generation requests in progress, please try again shortly')
+        with self.lock:
+            self.submitted += 1
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        wait_times = sorted(self.wait_times)
+        with self.lock:
+            running = sum(1 for job in self.jobs.values() if job.status == 'running')
+            counters = {'submitted': self.submitted, 'completed': self.completed, 'failed': self.failed}
+        return {
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'running': running,
+            'workers': sum(1 for worker in self.workers if worker.is_alive()),
+            **counters,
+            'latency_ms': _summarize(latencies),
+            'wait_ms': _summarize(wait_times)
+        }
+
+    def _start_workers(self):
+        if self.workers:
+            return
+        with self.lock:
+            if self.workers:
+                return
+            for i in range(self.app.config['GENERATION_WORKERS']):
+                worker = threading.Thread(target=self._work, name=f'generation-worker-{i}', daemon=True)
+                worker.start()
+                self.workers.append(worker)
+
+    def _evict_finished(self):
+        # Keep the most recent jobs around for polling, dropping the oldest
+        # finished ones. Unfinished jobs are skipped rather than stopping the
+        # scan, so one stuck job can't pin everything submitted after it
+        excess = len(self.jobs) - self.app.config['GENERATION_JOB_HISTORY']
+        if excess <= 0:
+            return
+        evicted = []
+        for job_id, job in self.jobs.items():
+            if job.finished:
+                evicted.append(job_id)
+                if len(evicted) == excess:
+                    break
+        for job_id in evicted:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            started = time.perf_counter()
+            job.started_at = datetime.utcnow()
+            job.status = 'running'
+            self.wait_times.append((job.started_at - job.created_at).total_seconds() * 1000)
+            try:
+                with self.app.app_context():
+                    job.result = self.handlers[job.kind](job.user_id, **job.params)
+                job.status = 'done'
+                with self.lock:
+                    self.completed += 1
+            except Exception as e:
+                self.app.logger.exception(f"Error running {job.kind} job {job.id}")
+                job.error = str(e)
+                job.status = 'failed'
+                with self.lock:
+                    self.failed += 1
+            finally:
+                job.finished_at = datetime.utcnow()
+                self.latencies.append((time.perf_counter() - started) * 1000)
+                job.done.set()
+                self._announce(job)
+                self.queue.task_done()
+
+    def _announce(self, job):
+        # Tell the user's open pages, so they don't have to poll for the result
+        from . import push_channel
+        try:
+            push_channel.publish(job.user_id, 'job', job.to_dict())
+        except Exception:
+            self.app.logger.exception(f"Error announcing job {job.id}")
+
+
+def _summarize(samples):
+    if not samples:
+        return {'count': 0, 'avg': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'count': len(samples),
+        'avg': round(sum(samples) / len(samples), 1),
+        'p50': round(samples[len(samples) // 2], 1),
+        'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+        'max': round(samples[-1], 1)
+    }
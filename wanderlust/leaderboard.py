@@ -0,0 +1,266 @@
+"""In-process leaderboards.
+
+Each board is a ``RankedSet``: a sorted list of ``(-points, user_id)`` plus a
+score map, giving O(log n) updates and rank lookups and O(log n + k) top-K
+pages. The weekly board is a rolling window over daily rollup buckets: each
+award goes into today's bucket and onto the board, and buckets that fall out
+of the window are subtracted as a whole.
+
+Awards are queued on the SQLAlchemy session and applied only after the
+transaction commits. The boards are rebuilt from the database the first time
+they are used, and they only see writes made by this process. The rebuild
+reads one snapshot without holding the lock; awards applied meanwhile are
+kept and replayed onto the new boards unless their points ledger row is
+already in the snapshot.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+from sortedcontainers import SortedList
+from sqlalchemy import event
+
+GLOBAL = 'global'
+WEEKLY = 'weekly'
+
+
+class RankedSet:
+    def __init__(self, drop_empty=False):
+        self.entries = SortedList()
+        self.scores = {}
+        self.drop_empty = drop_empty
+
+    def __len__(self):
+        return len(self.scores)
+
+    def add(self, user_id, delta):
+        self.set(user_id, self.scores.get(user_id, 0) + delta)
+
+    def set(self, user_id, score):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self.entries.remove((-old, user_id))
+        if score or not self.drop_empty:
+            self.scores[user_id] = score
+            self.entries.add((-score, user_id))
+
+    def rank(self, user_id):
+        """1-based rank (ties broken by user id), or None if not on the board."""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self.entries.bisect_left((-score, user_id)) + 1
+
+    def top(self, limit, offset=0):
+        """``[(user_id, points), ...]`` for ranks ``offset + 1`` onwards."""
+        return [(user_id, -negated) for negated, user_id in self.entries.islice(offset, offset + limit)]
+
+    def load(self, scores):
+        self.scores = {user_id: score for user_id, score in scores.items() if score or not self.drop_empty}
+        self.entries = SortedList((-score, user_id) for user_id, score in self.scores.items())
+
+
+class Leaderboards:
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.RLock()
+        self.rebuild_lock = threading.Lock()
+        self.loaded = False
+        self.rebuilding = False
+        self.pending = []
+        self.boards = {GLOBAL: RankedSet(), WEEKLY: RankedSet(drop_empty=True)}
+        self.buckets = OrderedDict()
+        self.counters = {'awards': 0, 'lookups': 0, 'rebuilds': 0, 'rebuild_ms': 0.0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LEADERBOARD_WINDOW_DAYS', int(os.getenv('LEADERBOARD_WINDOW_DAYS', 7)))
+        self.app = app
+        app.extensions['leaderboards'] = self
+
+        from . import db
+        if not event.contains(db.session, 'after_commit', apply_pending):
+            event.listen(db.session, 'after_commit', apply_pending)
+            event.listen(db.session, 'after_soft_rollback', discard_pending)
+
+    def award(self, user_id, points, category=None, when=None, version=None):
+        """Queue ``points`` for the user, applied when the session commits.
+        ``version`` is the id of the award's points ledger row."""
+        from . import db
+        db.session.info.setdefault('leaderboard_awards', []).append(
+            (user_id, points, category.lower() if category else None, when or datetime.utcnow(), version))
+
+    def apply(self, user_id, points, category=None, when=None, version=None):
+        """Add ``points`` to the user's global, weekly and category scores."""
+        with self.lock:
+            when = when or datetime.utcnow()
+            if self.rebuilding:
+                # The snapshot being read may or may not include this award
+                self.pending.append((user_id, points, category, when, version))
+            # Before the first rebuild there is nothing to update; it reads this award from the database
+            if self.loaded:
+                self._apply(user_id, points, category, when)
+
+    def _apply(self, user_id, points, category, when):
+        self._roll(when.date())
+        self.boards[GLOBAL].add(user_id, points)
+        if when.date() in self.buckets:
+            bucket = self.buckets[when.date()]
+            bucket[user_id] = bucket.get(user_id, 0) + points
+            self.boards[WEEKLY].add(user_id, points)
+        if category:
+            self._board(category).add(user_id, points)
+        self.counters['awards'] += 1
+
+    def board(self, name):
+        """The board called ``name`` (``global``, ``weekly`` or a category)."""
+        self.ensure_loaded()
+        with self.lock:
+            if name == WEEKLY:
+                self._roll(datetime.utcnow().date())
+            return self.boards.get(name.lower())
+
+    def top(self, name, limit=10, offset=0):
+        board = self.board(name)
+        with self.lock:
+            self.counters['lookups'] += 1
+            return board.top(limit, offset) if board else []
+
+    def rank(self, name, user_id):
+        board = self.board(name)
+        with self.lock:
+            self.counters['lookups'] += 1
+            position = board.rank(user_id) if board else None
+            if position is None:
+                return None
+            return {'rank': position, 'points': board.scores[user_id], 'of': len(board)}
+
+    def names(self):
+        self.ensure_loaded()
+        with self.lock:
+            return list(self.boards)
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self.rebuild_lock:
+                if not self.loaded:
+                    self.rebuild()
+
+    def rebuild(self):
+        """Reload every board from the database."""
+        from . import db
+        with self.lock:
+            self.rebuilding = True
+            self.pending = []
+        session = db.session.session_factory()
+        try:
+            if db.engine.dialect.name == 'sqlite':
+                # pysqlite opens no transaction for reads, so each query would see a later state
+                session.connection().exec_driver_sql('BEGIN')
+            else:
+                session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+            self._rebuild(session)
+        finally:
+            session.close()
+            with self.lock:
+                self.rebuilding = False
+                self.pending = []
+
+    def _rebuild(self, session):
+        from . import db
+        from .models import Achievement, Activity, Challenge, PointsLedger, Quest, User
+        from .stats import activity_points_sql
+
+        started = time.perf_counter()
+        # Every award in the snapshot has a ledger row with an id up to this one, and every later
+        # award a higher id, since SQLite commits one writer at a time
+        version = session.query(db.func.max(PointsLedger.id)).scalar() or 0
+        today = datetime.utcnow().date()
+        window_start = today - timedelta(days=self.app.config['LEADERBOARD_WINDOW_DAYS'] - 1)
+        since = datetime.combine(window_start, datetime.min.time())
+
+        boards = {GLOBAL: RankedSet(), WEEKLY: RankedSet(drop_empty=True)}
+        boards[GLOBAL].load({user_id: points or 0 for user_id, points in session.query(User.id, User.points)})
+
+        categories = {}
+        for user_id, category, points in session.query(
+                Activity.user_id, db.func.lower(Activity.category), db.func.sum(activity_points_sql())
+                ).filter(Activity.completed == True).group_by(Activity.user_id, db.func.lower(Activity.category)):
+            categories.setdefault(category, {})[user_id] = int(points or 0)
+        for category, scores in categories.items():
+            boards[category] = RankedSet(drop_empty=True)
+            boards[category].load(scores)
+
+        # Completions inside the window, rolled up per day
+        buckets = OrderedDict((window_start + timedelta(days=offset), {})
+                              for offset in range((today - window_start).days + 1))
+        sources = [
+            session.query(Activity.user_id, Activity.completed_at, activity_points_sql())
+            .filter(Activity.completed_at >= since),
+            session.query(Quest.user_id, Quest.completed_at, Quest.points).filter(Quest.completed_at >= since),
+            session.query(Challenge.user_id, Challenge.completed_at, Challenge.points_reward)
+            .filter(Challenge.completed == True, Challenge.completed_at >= since),
+            session.query(Achievement.user_id, Achievement.unlocked_at, Achievement.points_value)
+            .filter(Achievement.unlocked_at >= since)
+        ]
+        weekly = {}
+        for query in sources:
+            for user_id, when, points in query:
+                bucket = buckets.get(when.date())
+                if bucket is None or not points:
+                    continue
+                bucket[user_id] = bucket.get(user_id, 0) + points
+                weekly[user_id] = weekly.get(user_id, 0) + points
+        boards[WEEKLY].load(weekly)
+
+        with self.lock:
+            self.boards = boards
+            self.buckets = buckets
+            self.loaded = True
+            for user_id, points, category, when, award_version in self.pending:
+                if award_version is None or award_version > version:
+                    self._apply(user_id, points, category, when)
+            self.counters['rebuilds'] += 1
+            self.counters['rebuild_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, loaded=self.loaded,
+                        boards={name: len(board) for name, board in self.boards.items()},
+                        buckets=len(self.buckets))
+
+    def _board(self, name):
+        if name not in self.boards:
+            self.boards[name] = RankedSet(drop_empty=True)
+        return self.boards[name]
+
+    def _roll(self, today):
+        """Open buckets up to ``today`` and drop the ones outside the window."""
+        window = self.app.config['LEADERBOARD_WINDOW_DAYS']
+        last = next(reversed(self.buckets)) if self.buckets else today - timedelta(days=1)
+        while last < today:
+            last += timedelta(days=1)
+            self.buckets[last] = {}
+        while self.buckets and next(iter(self.buckets)) <= today - timedelta(days=window):
+            _, expired = self.buckets.popitem(last=False)
+            for user_id, points in expired.items():
+                self.boards[WEEKLY].add(user_id, -points)
+
+
+def apply_pending(session):
+    """``after_commit`` hook: apply the awards queued during the transaction."""
+    from . import leaderboards
+
+    awards = session.info.pop('leaderboard_awards', None)
+    for award in awards or []:
+        try:
+            leaderboards.apply(*award)
+        except Exception:
+            leaderboards.app.logger.exception(f"Error updating leaderboard for user {award[0]}")
+
+
+def discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('leaderboard_awards', None)
@@ -0,0 +1,229 @@
+"""LLM providers and per-kind routing.
+
+``ROUTES`` is the one place that decides, for each generation kind, which
+provider answers, with which model, how long a call may take and how many
+tokens it may produce. Every setting can be overridden per kind from the
+environment (``LLM_PROVIDER_QUEST``, ``LLM_MODEL_ACTIVITY``,
+``LLM_TIMEOUT_CHALLENGE``, ``LLM_MAX_TOKENS_QUEST``, ...), so activities
+can go to a small fast model and multi-step quests to a larger one.
+
+Providers:
+- ``openrouter``: the OpenRouter API through the shared pooled client.
+- ``openai``: a self-hosted server with an OpenAI-compatible API (vLLM,
+  llama.cpp, Ollama) at ``LOCAL_LLM_BASE_URL``.
+- ``offline``: well-formed content derived from the request alone, for
+  tests and development without network access.
+
+Every call is timed per provider; ``/llm/stats`` shows the routes and each
+provider's call count, errors and latency.
+"""
+from collections import deque
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from .jobs import _summarize
+
+DEFAULT_MODEL = 'mistralai/mistral-7b-instruct'
+
+# Defaults per kind; None means the provider's default model or deadline
+ROUTES = {
+    'activity': {'provider': None, 'model': None, 'timeout': None, 'max_tokens': 1000},
+    'quest': {'provider': None, 'model': None, 'timeout': None, 'max_tokens': 1000},
+    'challenge': {'provider': None, 'model': None, 'timeout': None, 'max_tokens': 1000}
+}
+
+# Ceiling for batched requests, which ask for max_tokens per item
+MAX_TOKENS_CAP = 8000
+
+
+class OpenAICompatibleProvider:
+    """A chat completions server reached through an ``OpenRouterClient``:
+    OpenRouter itself or a self-hosted server."""
+
+    def __init__(self, name, client, default_model):
+        self.name = name
+        self.client = client
+        self.default_model = default_model
+
+    def chat(self, payload, title, timeout=None, kind=None, items=None):
+        return self.client.chat(payload, title=title, deadline=timeout)
+
+    def stream_chat(self, payload, title, timeout=None, kind=None, items=None):
+        return self.client.stream_chat(payload, title=title, deadline=timeout)
+
+    def stats(self):
+        return self.client.stats()
+
+
+class OfflineProvider:
+    """Deterministic content for the requested kind, seeded by the request
+    payload; never touches the network."""
+
+    name = 'offline'
+    default_model = 'offline'
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+
+    def content(self, payload, kind, items=None):
+        seed = hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+        rng = random.Random(seed)
+        if items:
+            return {'items': [offline_item(kind, rng) for _ in range(items)]}
+        return offline_item(kind, rng)
+
+    def chat(self, payload, title, timeout=None, kind=None, items=None):
+        time.sleep(self.latency_ms / 1000)
+        text = json.dumps(self.content(payload, kind, items))
+        prompt_tokens = len(json.dumps(payload.get('messages', []))) // 4
+        return {
+            'id': f"offline-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}",
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': len(text) // 4,
+                      'total_tokens': prompt_tokens + len(text) // 4}
+        }
+
+    def stream_chat(self, payload, title, timeout=None, kind=None, items=None):
+        time.sleep(self.latency_ms / 1000)
+        text = json.dumps(self.content(payload, kind, items))
+        for start in range(0, len(text), 40):
+            yield text[start:start + 40]
+
+    def stats(self):
+        return {'latency_ms': self.latency_ms}
+
+
+PLACES = ['Churchgate', 'Kala Ghoda', 'Marine Drive', 'Colaba Causeway', 'Oval Maidan', 'Flora Fountain']
+
+
+def offline_item(kind, rng):
+    place = rng.choice(PLACES)
+    if kind == 'activity':
+        return {
+            'title': f"Afternoon in {place}",
+            'description': f"Start at {place}, look for the old signboards and finish with cutting chai nearby.",
+            'duration': rng.choice([45, 60, 90, 120]),
+            'location': f"{place}, Mumbai"
+        }
+    if kind == 'quest':
+        return {
+            'title': f"The {place} trail",
+            'description': f"A walk through the heritage lanes around {place}.",
+            'duration': rng.choice([90, 150, 210]),
+            'steps': [{'title': f"Step {i + 1}", 'description': f"Find landmark {i + 1} near {place} and take a photo."}
+                      for i in range(rng.randint(3, 5))]
+        }
+    activities = [{'description': f"Task {i + 1}: ask a local about {place}.", 'time_limit': rng.choice([15, 30, 45]),
+                   'completed': False, 'points': rng.choice([10, 20, 30])} for i in range(rng.randint(3, 6))]
+    return {
+        'title': f"{place} dash",
+        'description': f"Beat the clock around {place}.",
+        'activities': activities,
+        'time_limit': sum(activity['time_limit'] for activity in activities),
+        'points_reward': sum(activity['points'] for activity in activities)
+    }
+
+
+class LLMRouter:
+    def __init__(self, app=None, openrouter=None, local=None):
+        self.openrouter = openrouter
+        self.local = local
+        self.providers = {}
+        self.routes = {}
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.counters = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LLM_PROVIDER', os.getenv('LLM_PROVIDER', 'openrouter'))
+        app.config.setdefault('LOCAL_LLM_MODEL', os.getenv('LOCAL_LLM_MODEL', 'local'))
+        app.config.setdefault('LLM_OFFLINE_LATENCY_MS', float(os.getenv('LLM_OFFLINE_LATENCY_MS', 0)))
+
+        self.providers = {
+            'openrouter': OpenAICompatibleProvider('openrouter', self.openrouter, DEFAULT_MODEL),
+            'openai': OpenAICompatibleProvider('openai', self.local, app.config['LOCAL_LLM_MODEL']),
+            'offline': OfflineProvider(app.config['LLM_OFFLINE_LATENCY_MS'])
+        }
+        self.routes = {}
+        for kind, defaults in ROUTES.items():
+            suffix = kind.upper()
+            app.config.setdefault(f'LLM_PROVIDER_{suffix}', os.getenv(f'LLM_PROVIDER_{suffix}', defaults['provider'] or app.config['LLM_PROVIDER']))
+            provider = app.config[f'LLM_PROVIDER_{suffix}']
+            if provider not in self.providers:
+                raise Exception(f"Unknown LLM provider for {kind}: {provider}. Must be one of: {', '.join(self.providers)}")
+            app.config.setdefault(f'LLM_MODEL_{suffix}', os.getenv(f'LLM_MODEL_{suffix}', defaults['model'] or self.providers[provider].default_model))
+            timeout = os.getenv(f'LLM_TIMEOUT_{suffix}', defaults['timeout'])
+            app.config.setdefault(f'LLM_TIMEOUT_{suffix}', float(timeout) if timeout else None)
+            app.config.setdefault(f'LLM_MAX_TOKENS_{suffix}', int(os.getenv(f'LLM_MAX_TOKENS_{suffix}', defaults['max_tokens'])))
+            self.routes[kind] = {
+                'provider': provider,
+                'model': app.config[f'LLM_MODEL_{suffix}'],
+                'timeout': app.config[f'LLM_TIMEOUT_{suffix}'],
+                'max_tokens': app.config[f'LLM_MAX_TOKENS_{suffix}']
+            }
+
+        self.latencies = {name: deque(maxlen=500) for name in self.providers}
+        self.counters = {name: {'calls': 0, 'streams': 0, 'errors': 0} for name in self.providers}
+        app.extensions['llm_router'] = self
+
+    def route(self, kind):
+        """The provider, model, timeout and max_tokens for a generation kind."""
+        return self.routes[kind]
+
+    def max_tokens(self, kind, items=None):
+        return min(self.routes[kind]['max_tokens'] * (items or 1), MAX_TOKENS_CAP)
+
+    def chat(self, kind, payload, title, items=None):
+        """Send a chat completion for ``kind`` to its provider and return the
+        decoded response. ``items`` is the number of items a batch asks for."""
+        route = self.routes[kind]
+        provider = self.providers[route['provider']]
+        started = time.perf_counter()
+        try:
+            response = provider.chat(payload, title, route['timeout'], kind, items)
+        except Exception:
+            self._record(provider.name, started, error=True)
+            raise
+        self._record(provider.name, started)
+        return response
+
+    def stream_chat(self, kind, payload, title):
+        """Yield the content deltas of a streamed completion for ``kind``.
+
+        The recorded latency is the time to the end of the stream.
+        """
+        route = self.routes[kind]
+        provider = self.providers[route['provider']]
+        started = time.perf_counter()
+        try:
+            for delta in provider.stream_chat(payload, title, route['timeout'], kind):
+                yield delta
+        except Exception:
+            self._record(provider.name, started, error=True, stream=True)
+            raise
+        self._record(provider.name, started, stream=True)
+
+    def _record(self, name, started, error=False, stream=False):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self.lock:
+            counters = self.counters[name]
+            counters['calls'] += 1
+            counters['streams'] += stream
+            counters['errors'] += error
+            if not error:
+                self.latencies[name].append(elapsed_ms)
+
+    def stats(self):
+        providers = {}
+        for name, provider in self.providers.items():
+            with self.lock:
+                counters = dict(self.counters[name])
+                latencies = sorted(self.latencies[name])
+            providers[name] = dict(counters, latency_ms=_summarize(latencies), client=provider.stats())
+        return {'routes': self.routes, 'providers': providers}
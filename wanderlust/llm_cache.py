@@ -0,0 +1,175 @@
+"""Response cache in front of the chat completions API.
+
+Entries are keyed by a hash of the model, normalized messages, temperature
+and max_tokens. A small in-process LRU serves repeat lookups, backed by the
+``llm_cache_entry`` table with a TTL and least-recently-used eviction.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Per-request cache modes
+BYPASS = 'bypass'    # Neither read nor write the cache
+REFRESH = 'refresh'  # Skip the lookup but store the fresh response
+CACHE_MODES = (BYPASS, REFRESH)
+
+
+def cache_key(payload):
+    """Hash the parts of a chat completion payload that determine the reply."""
+    normalized = {
+        'model': payload.get('model'),
+        'messages': [
+            {'role': message.get('role'), 'content': ' '.join(str(message.get('content', '')).split())}
+            for message in payload.get('messages', [])
+        ],
+        'temperature': payload.get('temperature'),
+        'max_tokens': payload.get('max_tokens')
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, app=None):
+        self.app = None
+        self.hot = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.counters = {
+            'hot_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0,
+            'evictions': 0, 'hot_evictions': 0, 'expired': 0, 'saved_ms': 0.0, 'saved_tokens': 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LLM_CACHE_TTL', int(os.getenv('LLM_CACHE_TTL', 86400)))
+        app.config.setdefault('LLM_CACHE_MAX_ENTRIES', int(os.getenv('LLM_CACHE_MAX_ENTRIES', 10000)))
+        app.config.setdefault('LLM_CACHE_HOT_SIZE', int(os.getenv('LLM_CACHE_HOT_SIZE', 256)))
+        self.app = app
+        app.extensions['llm_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['LLM_CACHE_TTL'] > 0
+
+    def get_or_fetch(self, payload, fetch, mode=None):
+        """Return the cached API response for ``payload`` or call ``fetch()``.
+
+        ``mode`` may be ``'bypass'`` or ``'refresh'`` to skip the lookup.
+        """
+        if not self.enabled or mode == BYPASS:
+            self.counters['bypassed'] += 1
+            return fetch()
+
+        key = cache_key(payload)
+        if mode != REFRESH:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        self.counters['misses'] += 1
+
+        started = time.perf_counter()
+        response = fetch()
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.put(key, payload.get('model', ''), response, latency_ms)
+        return response
+
+    def get(self, key):
+        now = datetime.utcnow()
+        with self.lock:
+            entry = self.hot.get(key)
+            if entry is not None:
+                if entry['expires_at'] > now:
+                    self.hot.move_to_end(key)
+                    self._record_hit('hot_hits', entry)
+                    return entry['response']
+                del self.hot[key]
+
+        from . import db
+        from .models import LLMCacheEntry
+        table = LLMCacheEntry.__table__
+        with db.engine.begin() as conn:
+            row = conn.execute(db.select(table).where(table.c.key == key)).first()
+            if row is None:
+                return None
+            if row.expires_at <= now:
+                conn.execute(table.delete().where(table.c.key == key))
+                self.counters['expired'] += 1
+                return None
+            conn.execute(table.update().where(table.c.key == key).values(
+                hits=table.c.hits + 1, last_accessed_at=now))
+
+        entry = {'response': row.response, 'expires_at': row.expires_at,
+                 'latency_ms': row.latency_ms or 0, 'total_tokens': row.total_tokens or 0}
+        self._remember(key, entry)
+        self._record_hit('db_hits', entry)
+        return row.response
+
+    def put(self, key, model, response, latency_ms):
+        from . import db
+        from .models import LLMCacheEntry
+        table = LLMCacheEntry.__table__
+
+        now = datetime.utcnow()
+        entry = {
+            'response': response,
+            'expires_at': now + timedelta(seconds=self.app.config['LLM_CACHE_TTL']),
+            'latency_ms': latency_ms,
+            'total_tokens': (response.get('usage') or {}).get('total_tokens') or 0
+        }
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key))
+            conn.execute(table.insert().values(
+                key=key, model=model, response=response, latency_ms=latency_ms,
+                total_tokens=entry['total_tokens'], hits=0, created_at=now,
+                expires_at=entry['expires_at'], last_accessed_at=now))
+        self._remember(key, entry)
+
+        self.writes += 1
+        if self.writes % 100 == 1:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then the least recently used ones above the cap."""
+        from . import db
+        from .models import LLMCacheEntry
+        table = LLMCacheEntry.__table__
+
+        with db.engine.begin() as conn:
+            expired = conn.execute(table.delete().where(table.c.expires_at <= datetime.utcnow())).rowcount
+            excess = conn.execute(db.select(db.func.count()).select_from(table)).scalar() - self.app.config['LLM_CACHE_MAX_ENTRIES']
+            evicted = 0
+            if excess > 0:
+                oldest = db.select(table.c.key).order_by(table.c.last_accessed_at).limit(excess)
+                evicted = conn.execute(table.delete().where(table.c.key.in_(oldest.scalar_subquery()))).rowcount
+        self.counters['expired'] += expired
+        self.counters['evictions'] += evicted
+        return expired + evicted
+
+    def stats(self):
+        hits = self.counters['hot_hits'] + self.counters['db_hits']
+        lookups = hits + self.counters['misses']
+        return dict(
+            self.counters,
+            saved_ms=round(self.counters['saved_ms'], 1),
+            hit_rate=round(hits / lookups, 3) if lookups else None,
+            hot_entries=len(self.hot),
+            ttl=self.app.config['LLM_CACHE_TTL'] if self.app else 0
+        )
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.hot[key] = entry
+            self.hot.move_to_end(key)
+            while len(self.hot) > self.app.config['LLM_CACHE_HOT_SIZE']:
+                self.hot.popitem(last=False)
+                self.counters['hot_evictions'] += 1
+
+    def _record_hit(self, tier, entry):
+        self.counters[tier] += 1
+        self.counters['saved_ms'] += entry['latency_ms']
+        self.counters['saved_tokens'] += entry['total_tokens']
@@ -1,6 +1,7 @@
 from . import db
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import datetime, timedelta
+from sqlalchemy.orm import query_expression
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,6 +12,10 @@ class User(UserMixin, db.Model):
     email_notifications = db.Column(db.Boolean, default=True)
     push_notifications = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever the user's activities, quests, challenges, achievements
+    # or profile change; used for ETags on the list views
+    data_version = db.Column(db.Integer, nullable=False, default=0)
+    data_updated_at = db.Column(db.DateTime)
     activities = db.relationship('Activity', backref='user', lazy=True)
     achievements = db.relationship('Achievement', backref='user', lazy=True)
     challenges = db.relationship('Challenge', backref='user', lazy=True)
@@ -24,24 +29,45 @@ class Activity(db.Model):
     duration = db.Column(db.Integer, nullable=False)  # Duration in minutes
     location = db.Column(db.String(200), nullable=False)
     completed = db.Column(db.Boolean, default=False)
+    completed_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_activity_user_completed_created', 'user_id', 'completed', 'created_at'),
+        db.Index('ix_activity_user_created', 'user_id', 'created_at'),
+    )
+
 class Quest(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     difficulty = db.Column(db.String(20), nullable=False)
     duration = db.Column(db.Integer, nullable=False)  # in minutes
-    steps = db.Column(db.JSON, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     points = db.Column(db.Integer, nullable=False, default=0)
+    steps_total = db.Column(db.Integer, nullable=False, default=0)
+    steps_completed = db.Column(db.Integer, nullable=False, default=0)
+    step_rows = db.relationship('QuestStep', order_by='QuestStep.position', lazy='selectin',
+                                cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_quest_user_completed_created', 'user_id', 'completed_at', 'created_at'),
+        db.Index('ix_quest_user_created', 'user_id', 'created_at'),
+        # Completed list pages on (completed_at, id); the rowid follows completed_at
+        db.Index('ix_quest_user_completed_at', 'user_id', 'completed_at'),
+    )
 
     def __repr__(self):
         return f'<Quest {self.title}>'
 
+    @property
+    def steps(self):
+        """The steps in their original JSON shape."""
+        return [step.to_dict() for step in self.step_rows]
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -65,14 +91,192 @@ class Achievement(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     unlocked_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('uq_achievement_user_title', 'user_id', 'title', unique=True),
+    )
+
 class Challenge(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    activities = db.Column(db.JSON, nullable=False)  # List of activities with their own time limits
     time_limit = db.Column(db.Integer, nullable=False)  # Total time limit for the challenge
     points_reward = db.Column(db.Integer, nullable=False)
     completed = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    steps_total = db.Column(db.Integer, nullable=False, default=0)
+    steps_completed = db.Column(db.Integer, nullable=False, default=0)
+    accepted = db.Column(db.Boolean, nullable=False, default=False)
+    accepted_at = db.Column(db.DateTime)
+    # Deadline: time_limit minutes after creation, restarted on accept
+    expires_at = db.Column(db.DateTime)
+    # Set by the expiry scheduler once the deadline has passed
+    expired_at = db.Column(db.DateTime)
+    # Expiry computed in SQL by list queries, see expiry.expired_sql()
+    expired = query_expression()
+    # The activities, each with its own time limit
+    step_rows = db.relationship('ChallengeStep', order_by='ChallengeStep.position', lazy='selectin',
+                                cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_challenge_user_completed_created', 'user_id', 'completed', 'created_at'),
+        db.Index('ix_challenge_user_completed_completed_at', 'user_id', 'completed', 'completed_at'),
+        db.Index('ix_challenge_pending_expiry', 'completed', 'expired_at', 'expires_at'),
+    )
+
+    def start_clock(self, started_at):
+        """Set the deadline to ``time_limit`` minutes after ``started_at``."""
+        self.expires_at = started_at + timedelta(minutes=self.time_limit)
+
+    def is_expired(self, now=None):
+        if self.expired_at is not None:
+            return True
+        if self.completed or self.expires_at is None:
+            return False
+        return self.expires_at <= (now or datetime.utcnow())
+
+    def get_progress(self):
+        """Percentage of the activities completed."""
+        if not self.steps_total:
+            return 0
+        return round(self.steps_completed * 100 / self.steps_total)
+
+    @property
+    def activities(self):
+        """The activities in their original JSON shape."""
+        return [step.to_dict() for step in self.step_rows]
+
+class StepMixin:
+    """Shared fields of challenge and quest steps, one row per step."""
+    # Whether to_dict always reports 'completed' (challenge activities did)
+    always_report_completed = False
+
+    @classmethod
+    def from_items(cls, items):
+        """Build step rows from the generated JSON list."""
+        steps = []
+        for position, item in enumerate(items or []):
+            if not isinstance(item, dict):
+                item = {'description': str(item)}
+            steps.append(cls(
+                position=position,
+                title=item.get('title'),
+                description=item.get('description') or '',
+                time_limit=_optional_int(item.get('time_limit')),
+                points=_optional_int(item.get('points'))
+            ))
+        return steps
+
+    def to_dict(self):
+        return step_to_dict(self, self.always_report_completed)
+
+class ChallengeStep(StepMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenge.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # 0-based index within the challenge
+    title = db.Column(db.String(200))
+    description = db.Column(db.Text, nullable=False)
+    time_limit = db.Column(db.Integer)  # Minutes
+    points = db.Column(db.Integer)
+    completed_at = db.Column(db.DateTime)
+
+    always_report_completed = True
+
+    __table_args__ = (
+        db.Index('uq_challenge_step_position', 'challenge_id', 'position', unique=True),
+    )
+
+class QuestStep(StepMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    quest_id = db.Column(db.Integer, db.ForeignKey('quest.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # 0-based index within the quest
+    title = db.Column(db.String(200))
+    description = db.Column(db.Text, nullable=False)
+    time_limit = db.Column(db.Integer)  # Minutes
+    points = db.Column(db.Integer)
+    completed_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('uq_quest_step_position', 'quest_id', 'position', unique=True),
+    )
+
+def step_to_dict(step, always_report_completed=False):
+    """A step row (or a tuple with the same fields) in its JSON shape."""
+    data = {}
+    if step.title is not None:
+        data['title'] = step.title
+    data['description'] = step.description
+    if step.time_limit is not None:
+        data['time_limit'] = step.time_limit
+    if step.points is not None:
+        data['points'] = step.points
+    if always_report_completed or step.completed_at is not None:
+        data['completed'] = step.completed_at is not None
+    if step.completed_at is not None:
+        data['completed_at'] = step.completed_at.isoformat()
+    return data
+
+def _optional_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class PooledContent(db.Model):
+    """Pre-generated content waiting to be handed to a user."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # activity, quest, challenge
+    category = db.Column(db.String(50))  # Only set for activities
+    difficulty = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_pooled_content_bucket', 'kind', 'category', 'difficulty', 'id'),
+    )
+
+class LLMCacheEntry(db.Model):
+    """Cached chat completion keyed by a hash of the request parameters."""
+    key = db.Column(db.String(64), primary_key=True)
+    model = db.Column(db.String(100), nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    latency_ms = db.Column(db.Float, default=0)  # Upstream latency of the original call
+    total_tokens = db.Column(db.Integer, default=0)
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class UserStats(db.Model):
+    """Per-user counters kept in step with completions and generations so
+    pages don't have to COUNT the user's history."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    completed_activities = db.Column(db.Integer, nullable=False, default=0)
+    active_quests = db.Column(db.Integer, nullable=False, default=0)
+    completed_quests = db.Column(db.Integer, nullable=False, default=0)
+    active_challenges = db.Column(db.Integer, nullable=False, default=0)
+    completed_challenges = db.Column(db.Integer, nullable=False, default=0)
+    activity_points = db.Column(db.Integer, nullable=False, default=0)
+    quest_points = db.Column(db.Integer, nullable=False, default=0)
+    challenge_points = db.Column(db.Integer, nullable=False, default=0)
+    achievement_points = db.Column(db.Integer, nullable=False, default=0)
+    # Consecutive days with at least one completion
+    current_streak = db.Column(db.Integer, nullable=False, default=0)
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_active_on = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class PointsLedger(db.Model):
+    """One row per points award; the unique source index stops the same
+    completion from being paid out twice."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    source_type = db.Column(db.String(20), nullable=False)  # activity, quest, challenge, achievement, adjustment
+    source_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('uq_points_ledger_source', 'user_id', 'source_type', 'source_id', unique=True),
+    )
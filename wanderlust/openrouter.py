@@ -0,0 +1,238 @@
+"""Shared HTTP client for the OpenRouter chat completions API.
+
+One pooled ``requests.Session`` is reused by every generation path so calls
+keep their TCP/TLS connections alive. Failed calls are retried with jittered
+exponential backoff inside a per-call deadline, and a circuit breaker makes
+calls fail fast while the upstream is unhealthy. ``requests`` is imported
+when the first call is made, not at startup.
+
+The client speaks the OpenAI chat completions protocol, so a second
+instance with another config ``prefix`` (``LOCAL_LLM_BASE_URL`` and so on)
+talks to a self-hosted OpenAI-compatible server.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+DEFAULT_BASE_URL = 'https://openrouter.ai/api/v1'
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class OpenRouterError(Exception):
+    """Raised when a completion could not be obtained from the API."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(OpenRouterError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single trial call through
+    once ``reset_timeout`` seconds have passed."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+class OpenRouterClient:
+    def __init__(self, app=None, prefix='OPENROUTER', base_url=DEFAULT_BASE_URL, require_api_key=True,
+                 label='OpenRouter'):
+        self.prefix = prefix
+        self.label = label
+        self.default_base_url = base_url
+        self.require_api_key = require_api_key
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.pool_size = None
+        self.breaker = None
+        self.counters = {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        prefix = self.prefix
+        app.config.setdefault(f'{prefix}_BASE_URL', os.getenv(f'{prefix}_BASE_URL', self.default_base_url))
+        app.config.setdefault(f'{prefix}_API_KEY', os.getenv(f'{prefix}_API_KEY', ''))
+        app.config.setdefault(f'{prefix}_POOL_SIZE', int(os.getenv(f'{prefix}_POOL_SIZE', app.config.get('GENERATION_WORKERS', 10))))
+        app.config.setdefault(f'{prefix}_MAX_RETRIES', int(os.getenv(f'{prefix}_MAX_RETRIES', 3)))
+        app.config.setdefault(f'{prefix}_BACKOFF', float(os.getenv(f'{prefix}_BACKOFF', 0.5)))
+        app.config.setdefault(f'{prefix}_DEADLINE', float(os.getenv(f'{prefix}_DEADLINE', 30)))
+        app.config.setdefault(f'{prefix}_BREAKER_THRESHOLD', int(os.getenv(f'{prefix}_BREAKER_THRESHOLD', 5)))
+        app.config.setdefault(f'{prefix}_BREAKER_RESET', float(os.getenv(f'{prefix}_BREAKER_RESET', 30)))
+
+        self.base_url = app.config[f'{prefix}_BASE_URL'].rstrip('/')
+        self.api_key = app.config[f'{prefix}_API_KEY']
+        self.max_retries = app.config[f'{prefix}_MAX_RETRIES']
+        self.backoff = app.config[f'{prefix}_BACKOFF']
+        self.deadline = app.config[f'{prefix}_DEADLINE']
+        self.breaker = CircuitBreaker(app.config[f'{prefix}_BREAKER_THRESHOLD'],
+                                      app.config[f'{prefix}_BREAKER_RESET'])
+
+        self.pool_size = app.config[f'{prefix}_POOL_SIZE']
+        app.extensions[prefix.lower()] = self
+
+    def get_session(self):
+        """The pooled session, created on first use."""
+        if self.session is None:
+            with self.session_lock:
+                if self.session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    session.headers.update({
+                        'Content-Type': 'application/json',
+                        'HTTP-Referer': 'http://localhost:5000'
+                    })
+                    self.session = session
+        return self.session
+
+    def chat(self, payload, title='Wanderlust', deadline=None):
+        """POST a chat completion payload and return the decoded JSON response.
+
+        Retries 429/5xx responses and connection errors until either
+        ``max_retries`` is used up or the deadline (seconds) runs out.
+        """
+        response = self.post('/chat/completions', payload, title, deadline)
+        return response.json()
+
+    def stream_chat(self, payload, title='Wanderlust', deadline=None):
+        """POST a chat completion with ``stream: true`` and yield the content
+        deltas as they arrive.
+
+        Retries only happen before the first byte; once tokens are flowing a
+        dropped connection is raised to the caller.
+        """
+        response = self.post('/chat/completions', dict(payload, stream=True), title, deadline, stream=True)
+        finished = False
+        with response:
+            # Read to the end of the body (rather than stopping at [DONE]) so
+            # the connection goes back to the pool
+            for line in response.iter_lines(decode_unicode=True):
+                # Server-sent events: "data: {...}" lines, ": comment" keep-alives
+                if finished or not line or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    finished = True
+                    continue
+                chunk = json.loads(data)
+                if chunk.get('error'):
+                    raise OpenRouterError(f"API stream failed: {chunk['error']}")
+                for choice in chunk.get('choices') or []:
+                    delta = (choice.get('delta') or {}).get('content')
+                    if delta:
+                        yield delta
+
+    def post(self, path, payload, title='Wanderlust', deadline=None, stream=False):
+        import requests
+
+        if self.require_api_key and not self.api_key:
+            raise OpenRouterError(f"{self.prefix}_API_KEY is not set; add it to the environment or .env")
+        session = self.get_session()
+        self.counters['calls'] += 1
+        if not self.breaker.allow():
+            self.counters['short_circuited'] += 1
+            raise CircuitOpenError(f"{self.label} is unavailable right now, please try again shortly")
+
+        budget_ends = time.monotonic() + (deadline or self.deadline)
+        headers = {'X-Title': title}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        attempt = 0
+        while True:
+            remaining = budget_ends - time.monotonic()
+            self.counters['attempts'] += 1
+            retry_after = None
+            try:
+                response = session.post(self.base_url + path, headers=headers, json=payload,
+                                        timeout=max(remaining, 0.1), stream=stream)
+                if response.status_code == 200:
+                    self.breaker.record_success()
+                    return response
+                error = OpenRouterError(f"API request failed with status code: {response.status_code}\nResponse: {response.text}",
+                                        response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    # The request itself is bad; the upstream is healthy
+                    self.breaker.record_success()
+                    raise error
+                retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = OpenRouterError(f"API request failed: {str(e)}")
+            except OpenRouterError:
+                raise
+            except Exception:
+                # Anything unexpected still resolves a half-open trial, or the
+                # breaker would wait for it forever
+                self.counters['failures'] += 1
+                self.breaker.record_failure()
+                raise
+
+            delay = retry_after if retry_after is not None else _backoff(self.backoff, attempt)
+            if attempt >= self.max_retries or time.monotonic() + delay >= budget_ends:
+                self.counters['failures'] += 1
+                self.breaker.record_failure()
+                raise error
+            attempt += 1
+            self.counters['retries'] += 1
+            time.sleep(delay)
+
+    def stats(self):
+        return dict(self.counters, breaker=self.breaker.state if self.breaker else None)
+
+
+def _backoff(base, attempt):
+    # Full jitter: a random delay up to the exponential cap
+    return random.uniform(0, min(base * (2 ** attempt), 8))
+
+def _parse_retry_after(value):
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
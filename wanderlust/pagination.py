@@ -0,0 +1,93 @@
+"""Keyset (cursor) pagination for per-user history lists.
+
+Lists are ordered newest first on ``(timestamp, id)``. A page is fetched with
+``WHERE timestamp <= t AND (timestamp < t OR id < i) ORDER BY timestamp DESC,
+id DESC LIMIT n``. The ``<=`` bound gives the per-user composite indexes a
+range to seek to, so every page costs the same however far back the user
+scrolls. Cursors are opaque to clients.
+
+For a ``nullable`` sort column, rows whose timestamp is NULL (completed
+before completion times were recorded) come after the rest, newest id first,
+from a separate query once the timestamped rows run out. Their cursors carry
+a null timestamp.
+"""
+import base64
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import or_
+
+
+class InvalidCursor(Exception):
+    """Raised for a cursor that was not produced by ``encode_cursor``."""
+
+
+def encode_cursor(value, row_id):
+    raw = json.dumps([value.isoformat() if value is not None else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        return (datetime.fromisoformat(value) if value is not None else None), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def page_size(requested=None):
+    """The requested page size, defaulted and capped by the app config."""
+    if not requested or requested < 1:
+        return current_app.config['PAGE_SIZE']
+    return min(requested, current_app.config['PAGE_SIZE_MAX'])
+
+
+def keyset_query(query, sort_column, id_column, cursor=None, limit=None, nullable=False):
+    """Order ``query`` newest first and restrict it to one page past ``cursor``.
+
+    Fetches one extra row so ``paginate`` can tell whether more follow. For
+    a ``nullable`` column the first page runs into the NULL rows in the same
+    query, while a cursor page only returns timestamped rows; see
+    ``null_tail_query``.
+    """
+    if not cursor:
+        order = sort_column.desc().nulls_last() if nullable else sort_column.desc()
+        return query.order_by(order, id_column.desc()).limit(page_size(limit) + 1)
+    value, row_id = decode_cursor(cursor)
+    if value is None:
+        raise InvalidCursor('Invalid cursor')
+    query = query.filter(sort_column <= value, or_(sort_column < value, id_column < row_id))
+    return query.order_by(sort_column.desc(), id_column.desc()).limit(page_size(limit) + 1)
+
+
+def null_tail_query(query, sort_column, id_column, row_id=None, limit=None):
+    """The rows of ``query`` with a NULL ``sort_column``, newest id first,
+    below ``row_id``."""
+    query = query.filter(sort_column.is_(None))
+    if row_id is not None:
+        query = query.filter(id_column < row_id)
+    return query.order_by(id_column.desc()).limit(limit)
+
+
+def paginate(query, sort_column, id_column, cursor=None, limit=None, nullable=False):
+    """Return ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+
+    Pass ``nullable`` when ``sort_column`` can hold NULL.
+    """
+    size = page_size(limit)
+    value, row_id = decode_cursor(cursor) if cursor else (False, None)
+    if value is None:
+        # Already into the NULL tail
+        if not nullable:
+            raise InvalidCursor('Invalid cursor')
+        items = null_tail_query(query, sort_column, id_column, row_id, size + 1).all()
+    else:
+        items = keyset_query(query, sort_column, id_column, cursor, size, nullable).all()
+        if nullable and cursor and len(items) <= size:
+            items += null_tail_query(query, sort_column, id_column, limit=size + 1 - len(items)).all()
+    if len(items) <= size:
+        return items, None
+    items = items[:size]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
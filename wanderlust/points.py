@@ -0,0 +1,122 @@
+"""Points ledger and atomic balance updates.
+
+Every award is a ``PointsLedger`` row keyed by ``(user_id, source_type,
+source_id)``, so the same completion can never pay out twice, and the
+balance moves with a single ``UPDATE user SET points = points + ?`` in the
+same transaction. ``reconcile_balances`` recomputes balances from the
+ledger in bulk.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+from . import db
+from .models import Achievement, Activity, Challenge, PointsLedger, Quest, User
+
+# Ledger rows that bring a balance in line without a completion behind them
+ADJUSTMENT = 'adjustment'
+
+
+def award_points(user, source_type, source_id, delta, category=None):
+    """Record ``delta`` points for ``user`` (a ``User`` or the request's
+    ``UserSnapshot``) from one source; the caller commits.
+
+    Returns False, changing nothing, if that source has already paid out.
+    """
+    entry = PointsLedger(user_id=user.id, source_type=source_type, source_id=source_id, delta=delta)
+    try:
+        with db.session.begin_nested():
+            db.session.add(entry)
+    except IntegrityError:
+        return False
+
+    table = User.__table__
+    points = db.session.execute(table.update().where(table.c.id == user.id).values(
+        points=func.coalesce(table.c.points, 0) + delta).returning(table.c.points)).scalar()
+    # Keep the loaded user in step without marking it dirty
+    if isinstance(user, User):
+        set_committed_value(user, 'points', points)
+    else:
+        user.points = points
+
+    from . import leaderboards, push_channel
+    leaderboards.award(user.id, delta, category, version=entry.id)
+    push_channel.notify(user.id, 'points', {'points': points, 'delta': delta, 'source': source_type})
+    return True
+
+
+def ledger_balances(user_ids=None):
+    """Sum the ledger per user; returns ``{user_id: points}``."""
+    query = db.session.query(PointsLedger.user_id, func.sum(PointsLedger.delta))
+    if user_ids is not None:
+        query = query.filter(PointsLedger.user_id.in_(user_ids))
+    return {user_id: int(total or 0) for user_id, total in query.group_by(PointsLedger.user_id)}
+
+
+def reconcile_balances(chunk_size=1000, dry_run=False):
+    """Set every ``User.points`` to the sum of the user's ledger rows.
+
+    Returns ``(users_checked, users_fixed)``; with ``dry_run`` mismatches are
+    only counted.
+    """
+    table = User.__table__
+    checked = fixed = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(User.id, User.points).filter(User.id > last_id).order_by(User.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        balances = ledger_balances([user_id for user_id, _ in rows])
+        mismatched = [(user_id, balances.get(user_id, 0)) for user_id, points in rows
+                      if (points or 0) != balances.get(user_id, 0)]
+        checked += len(rows)
+        fixed += len(mismatched)
+        if mismatched and not dry_run:
+            db.session.execute(table.update().where(table.c.id == db.bindparam('user_id')).values(
+                points=db.bindparam('balance')),
+                [{'user_id': user_id, 'balance': balance} for user_id, balance in mismatched])
+            db.session.commit()
+    return checked, fixed
+
+
+def backfill_ledger():
+    """Write ledger rows for completions made before the ledger existed.
+
+    Anything left over between ``User.points`` and the recorded awards gets
+    an ``adjustment`` row, so no balance changes.
+    """
+    from .stats import activity_points_sql
+
+    table = PointsLedger.__table__
+    columns = ['user_id', 'source_type', 'source_id', 'delta', 'created_at']
+    sources = [
+        select(Activity.user_id, db.literal('activity'), Activity.id, activity_points_sql(),
+               func.coalesce(Activity.completed_at, Activity.created_at)).where(Activity.completed == True),
+        select(Quest.user_id, db.literal('quest'), Quest.id, Quest.points, Quest.completed_at)
+        .where(Quest.completed_at.isnot(None)),
+        select(Challenge.user_id, db.literal('challenge'), Challenge.id, Challenge.points_reward,
+               func.coalesce(Challenge.completed_at, Challenge.created_at)).where(Challenge.completed == True),
+        select(Achievement.user_id, db.literal('achievement'), Achievement.id, Achievement.points_value,
+               Achievement.unlocked_at),
+    ]
+    for source in sources:
+        # Skip sources that already have a row, so the backfill can be re-run
+        source = source.where(~select(table.c.id).where(
+            table.c.user_id == source.selected_columns[0],
+            table.c.source_type == source.selected_columns[1],
+            table.c.source_id == source.selected_columns[2]).exists())
+        db.session.execute(table.insert().from_select(columns, source))
+
+    balances = ledger_balances()
+    adjustments = [{'user_id': user_id, 'source_type': ADJUSTMENT, 'source_id': 0, 'delta': (points or 0) - balances.get(user_id, 0)}
+                   for user_id, points in db.session.query(User.id, User.points)
+                   if (points or 0) != balances.get(user_id, 0)]
+    for adjustment in adjustments:
+        existing = PointsLedger.query.filter_by(user_id=adjustment['user_id'], source_type=ADJUSTMENT, source_id=0).first()
+        if existing:
+            existing.delta += adjustment['delta']
+        else:
+            db.session.add(PointsLedger(**adjustment))
+    db.session.commit()
+    return len(adjustments)
@@ -0,0 +1,180 @@
+"""Per-user server push over server-sent events.
+
+Each open tab holds one ``/events`` stream instead of polling. Points
+changes, achievement unlocks, new, completed and expired challenges (see
+``expiry``) and finished generation jobs are published to every stream the
+user has open. Events raised inside a transaction (``notify``) are only
+sent once it commits.
+
+Every stream buffers at most ``PUSH_BUFFER_SIZE`` events. A newer points
+event replaces one that is still unsent, and when the buffer is full the
+oldest event is dropped. A user can have at most ``PUSH_MAX_STREAMS``
+streams; opening another closes the oldest one.
+
+Each open stream holds a server thread, so the app must run under a
+threaded or async server (gunicorn with ``--worker-class gthread`` or
+``gevent``), not a plain sync worker. Streams also end after
+``PUSH_MAX_LIFETIME`` seconds. EventSource then reconnects after
+``PUSH_RECONNECT_MS``, so a forgotten tab does not hold a thread forever.
+The new stream starts with the current points balance.
+"""
+from collections import deque
+import json
+import os
+import threading
+import time
+from sqlalchemy import event
+
+# Events where only the latest value matters
+COALESCED = ('points',)
+
+
+class Subscriber:
+    def __init__(self, user_id, buffer_size):
+        self.user_id = user_id
+        self.events = deque(maxlen=buffer_size)
+        self.ready = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, name, data):
+        with self.ready:
+            if name in COALESCED:
+                for i, (pending, _) in enumerate(self.events):
+                    if pending == name:
+                        self.events[i] = (name, data)
+                        return
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append((name, data))
+            self.ready.notify()
+
+    def take(self, timeout):
+        """Wait up to ``timeout`` seconds and return the buffered events."""
+        with self.ready:
+            if not self.events and not self.closed:
+                self.ready.wait(timeout)
+            events = list(self.events)
+            self.events.clear()
+            return events
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+
+class PushChannel:
+    def __init__(self, app=None):
+        self.app = None
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.counters = {'published': 0, 'delivered': 0, 'dropped': 0, 'connections': 0, 'replaced': 0,
+                         'expired': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PUSH_BUFFER_SIZE', int(os.getenv('PUSH_BUFFER_SIZE', 32)))
+        app.config.setdefault('PUSH_KEEPALIVE', float(os.getenv('PUSH_KEEPALIVE', 15)))
+        app.config.setdefault('PUSH_MAX_STREAMS', int(os.getenv('PUSH_MAX_STREAMS', 5)))
+        app.config.setdefault('PUSH_MAX_LIFETIME', float(os.getenv('PUSH_MAX_LIFETIME', 300)))
+        app.config.setdefault('PUSH_RECONNECT_MS', int(os.getenv('PUSH_RECONNECT_MS', 2000)))
+        self.app = app
+        app.extensions['push_channel'] = self
+
+        from . import db
+        if not event.contains(db.session, 'after_commit', publish_pending):
+            event.listen(db.session, 'after_commit', publish_pending)
+            event.listen(db.session, 'after_soft_rollback', discard_pending)
+
+    def notify(self, user_id, name, data):
+        """Queue an event for the user, sent when the session commits."""
+        from . import db
+        db.session.info.setdefault('push_events', []).append((user_id, name, data))
+
+    def publish(self, user_id, name, data):
+        """Send an event to every open stream of the user right away."""
+        with self.lock:
+            subscribers = list(self.subscribers.get(user_id, ()))
+            self.counters['published'] += 1
+        for subscriber in subscribers:
+            subscriber.put(name, data)
+
+    def subscribe(self, user_id):
+        subscriber = Subscriber(user_id, self.app.config['PUSH_BUFFER_SIZE'])
+        with self.lock:
+            streams = self.subscribers.setdefault(user_id, [])
+            streams.append(subscriber)
+            while len(streams) > self.app.config['PUSH_MAX_STREAMS']:
+                streams.pop(0).close()
+                self.counters['replaced'] += 1
+            self.counters['connections'] += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            streams = self.subscribers.get(subscriber.user_id, [])
+            if subscriber in streams:
+                streams.remove(subscriber)
+            if not streams:
+                self.subscribers.pop(subscriber.user_id, None)
+            self.counters['dropped'] += subscriber.dropped
+
+    def stream(self, user_id, points):
+        """Server-sent events for one connection, starting with the balance."""
+        subscriber = self.subscribe(user_id)
+        keepalive = self.app.config['PUSH_KEEPALIVE']
+        ends_at = time.monotonic() + self.app.config['PUSH_MAX_LIFETIME']
+
+        def format(name, data):
+            return f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+        def generate():
+            try:
+                # Browsers wait this long before reconnecting after the
+                # stream ends or drops
+                yield f"retry: {self.app.config['PUSH_RECONNECT_MS']}\n"
+                yield format('points', {'points': points})
+                while not subscriber.closed:
+                    remaining = ends_at - time.monotonic()
+                    if remaining <= 0:
+                        with self.lock:
+                            self.counters['expired'] += 1
+                        break
+                    events = subscriber.take(min(keepalive, remaining))
+                    if not events:
+                        yield ': keep-alive\n\n'
+                    for name, data in events:
+                        yield format(name, data)
+                    with self.lock:
+                        self.counters['delivered'] += len(events)
+            finally:
+                self.unsubscribe(subscriber)
+
+        return generate()
+
+    def stats(self):
+        with self.lock:
+            streams = sum(len(streams) for streams in self.subscribers.values())
+            users = len(self.subscribers)
+            counters = dict(self.counters)
+        return dict(counters, streams=streams, users=users,
+                    buffer_size=self.app.config['PUSH_BUFFER_SIZE'] if self.app else 0)
+
+
+def publish_pending(session):
+    """``after_commit`` hook: send the events queued during the transaction."""
+    from . import push_channel
+
+    events = session.info.pop('push_events', None)
+    for user_id, name, data in events or []:
+        try:
+            push_channel.publish(user_id, name, data)
+        except Exception:
+            push_channel.app.logger.exception(f"Error publishing {name} event for user {user_id}")
+
+
+def discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('push_events', None)
@@ -0,0 +1,89 @@
+"""Query-plan checks for the per-user hot queries.
+
+Each entry in ``hot_queries()`` mirrors a query issued by a page or JSON
+endpoint, including a cursor (page 2) query for every history list.
+``check_hot_queries()`` asks SQLite for the plan of the statement with bound
+parameters, as the app runs it, and reports any query that falls back to a
+full table scan or a temporary sort, or a cursor page that does not seek to
+the cursor with a range on its sort column.
+"""
+from datetime import datetime
+from . import db
+from .models import Activity, Quest, Achievement, Challenge
+from .pagination import encode_cursor, keyset_query, null_tail_query
+
+# Any position works; only the shape of the plan matters
+CURSOR = encode_cursor(datetime(2000, 1, 1), 1000000)
+
+
+def history_lists(user_id):
+    """``{name: (query, sort column, id column, nullable)}`` for the paged lists."""
+    return {
+        'profile: activities': (Activity.query.filter_by(user_id=user_id), Activity.created_at, Activity.id, False),
+        'quests': (Quest.query.filter_by(user_id=user_id), Quest.created_at, Quest.id, False),
+        'active_quests': (Quest.query.filter_by(user_id=user_id, completed_at=None), Quest.created_at, Quest.id,
+                          False),
+        'completed_quests': (Quest.query.filter_by(user_id=user_id).filter(Quest.completed_at.isnot(None)),
+                             Quest.completed_at, Quest.id, False),
+        'challenges: active': (Challenge.query.filter_by(user_id=user_id, completed=False), Challenge.created_at,
+                               Challenge.id, False),
+        'challenges: completed': (Challenge.query.filter_by(user_id=user_id, completed=True),
+                                  Challenge.completed_at, Challenge.id, True),
+    }
+
+
+def hot_queries(user_id=1):
+    """The per-user queries that run on every page view or completion, as
+    ``{name: (query, column)}``. ``column`` is the sort column a cursor page
+    must have a range on, or None."""
+    queries = {}
+    for name, (query, sort_column, id_column, nullable) in history_lists(user_id).items():
+        queries[name] = (keyset_query(query, sort_column, id_column, nullable=nullable), None)
+        queries[f"{name}: page 2"] = (keyset_query(query, sort_column, id_column, CURSOR, nullable=nullable),
+                                      sort_column.key)
+        if nullable:
+            queries[f"{name}: untimed tail"] = (null_tail_query(query, sort_column, id_column, 1000000, 21), None)
+    queries['check_achievements: unlocked'] = (Achievement.query.filter_by(user_id=user_id, title='Explorer'), None)
+    return queries
+
+
+def explain(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query.
+
+    Parameters stay bound: literal values can give SQLite a range that the
+    app's own statement never gets.
+    """
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params()
+    values = []
+    for key in compiled.positiontup:
+        value = params[key]
+        # Dates as the text SQLAlchemy stores on SQLite
+        values.append(value.isoformat(' ', 'microseconds') if isinstance(value, datetime) else value)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), tuple(values)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def uses_index(plan, column=None):
+    # "SCAN <table>" without an index, or a temp b-tree for ORDER BY, means the
+    # index did not serve the query. A cursor page also needs a range on its
+    # sort column, not just (user_id=?), or it reads the whole history
+    for detail in plan:
+        if detail.startswith('SCAN') and 'USING' not in detail:
+            return False
+        if 'USE TEMP B-TREE' in detail:
+            return False
+    if column is not None and not any(f"{column}<" in detail for detail in plan):
+        return False
+    return any('USING' in detail and 'INDEX' in detail for detail in plan)
+
+
+def check_hot_queries(user_id=1):
+    """Explain every hot query; returns ``{name: (ok, plan)}``."""
+    if db.engine.dialect.name != 'sqlite':
+        raise Exception('Query plan checks are only implemented for SQLite')
+    results = {}
+    for name, (query, column) in hot_queries(user_id).items():
+        plan = explain(query)
+        results[name] = (uses_index(plan, column), plan)
+    return results
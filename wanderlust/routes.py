@@ -1,13 +1,20 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+from flask import Blueprint, Response, current_app, make_response, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
 from flask_login import login_required, current_user, login_user, logout_user
-from . import db
+from . import db, achievement_engine, asset_pipeline, change_tracker, content_pool, expiry_scheduler, fragment_cache, generation, generation_queue, leaderboards, llm_cache, llm_router, openrouter_client, push_channel, user_cache
+from .jobs import QueueFull
+from .llm_cache import CACHE_MODES
+from .expiry import expired_sql
+from .pagination import InvalidCursor, paginate
+from .points import award_points
+from .serialization import active_challenge_dicts, challenge_rows, completed_challenge_dicts, quest_dicts, quest_rows
 from .models import User, Activity, Quest, Achievement, Challenge
+from .steps import complete_step
+from .stats import ACTIVITY_POINTS, QUEST_POINTS, bump_stats, get_stats, touch_streak
 import os
 import json
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime
+from sqlalchemy.orm import lazyload, with_expression
 from werkzeug.security import generate_password_hash, check_password_hash
-import openai
 
 main = Blueprint('main', __name__)
 
@@ -48,9 +55,10 @@ class ChallengeMode:
 @main.route('/')
 def index():
     if current_user.is_authenticated:
-        completed_activities = Activity.query.filter_by(user_id=current_user.id, completed=True).count()
-        active_quests = Quest.query.filter_by(user_id=current_user.id, completed_at=None).count()
-        return render_template('home.html', completed_activities=completed_activities, active_quests=active_quests)
+        def context():
+            stats = get_stats(current_user.id)
+            return dict(completed_activities=stats.completed_activities, active_quests=stats.active_quests)
+        return render_template('home.html', content=fragment_cache.render('partials/home_content.html', context))
     return render_template('index.html')
 
 @main.route('/login', methods=['GET', 'POST'])
@@ -125,13 +133,23 @@ def forgot_password():
 
 @main.route('/profile')
 @login_required
+@change_tracker.conditional
 def profile():
-    achievements = Achievement.query.filter_by(user_id=current_user.id).all()
-    activities = Activity.query.filter_by(user_id=current_user.id).order_by(Activity.created_at.desc()).all()
-    return render_template('profile.html', 
-                         achievements=achievements, 
-                         activities=activities,
-                         user_level=calculate_user_level(current_user.points))
+    if request.args.get('fragment'):
+        activities, next_cursor = paginate_activities()
+        return render_fragment('partials/activity_cards.html', next_cursor, activities=activities)
+
+    def context():
+        activities, next_cursor = paginate_activities()
+        achievements = Achievement.query.filter_by(user_id=current_user.id).all()
+        return dict(achievements=achievements,
+                    activities=activities,
+                    next_cursor=next_cursor,
+                    user_level=calculate_user_level(current_user.points))
+    return render_template('profile.html', content=fragment_cache.render('partials/profile_content.html', context))
+
+def paginate_activities():
+    return paginated(Activity.query.filter_by(user_id=current_user.id), Activity.created_at, Activity.id)
 
 @main.route('/settings', methods=['GET'])
 @login_required
@@ -142,37 +160,39 @@ def settings():
 @login_required
 def update_settings():
     try:
+        user = current_user.record()
+
         # Update user settings
         if 'email' in request.form:
             new_email = request.form['email']
-            if new_email != current_user.email:
+            if new_email != user.email:
                 if User.query.filter_by(email=new_email).first():
                     flash('Email already exists')
                     return redirect(url_for('main.settings'))
-                current_user.email = new_email
+                user.email = new_email
 
         if 'username' in request.form:
             new_username = request.form['username']
-            if new_username != current_user.username:
+            if new_username != user.username:
                 if User.query.filter_by(username=new_username).first():
                     flash('Username already exists')
                     return redirect(url_for('main.settings'))
-                current_user.username = new_username
+                user.username = new_username
 
         if 'current_password' in request.form and 'new_password' in request.form:
             current_password = request.form['current_password']
             new_password = request.form['new_password']
             
-            if not check_password_hash(current_user.password_hash, current_password):
+            if not check_password_hash(user.password_hash, current_password):
                 flash('Current password is incorrect')
                 return redirect(url_for('main.settings'))
                 
             if new_password:
-                current_user.password_hash = generate_password_hash(new_password)
+                user.password_hash = generate_password_hash(new_password)
 
         # Update notification preferences
-        current_user.email_notifications = 'email_notifications' in request.form
-        current_user.push_notifications = 'push_notifications' in request.form
+        user.email_notifications = 'email_notifications' in request.form
+        user.push_notifications = 'push_notifications' in request.form
 
         db.session.commit()
         flash('Settings updated successfully')
@@ -185,156 +205,75 @@ def update_settings():
 
 @main.route('/quests')
 @login_required
+@change_tracker.conditional
 def quests():
     """Display user's quests."""
-    # Get user's quests ordered by creation date
-    user_quests = Quest.query.filter_by(user_id=current_user.id).order_by(Quest.created_at.desc()).all()
-    return render_template('quests.html', quests=user_quests)
+    if request.args.get('fragment'):
+        user_quests, next_cursor = paginate_quests()
+        return render_fragment('partials/quest_cards.html', next_cursor, quests=user_quests)
+
+    def context():
+        user_quests, next_cursor = paginate_quests()
+        return dict(quests=user_quests, next_cursor=next_cursor)
+    return render_template('quests.html', content=fragment_cache.render('partials/quests_content.html', context))
+
+def paginate_quests():
+    # User's quests, newest first
+    return paginated(Quest.query.filter_by(user_id=current_user.id), Quest.created_at, Quest.id)
 
 @main.route('/active_quests')
 @login_required
+@change_tracker.conditional
 def active_quests():
     """Get user's active quests."""
-    active_quests = Quest.query.filter_by(
-        user_id=current_user.id,
-        completed_at=None
-    ).order_by(Quest.created_at.desc()).all()
-    return jsonify([quest.to_dict() for quest in active_quests])
+    rows, next_cursor = paginated(quest_rows().filter(
+        Quest.user_id == current_user.id,
+        Quest.completed_at.is_(None)
+    ), Quest.created_at, Quest.id)
+    return jsonify({'items': quest_dicts(rows), 'next': next_cursor})
 
 @main.route('/completed_quests')
 @login_required
+@change_tracker.conditional
 def completed_quests():
     """Get user's completed quests."""
-    completed_quests = Quest.query.filter_by(
-        user_id=current_user.id
-    ).filter(Quest.completed_at.isnot(None)
-    ).order_by(Quest.completed_at.desc()).all()
-    return jsonify([quest.to_dict() for quest in completed_quests])
+    rows, next_cursor = paginated(quest_rows().filter(
+        Quest.user_id == current_user.id,
+        Quest.completed_at.isnot(None)
+    ), Quest.completed_at, Quest.id)
+    return jsonify({'items': quest_dicts(rows), 'next': next_cursor})
 
 @main.route('/challenges')
 @login_required
+@change_tracker.conditional
 def challenges():
     """Display the challenges page."""
-    active = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=False
-    ).order_by(Challenge.created_at.desc()).all()
-    
-    completed = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=True
-    ).order_by(Challenge.completed_at.desc()).all()
-    
+    fragment = request.args.get('fragment')
+    if fragment == 'active':
+        active, next_cursor = paginate_active_challenges()
+        return render_fragment('partials/active_challenge_cards.html', next_cursor,
+                               active_challenges=active)
+    if fragment == 'completed':
+        completed, next_cursor = paginate_completed_challenges()
+        return render_fragment('partials/completed_challenge_cards.html', next_cursor,
+                               completed_challenges=completed)
+
+    # Each list has its own cursor, so the first page ignores ?cursor=
+    active, active_next = paginate_active_challenges(first_page=True)
+    completed, completed_next = paginate_completed_challenges(first_page=True)
     return render_template('challenges.html', 
                          active_challenges=active,
                          completed_challenges=completed,
-                         timedelta=timedelta)
+                         active_next=active_next,
+                         completed_next=completed_next)
 
 @main.route('/challenges/generate', methods=['POST'])
 @login_required
 def create_challenge():
-    """Generate a new challenge for the user."""
-    try:
-        data = request.get_json()
-        difficulty = request.form.get('difficulty', 'medium').lower()
-        
-        # Generate the appropriate prompt
-        prompt = generate_challenge_prompt(difficulty)
-        
-        # Call OpenRouter API directly
-        OPENROUTER_API_KEY = "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"
-        
-        headers = {
-            'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'http://localhost:5000',
-            'X-Title': 'Wanderlust Challenge Generator'
-        }
-        
-        request_data = {
-            'model': 'mistralai/mistral-7b-instruct',
-            'messages': [
-                {
-                    'role': 'system',
-                    'content': 'You are an expert local guide creating exciting challenges.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'temperature': 0.7,
-            'max_tokens': 1000,
-            'response_format': { 'type': 'json_object' }
-        }
-        
-        response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers=headers,
-                json=request_data,
-                timeout=30
-            )
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code: {response.status_code}\nResponse: {response.text}")
-        
-        # Parse the response
-        api_response = response.json()
-        if not api_response.get('choices') or not api_response['choices'][0].get('message'):
-            raise Exception("Invalid API response format")
-        
-        # Extract and parse the challenge data
-        challenge_text = api_response['choices'][0]['message']['content']
-        
-        try:
-            challenge_data = json.loads(challenge_text)
-        except json.JSONDecodeError:
-            import re
-            json_match = re.search(r'\{.*\}', challenge_text, re.DOTALL)
-            if json_match:
-                challenge_data = json.loads(json_match.group(0))
-            else:
-                raise Exception("Could not parse challenge data as JSON")
-        
-        # Validate required fields
-        required_fields = ['title', 'description', 'activities']
-        missing_fields = [field for field in required_fields if field not in challenge_data]
-        if missing_fields:
-            raise Exception(f"Missing required fields in challenge data: {', '.join(missing_fields)}")
-        
-        # Create new challenge
-        new_challenge = Challenge(
-            title=challenge_data['title'],
-            description=challenge_data['description'],
-            activities=challenge_data['activities'],
-            time_limit=int(challenge_data.get('time_limit', 120)),  # Default 2 hours in minutes
-            points_reward=int(challenge_data.get('points_reward', 0)),
-            user_id=current_user.id
-        )
-        
-        db.session.add(new_challenge)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'challenge': {
-                'id': new_challenge.id,
-                'title': new_challenge.title,
-                'description': new_challenge.description,
-                'activities': new_challenge.activities,
-                'time_limit': new_challenge.time_limit,
-                'points_reward': new_challenge.points_reward
-            }
-        })
-        
-    except Exception as e:
-        print(f"Error generating challenge: {str(e)}")  # For debugging
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
-
+    """Queue generation of a new challenge for the user."""
+    data = request.get_json(silent=True) or {}
+    difficulty = (data.get('difficulty') or request.form.get('difficulty', 'medium')).lower()
+    return start_generation('challenge', difficulty=difficulty)
 
 
 @main.route('/challenges/complete/<int:challenge_id>', methods=['POST'])
@@ -349,9 +288,19 @@ def complete_challenge(challenge_id):
     if challenge.completed:
         return jsonify({"status": "error", "message": "Challenge already completed"}), 400
         
+    if challenge.is_expired():
+        return jsonify({"status": "error", "message": "Challenge has expired"}), 400
+        
     challenge.completed = True
     challenge.completed_at = datetime.utcnow()
-    current_user.points += challenge.points_reward
+    if not award_points(current_user, 'challenge', challenge.id, challenge.points_reward):
+        db.session.rollback()
+        return jsonify({"status": "error", "message": "Challenge already completed"}), 400
+    bump_stats(current_user.id, active_challenges=-1, completed_challenges=1,
+               challenge_points=challenge.points_reward)
+    push_channel.notify(current_user.id, 'challenge_completed', {'id': challenge.id})
+    expiry_scheduler.unschedule(challenge)
+    touch_streak(current_user.id)
     
     db.session.commit()
     
@@ -366,245 +315,31 @@ def complete_challenge(challenge_id):
 
 @main.route('/challenges/active')
 @login_required
+@change_tracker.conditional
 def get_active_challenges():
     """Get user's active challenges."""
-    challenges = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=False
-    ).order_by(Challenge.created_at.desc()).all()
-    
-    return jsonify([{
-        'id': c.id,
-        'title': c.title,
-        'description': c.description,
-        'activities': c.activities,
-        'time_limit': c.time_limit,
-        'points_reward': c.points_reward,
-        'created_at': c.created_at.isoformat()
-    } for c in challenges])
+    rows, next_cursor = paginated(challenge_rows(expired_sql().label('expired')).filter(
+        Challenge.user_id == current_user.id, Challenge.completed == False
+    ), Challenge.created_at, Challenge.id)
+    return jsonify({'items': active_challenge_dicts(rows), 'next': next_cursor})
 
 @main.route('/challenges/completed')
 @login_required
+@change_tracker.conditional
 def get_completed_challenges():
     """Get user's completed challenges."""
-    challenges = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=True
-    ).order_by(Challenge.completed_at.desc()).all()
-    
-    return jsonify([{
-        'id': c.id,
-        'title': c.title,
-        'description': c.description,
-        'activities': c.activities,
-        'time_limit': c.time_limit,
-        'points_reward': c.points_reward,
-        'completed_at': c.completed_at.isoformat()
-    } for c in challenges])
-
-def generate_activity_prompt(category, difficulty):
-    """Generate a dynamic prompt based on category and difficulty."""
-    base_location = "Churchgate, Mumbai"
-    current_time = "daytime"  # You can make this dynamic based on actual time
-    
-    prompts = {
-        "food": {
-            "easy": f"Generate a casual dining experience in {base_location}. Focus on popular, easily accessible restaurants or cafes with average pricing. Include:\n"
-                   "1. Restaurant/cafe name\n"
-                   "2. Type of cuisine\n"
-                   "3. Must-try dishes (2-3 items)\n"
-                   "4. Average cost for two\n"
-                   "5. Exact location\n"
-                   "6. Best time to visit\n"
-                   "7. Duration: 30-60 minutes\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "medium": f"Create a food exploration activity in {base_location} that includes multiple stops. Consider:\n"
-                     "1. 2-3 different eateries\n"
-                     "2. Mix of street food and restaurants\n"
-                     "3. Specific food items to try at each stop\n"
-                     "4. Total budget range\n"
-                     "5. Suggested route\n"
-                     "6. Duration: 1-2 hours\n"
-                     "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "hard": f"Design a comprehensive food tour in {base_location} that includes:\n"
-                   "1. 4-5 diverse food establishments\n"
-                   "2. Mix of historic and modern eateries\n"
-                   "3. Special dishes and their history\n"
-                   "4. Cultural significance of each stop\n"
-                   "5. Detailed tasting notes\n"
-                   "6. Duration: 2-3 hours\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location"
-        },
-        "culture": {
-            "easy": f"Create a simple cultural activity in {base_location} suitable for {current_time}. Include:\n"
-                   "1. One main cultural site or institution\n"
-                   "2. Its historical significance\n"
-                   "3. Key things to observe\n"
-                   "4. Best time to visit\n"
-                   "5. Duration: 30-60 minutes\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "medium": f"Design a cultural exploration in {base_location} that includes:\n"
-                     "1. 2-3 cultural sites\n"
-                     "2. Historical background\n"
-                     "3. Cultural practices to observe\n"
-                     "4. Photo opportunities\n"
-                     "5. Local customs to be aware of\n"
-                     "6. Duration: 1-2 hours\n"
-                     "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "hard": f"Create an immersive cultural experience in {base_location} covering:\n"
-                   "1. Multiple historical sites\n"
-                   "2. Local art and architecture\n"
-                   "3. Cultural workshops or activities\n"
-                   "4. Traditional performances if available\n"
-                   "5. Cultural significance of each location\n"
-                   "6. Duration: 2-3 hours\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location"
-        },
-        "adventure": {
-            "easy": f"Design a light adventure activity in {base_location} suitable for {current_time}. Include:\n"
-                   "1. One main location or activity\n"
-                   "2. Required preparation\n"
-                   "3. Safety considerations\n"
-                   "4. Best time to do it\n"
-                   "5. Duration: 30-60 minutes\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "medium": f"Create an engaging adventure in {base_location} that includes:\n"
-                     "1. 2-3 different activities\n"
-                     "2. Required equipment or preparation\n"
-                     "3. Physical requirements\n"
-                     "4. Safety guidelines\n"
-                     "5. Alternative options\n"
-                     "6. Duration: 1-2 hours\n"
-                     "Format the response as JSON with these exact keys: title, description, duration, location",
-            
-            "hard": f"Design a challenging adventure experience in {base_location} that involves:\n"
-                   "1. Multiple challenging activities\n"
-                   "2. Detailed preparation requirements\n"
-                   "3. Physical fitness needs\n"
-                   "4. Safety protocols\n"
-                   "5. Emergency contacts\n"
-                   "6. Duration: 2-3 hours\n"
-                   "Format the response as JSON with these exact keys: title, description, duration, location"
-        }
-    }
-    
-    # Get the prompt for the selected category and difficulty
-    selected_category = prompts.get(category.lower())
-    if not selected_category:
-        raise Exception(f"Invalid category: {category}. Must be one of: {', '.join(prompts.keys())}")
-        
-    selected_prompt = selected_category.get(difficulty.lower())
-    if not selected_prompt:
-        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(selected_category.keys())}")
-    
-    return selected_prompt
+    rows, next_cursor = paginated(challenge_rows().filter(
+        Challenge.user_id == current_user.id, Challenge.completed == True
+    ), Challenge.completed_at, Challenge.id, nullable=True)
+    return jsonify({'items': completed_challenge_dicts(rows), 'next': next_cursor})
+
 
 @main.route('/generate_activity', methods=['POST'])
 @login_required
 def generate_activity():
-    try:
-        category = request.form.get('category', 'food').lower()
-        difficulty = request.form.get('difficulty', 'easy').lower()
-        
-        # Generate the appropriate prompt
-        prompt = generate_activity_prompt(category, difficulty)
-        
-        # Call OpenRouter API directly (no OpenAI client needed)
-        OPENROUTER_API_KEY = "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"  # Replace with your actual OpenRouter API key
-        
-        headers = {
-            'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'http://localhost:5000',
-            'X-Title': 'Wanderlust Adventure Generator'
-        }
-        
-        request_data = {
-            'model': 'mistralai/mistral-7b-instruct',
-            'messages': [
-                {
-                    'role': 'system',
-                    'content': 'You are an expert local guide in Mumbai, specializing in creating personalized adventures. Always respond in the exact JSON format requested with these keys: title, description, duration, location'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'temperature': 0.7,
-            'max_tokens': 1000,
-            'response_format': { 'type': 'json_object' }
-        }
-        
-        response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers=headers,
-            json=request_data,
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code: {response.status_code}\nResponse: {response.text}")
-            
-        # Parse the response
-        api_response = response.json()
-        if not api_response.get('choices') or not api_response['choices'][0].get('message'):
-            raise Exception("Invalid API response format")
-            
-        # Extract and parse the activity data
-        activity_text = api_response['choices'][0]['message']['content']
-        
-        # Try to parse the JSON response
-        try:
-            activity_data = json.loads(activity_text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from the text
-            import re
-            json_match = re.search(r'\{.*\}', activity_text, re.DOTALL)
-            if json_match:
-                activity_data = json.loads(json_match.group(0))
-            else:
-                raise Exception("Could not parse activity data as JSON")
-        
-        # Create new activity
-        new_activity = Activity(
-            title=activity_data['title'],
-            description=activity_data['description'],
-            category=category,
-            difficulty=difficulty,
-            duration=activity_data.get('duration', '60 minutes'),
-            location=activity_data.get('location', 'Churchgate, Mumbai'),
-            user_id=current_user.id
-        )
-        
-        db.session.add(new_activity)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'activity': {
-                'id': new_activity.id,
-                'title': new_activity.title,
-                'description': new_activity.description,
-                'category': new_activity.category,
-                'difficulty': new_activity.difficulty,
-                'duration': new_activity.duration,
-                'location': new_activity.location
-            }
-        })
-        
-    except Exception as e:
-        print(f"Error generating activity: {str(e)}")  # For debugging
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    category = request.form.get('category', 'food').lower()
+    difficulty = request.form.get('difficulty', 'easy').lower()
+    return start_generation('activity', category=category, difficulty=difficulty)
 
 @main.route('/complete_activity/<int:activity_id>', methods=['POST'])
 @login_required
@@ -613,20 +348,24 @@ def complete_activity(activity_id):
     if activity.user_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    if activity.completed:
+        return jsonify({'error': 'Activity already completed'}), 400
+    
     activity.completed = True
-    current_user.points += calculate_points(activity)
+    activity.completed_at = datetime.utcnow()
+    points_earned = calculate_points(activity)
+    if not award_points(current_user, 'activity', activity.id, points_earned, activity.category):
+        db.session.rollback()
+        return jsonify({'error': 'Activity already completed'}), 400
+    bump_stats(current_user.id, completed_activities=1, activity_points=points_earned)
+    touch_streak(current_user.id)
     db.session.commit()
     
     check_achievements()
     return jsonify({'success': True, 'points': current_user.points})
 
 def calculate_points(activity):
-    points = {
-        'easy': 10,
-        'medium': 25,
-        'hard': 50
-    }
-    return points.get(activity.difficulty.lower(), 10)
+    return ACTIVITY_POINTS.get(activity.difficulty.lower(), 10)
 
 def calculate_user_level(points):
     levels = [
@@ -643,257 +382,21 @@ def calculate_user_level(points):
     return levels[0][1]
 
 def check_achievements():
-    # Check for new achievements based on user's activities and points
-    completed_activities = Activity.query.filter_by(
-        user_id=current_user.id, completed=True).count()
-    
-    achievements_data = [
-        {
-            'title': 'Adventure Beginner',
-            'description': 'Complete 5 activities',
-            'requirement': lambda: completed_activities >= 5,
-            'points': 50
-        },
-        {
-            'title': 'Explorer',
-            'description': 'Complete 10 activities',
-            'requirement': lambda: completed_activities >= 10,
-            'points': 100
-        },
-        {
-            'title': 'Wanderlust Master',
-            'description': 'Complete 25 activities',
-            'requirement': lambda: completed_activities >= 25,
-            'points': 250
-        }
-    ]
-    
-    for achievement_data in achievements_data:
-        if achievement_data['requirement']() and not Achievement.query.filter_by(
-            user_id=current_user.id, title=achievement_data['title']).first():
-            new_achievement = Achievement(
-                title=achievement_data['title'],
-                description=achievement_data['description'],
-                points_value=achievement_data['points'],
-                user_id=current_user.id
-            )
-            db.session.add(new_achievement)
-            current_user.points += achievement_data['points']
-            
-    db.session.commit()
-
-def generate_quest_prompt(difficulty):
-    """Generate a dynamic prompt for quest generation."""
-    base_location = "Churchgate, Mumbai"
-    current_time = "evening"  # You can make this dynamic based on actual time
-    
-    prompts = {
-        "easy": f"""Create a beginner-friendly quest in {base_location} with 3 connected steps. 
-Return ONLY a JSON object with this exact format:
-{{
-    "title": "Quest title here",
-    "description": "Overall quest description here",
-    "duration": 90,
-    "steps": [
-        {{
-            "title": "Step 1 title",
-            "description": "Step 1 description"
-        }},
-        {{
-            "title": "Step 2 title",
-            "description": "Step 2 description"
-        }},
-        {{
-            "title": "Step 3 title",
-            "description": "Step 3 description"
-        }}
-    ]
-}}
+    """Award any achievements the current user now qualifies for."""
+    try:
+        achievement_engine.check(current_user)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        achievement_engine.forget(current_user.id)
+        raise
 
-The quest should:
-1. Take 1-2 hours total
-2. Include easy-to-find locations
-3. Mix of activities (e.g., food, sightseeing)
-4. Be suitable for any time of day""",
-        
-        "medium": f"""Design a moderate quest in {base_location} with 4 connected steps. 
-Return ONLY a JSON object with this exact format:
-{{
-    "title": "Quest title here",
-    "description": "Overall quest description here",
-    "duration": 150,
-    "steps": [
-        {{
-            "title": "Step 1 title",
-            "description": "Step 1 description"
-        }},
-        {{
-            "title": "Step 2 title",
-            "description": "Step 2 description"
-        }},
-        {{
-            "title": "Step 3 title",
-            "description": "Step 3 description"
-        }},
-        {{
-            "title": "Step 4 title",
-            "description": "Step 4 description"
-        }}
-    ]
-}}
-
-The quest should:
-1. Take 2-3 hours total
-2. Include some lesser-known spots
-3. Mix of activities and challenges
-4. Consider time of day for activities""",
-        
-        "hard": f"""Create a challenging quest in {base_location} with 5 connected steps. 
-Return ONLY a JSON object with this exact format:
-{{
-    "title": "Quest title here",
-    "description": "Overall quest description here",
-    "duration": 210,
-    "steps": [
-        {{
-            "title": "Step 1 title",
-            "description": "Step 1 description"
-        }},
-        {{
-            "title": "Step 2 title",
-            "description": "Step 2 description"
-        }},
-        {{
-            "title": "Step 3 title",
-            "description": "Step 3 description"
-        }},
-        {{
-            "title": "Step 4 title",
-            "description": "Step 4 description"
-        }},
-        {{
-            "title": "Step 5 title",
-            "description": "Step 5 description"
-        }}
-    ]
-}}
-
-The quest should:
-1. Take 3-4 hours total
-2. Include hidden gems and local secrets
-3. Complex mix of activities and challenges
-4. Strategic planning of timing and routes"""
-    }
-    
-    selected_prompt = prompts.get(difficulty.lower())
-    if not selected_prompt:
-        raise Exception(f"Invalid difficulty: {difficulty}. Must be one of: {', '.join(prompts.keys())}")
-    
-    return selected_prompt
 
 @main.route('/generate_quest', methods=['POST'])
 @login_required
 def generate_quest():
-    try:
-        difficulty = request.form.get('difficulty', 'medium').lower()
-        
-        # Generate the appropriate prompt
-        prompt = generate_quest_prompt(difficulty)
-        
-        # Call OpenRouter API directly (no OpenAI client needed)
-        OPENROUTER_API_KEY = "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"
-        
-        headers = {
-            'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'http://localhost:5000',
-            'X-Title': 'Wanderlust Quest Generator'
-        }
-        
-        request_data = {
-            'model': 'mistralai/mistral-7b-instruct',
-            'messages': [
-                {
-                    'role': 'system',
-                    'content': 'You are an expert local guide in Mumbai. You must ONLY return a JSON object with the exact format specified in the prompt. Do not include any other text or explanations.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'temperature': 0.7,
-            'max_tokens': 1000,
-            'response_format': { 'type': 'json_object' }
-        }
-        
-        response = requests.post(
-            'https://openrouter.ai/api/v1/chat/completions',
-            headers=headers,
-            json=request_data,
-            timeout=30
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code: {response.status_code}\nResponse: {response.text}")
-        
-        # Parse the response
-        api_response = response.json()
-        if not api_response.get('choices') or not api_response['choices'][0].get('message'):
-            raise Exception("Invalid API response format")
-        
-        # Extract and parse the quest data
-        quest_text = api_response['choices'][0]['message']['content']
-        
-        try:
-            quest_data = json.loads(quest_text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, try to extract JSON from the text
-            import re
-            json_match = re.search(r'\{.*\}', quest_text, re.DOTALL)
-            if json_match:
-                quest_data = json.loads(json_match.group(0))
-            else:
-                raise Exception("Could not parse quest data as JSON")
-        
-        # Validate required fields
-        required_fields = ['title', 'description', 'steps']
-        missing_fields = [field for field in required_fields if field not in quest_data]
-        if missing_fields:
-            raise Exception(f"Missing required fields in quest data: {', '.join(missing_fields)}")
-        
-        # Create new quest
-        new_quest = Quest(
-            title=quest_data['title'],
-            description=quest_data['description'],
-            difficulty=difficulty,
-            duration=int(quest_data.get('duration', 120)),  # Default 2 hours in minutes
-            steps=quest_data['steps'],
-            user_id=current_user.id
-        )
-        
-        db.session.add(new_quest)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'quest': {
-                'id': new_quest.id,
-                'title': new_quest.title,
-                'description': new_quest.description,
-                'difficulty': new_quest.difficulty,
-                'duration': new_quest.duration,
-                'steps': new_quest.steps
-            }
-        })
-        
-    except Exception as e:
-        print(f"Error generating quest: {str(e)}")  # For debugging
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    difficulty = request.form.get('difficulty', 'medium').lower()
+    return start_generation('quest', difficulty=difficulty)
 
 @main.route('/complete_quest/<int:quest_id>', methods=['POST'])
 @login_required
@@ -910,21 +413,21 @@ def complete_quest(quest_id):
             return jsonify({'success': False, 'error': 'Quest already completed'}), 400
         
         # Calculate points based on difficulty
-        points_map = {
-            'easy': 100,
-            'medium': 200,
-            'hard': 300
-        }
-        points_earned = points_map.get(quest.difficulty.lower(), 100)
+        points_earned = QUEST_POINTS.get(quest.difficulty.lower(), 100)
         
         # Update quest
         quest.completed_at = datetime.utcnow()
         quest.points = points_earned
         
         # Add points to user
-        current_user.points = (current_user.points or 0) + points_earned
+        if not award_points(current_user, 'quest', quest.id, points_earned):
+            db.session.rollback()
+            return jsonify({'success': False, 'error': 'Quest already completed'}), 400
+        bump_stats(current_user.id, active_quests=-1, completed_quests=1, quest_points=points_earned)
+        touch_streak(current_user.id)
         
         db.session.commit()
+        check_achievements()
         
         return jsonify({
             'success': True,
@@ -936,31 +439,6 @@ def complete_quest(quest_id):
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def generate_challenge_prompt(difficulty):
-    base_prompt = """Create an exciting mini-adventure challenge with multiple related activities. 
-    Format the response as a JSON object with the following structure:
-    {
-        "title": "Challenge title",
-        "description": "Overall challenge description",
-        "activities": [
-            {
-                "description": "Activity description",
-                "time_limit": minutes_to_complete,
-                "completed": false,
-                "points": points_for_activity
-            }
-        ],
-        "total_time_limit": total_minutes,
-        "points_reward": total_points
-    }"""
-    
-    difficulty_modifiers = {
-        "easy": "3-4 simple activities, 15-30 minutes each, total time 2 hours",
-        "medium": "4-5 moderate activities, 30-45 minutes each, total time 3 hours",
-        "hard": "5-6 challenging activities, 45-60 minutes each, total time 4 hours"
-    }
-    
-    return f"{base_prompt}\n\nDifficulty level: {difficulty_modifiers[difficulty]}"
 
 @main.route('/challenges/accept/<int:challenge_id>', methods=['POST'])
 @login_required
@@ -974,8 +452,14 @@ def accept_challenge(challenge_id):
         if challenge.accepted:
             return jsonify({"status": "error", "message": "Challenge already accepted"}), 400
             
+        if challenge.is_expired():
+            return jsonify({"status": "error", "message": "Challenge has expired"}), 400
+            
         challenge.accepted = True
         challenge.accepted_at = datetime.utcnow()
+        # The time limit runs from acceptance
+        challenge.start_clock(challenge.accepted_at)
+        expiry_scheduler.schedule(challenge)
         db.session.commit()
         
         return jsonify({
@@ -990,7 +474,8 @@ def accept_challenge(challenge_id):
 @login_required
 def complete_activity2(challenge_id, activity_index):
     try:
-        challenge = Challenge.query.get_or_404(challenge_id)
+        # The step rows aren't needed, only the counters
+        challenge = Challenge.query.options(lazyload(Challenge.step_rows)).get_or_404(challenge_id)
         
         if challenge.user_id != current_user.id:
             return jsonify({"status": "error", "message": "Unauthorized"}), 403
@@ -1001,20 +486,30 @@ def complete_activity2(challenge_id, activity_index):
         if challenge.is_expired():
             return jsonify({"status": "error", "message": "Challenge has expired"}), 400
             
-        if activity_index >= len(challenge.activities):
+        if activity_index >= challenge.steps_total:
             return jsonify({"status": "error", "message": "Invalid activity index"}), 400
             
         # Update activity completion
-        challenge.activities[activity_index]['completed'] = True
-        challenge.activities[activity_index]['completed_at'] = datetime.utcnow().isoformat()
+        steps_completed = complete_step(challenge, activity_index)
+        if steps_completed is None:
+            return jsonify({"status": "error", "message": "Activity already completed"}), 400
         
         # Check if all activities are completed
-        if all(activity['completed'] for activity in challenge.activities):
+        if steps_completed == challenge.steps_total:
             challenge.completed = True
             challenge.completed_at = datetime.utcnow()
-            current_user.points += challenge.points_reward
+            if not award_points(current_user, 'challenge', challenge.id, challenge.points_reward):
+                db.session.rollback()
+                return jsonify({"status": "error", "message": "Challenge already completed"}), 400
+            bump_stats(current_user.id, active_challenges=-1, completed_challenges=1,
+                       challenge_points=challenge.points_reward)
+            push_channel.notify(current_user.id, 'challenge_completed', {'id': challenge.id})
+            expiry_scheduler.unschedule(challenge)
+            touch_streak(current_user.id)
             
         db.session.commit()
+        if challenge.completed:
+            check_achievements()
         
         return jsonify({
             "status": "success",
@@ -1030,168 +525,315 @@ def complete_activity2(challenge_id, activity_index):
 @main.route('/generate_challenge', methods=['POST'])
 @login_required
 def generate_challenge():
-    try:
-        difficulty = request.form.get('difficulty', 'medium').lower()
-        
-        # Generate the appropriate prompt
-        prompt = generate_challenge_prompt(difficulty)
-        
-        # Call OpenRouter API directly
-        OPENROUTER_API_KEY = "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"
-        
-        headers = {
-            'Authorization': f'Bearer {OPENROUTER_API_KEY}',
-            'Content-Type': 'application/json',
-            'HTTP-Referer': 'http://localhost:5000',
-            'X-Title': 'Wanderlust Challenge Generator'
-        }
-        
-        request_data = {
-            'model': 'mistralai/mistral-7b-instruct',
-            'messages': [
-                {
-                    'role': 'system',
-                    'content': 'You are an expert local guide creating exciting challenges.'
-                },
-                {
-                    'role': 'user',
-                    'content': prompt
-                }
-            ],
-            'temperature': 0.7,
-            'max_tokens': 1000,
-            'response_format': { 'type': 'json_object' }
-        }
-        
-        response = requests.post(
-                'https://openrouter.ai/api/v1/chat/completions',
-                headers=headers,
-                json=request_data,
-                timeout=30
-            )
-        
-        if response.status_code != 200:
-            raise Exception(f"API request failed with status code: {response.status_code}\nResponse: {response.text}")
-        
-        # Parse the response
-        api_response = response.json()
-        if not api_response.get('choices') or not api_response['choices'][0].get('message'):
-            raise Exception("Invalid API response format")
-        
-        # Extract and parse the challenge data
-        challenge_text = api_response['choices'][0]['message']['content']
-        
-        try:
-            challenge_data = json.loads(challenge_text)
-        except json.JSONDecodeError:
-            import re
-            json_match = re.search(r'\{.*\}', challenge_text, re.DOTALL)
-            if json_match:
-                challenge_data = json.loads(json_match.group(0))
-            else:
-                raise Exception("Could not parse challenge data as JSON")
-        
-        # Validate required fields
-        required_fields = ['title', 'description', 'activities']
-        missing_fields = [field for field in required_fields if field not in challenge_data]
-        if missing_fields:
-            raise Exception(f"Missing required fields in challenge data: {', '.join(missing_fields)}")
-        
-        # Create new challenge
-        new_challenge = Challenge(
-            title=challenge_data['title'],
-            description=challenge_data['description'],
-            activities=challenge_data['activities'],
-            time_limit=int(challenge_data.get('time_limit', 120)),  # Default 2 hours in minutes
-            points_reward=int(challenge_data.get('points_reward', 0)),
-            user_id=current_user.id
-        )
-        
-        db.session.add(new_challenge)
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'challenge': {
-                'id': new_challenge.id,
-                'title': new_challenge.title,
-                'description': new_challenge.description,
-                'activities': new_challenge.activities,
-                'time_limit': new_challenge.time_limit,
-                'points_reward': new_challenge.points_reward
-            }
-        })
-        
-    except Exception as e:
-        print(f"Error generating challenge: {str(e)}")  # For debugging
-        db.session.rollback()
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+    difficulty = request.form.get('difficulty', 'medium').lower()
+    return start_generation('challenge', difficulty=difficulty)
 
 
-@main.route('/challenges/complete/<int:challenge_id>', methods=['POST'])
-@login_required
-def get_challenge(challenge_id):
-    """Mark a challenge as completed and award points."""
-    challenge = Challenge.query.get_or_404(challenge_id)
-    
-    if challenge.user_id != current_user.id:
-        return jsonify({"status": "error", "message": "Unauthorized"}), 403
-        
-    if challenge.completed:
-        return jsonify({"status": "error", "message": "Challenge already completed"}), 400
-        
-    challenge.completed = True
-    challenge.completed_at = datetime.utcnow()
-    current_user.points += challenge.points_reward
-    
-    db.session.commit()
-    
-    # Check for achievements
-    check_achievements()
-    
-    return jsonify({
-        "status": "success",
-        "message": "Challenge completed!",
-        "points_earned": challenge.points_reward
-    })
-
 @main.route('/active_challenges')
 @login_required
+@change_tracker.conditional
 def active_challenges():
     """Get user's active challenges."""
-    challenges = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=False
-    ).order_by(Challenge.created_at.desc()).all()
-    
-    return jsonify([{
-        'id': c.id,
-        'title': c.title,
-        'description': c.description,
-        'activities': c.activities,
-        'time_limit': c.time_limit,
-        'points_reward': c.points_reward,
-        'created_at': c.created_at.isoformat()
-    } for c in challenges])
+    rows, next_cursor = paginated(challenge_rows(expired_sql().label('expired')).filter(
+        Challenge.user_id == current_user.id, Challenge.completed == False
+    ), Challenge.created_at, Challenge.id)
+    return jsonify({'items': active_challenge_dicts(rows), 'next': next_cursor})
 
 @main.route('/completed_challenges')
 @login_required
+@change_tracker.conditional
 def completed_challenges():
     """Get user's completed challenges."""
-    challenges = Challenge.query.filter_by(
-        user_id=current_user.id,
-        completed=True
-    ).order_by(Challenge.completed_at.desc()).all()
-    
-    return jsonify([{
-        'id': c.id,
-        'title': c.title,
-        'description': c.description,
-        'activities': c.activities,
-        'time_limit': c.time_limit,
-        'points_reward': c.points_reward,
-        'completed_at': c.completed_at.isoformat()
-    } for c in challenges])
+    rows, next_cursor = paginated(challenge_rows().filter(
+        Challenge.user_id == current_user.id, Challenge.completed == True
+    ), Challenge.completed_at, Challenge.id, nullable=True)
+    return jsonify({'items': completed_challenge_dicts(rows), 'next': next_cursor})
+
+def paginated(query, sort_column, id_column, first_page=False, nullable=False):
+    """Page ``query`` newest first using the request's ``cursor`` and ``limit``."""
+    cursor = None if first_page else request.args.get('cursor')
+    return paginate(query, sort_column, id_column, cursor, request.args.get('limit', type=int), nullable)
+
+def paginate_active_challenges(first_page=False):
+    # Expiry is worked out by the query, not per challenge in Python
+    query = Challenge.query.filter_by(user_id=current_user.id, completed=False).options(
+        with_expression(Challenge.expired, expired_sql()))
+    return paginated(query, Challenge.created_at, Challenge.id, first_page)
+
+def paginate_completed_challenges(first_page=False):
+    # Challenges completed before completion times were recorded have none
+    return paginated(Challenge.query.filter_by(user_id=current_user.id, completed=True),
+                     Challenge.completed_at, Challenge.id, first_page, nullable=True)
+
+def render_fragment(template, next_cursor, **context):
+    """Render the cards for one infinite-scroll page; the cursor for the
+    page after it goes in the ``X-Next-Cursor`` header."""
+    response = make_response(render_template(template, **context))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@main.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return jsonify({'success': False, 'error': str(error)}), 400
+
+def validate_generation(kind, **params):
+    """Check generation parameters; returns ``(cache_mode, error_response)``."""
+    cache_mode = request.values.get('cache') or None
+    try:
+        generation.validate_params(kind, **params)
+        if cache_mode and cache_mode not in CACHE_MODES:
+            raise Exception(f"Invalid cache mode: {cache_mode}. Must be one of: {', '.join(CACHE_MODES)}")
+    except Exception as e:
+        return None, (jsonify({'success': False, 'error': str(e)}), 400)
+    return cache_mode, None
+
+def start_generation(kind, **params):
+    """Validate the request, then hand out pre-generated content if the pool
+    has some, or queue a live generation job for the current user.
+
+    Passing ``cache=bypass`` or ``cache=refresh`` skips the pool and the
+    response cache lookup.
+    """
+    cache_mode, error = validate_generation(kind, **params)
+    if error:
+        return error
+
+    result = None
+    if not cache_mode and kind in generation.CREATORS:
+        try:
+            result = generation.generate_from_pool(kind, current_user.id, **params)
+        except Exception:
+            current_app.logger.exception(f"Error taking {kind} from content pool")
+            db.session.rollback()
+    if result is not None:
+        return jsonify(dict(result, success=True))
+
+    try:
+        job = generation_queue.submit(kind, current_user.id, cache_mode=cache_mode, **params)
+    except QueueFull as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('main.job_status', job_id=job.id),
+        'events_url': url_for('main.job_events', job_id=job.id)
+    }), 202
+
+@main.route('/generate_activities/batch', methods=['POST'])
+@login_required
+def generate_activity_batch():
+    """Generate several activities (e.g. 5 food activities of mixed
+    difficulty) from a single LLM call."""
+    count = request.form.get('count', 5, type=int)
+    category = request.form.get('category', 'mixed').lower()
+    difficulty = request.form.get('difficulty', 'mixed').lower()
+    return start_generation('activity_batch', count=count, category=category, difficulty=difficulty)
+
+@main.route('/generate_quests/batch', methods=['POST'])
+@login_required
+def generate_quest_batch():
+    """Generate several quests from a single LLM call."""
+    count = request.form.get('count', 3, type=int)
+    difficulty = request.form.get('difficulty', 'mixed').lower()
+    return start_generation('quest_batch', count=count, difficulty=difficulty)
+
+def stream_generation(kind, **params):
+    """Relay a streamed generation to the browser as server-sent events."""
+    cache_mode, error = validate_generation(kind, **params)
+    if error:
+        return error
+    user_id = current_user.id
+
+    def events():
+        # Flush something straight away so the browser sees the first byte
+        yield ': generating\n\n'
+        try:
+            for event, data in generation.stream_generation(kind, user_id, cache_mode, **params):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            current_app.logger.exception(f"Error streaming {kind}")
+            db.session.rollback()
+            yield f"event: error\ndata: {json.dumps({'success': False, 'error': str(e)})}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/generate_activity/stream', methods=['POST'])
+@login_required
+def generate_activity_stream():
+    category = request.form.get('category', 'food').lower()
+    difficulty = request.form.get('difficulty', 'easy').lower()
+    return stream_generation('activity', category=category, difficulty=difficulty)
+
+@main.route('/generate_quest/stream', methods=['POST'])
+@login_required
+def generate_quest_stream():
+    difficulty = request.form.get('difficulty', 'medium').lower()
+    return stream_generation('quest', difficulty=difficulty)
+
+@main.route('/generate_challenge/stream', methods=['POST'])
+@login_required
+def generate_challenge_stream():
+    difficulty = request.form.get('difficulty', 'medium').lower()
+    return stream_generation('challenge', difficulty=difficulty)
+
+def get_user_job(job_id):
+    job = generation_queue.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return None
+    return job
+
+@main.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Poll the status of a generation job."""
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@main.route('/jobs/<job_id>/events')
+@login_required
+def job_events(job_id):
+    """Stream the outcome of a generation job as a server-sent event."""
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    def stream():
+        while not job.done.wait(15):
+            yield ': keep-alive\n\n'
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/jobs/stats')
+@login_required
+def job_stats():
+    """Queue depth, worker count and per-job latency of the generation queue."""
+    return jsonify(dict(generation_queue.stats(), openrouter=openrouter_client.stats()))
+
+@main.route('/pool/stats')
+@login_required
+def pool_stats():
+    """Warm content pool levels, hit rate and refill activity."""
+    return jsonify(content_pool.stats())
+
+@main.route('/llm_cache/stats')
+@login_required
+def llm_cache_stats():
+    """Response cache hit/miss/eviction counters and the upstream time saved."""
+    return jsonify(llm_cache.stats())
+
+@main.route('/llm/stats')
+@login_required
+def llm_stats():
+    """Per-kind LLM routes and each provider's calls, errors and latency."""
+    return jsonify(llm_router.stats())
+
+@main.route('/achievements/stats')
+@login_required
+def achievement_stats():
+    """Rule count, unlocks and hit rate of the unlocked-set cache."""
+    return jsonify(achievement_engine.stats())
+
+@main.route('/etag/stats')
+@login_required
+def etag_stats():
+    """Share of list-view requests answered with 304 Not Modified, per endpoint."""
+    return jsonify(change_tracker.stats())
+
+@main.route('/leaderboard')
+@login_required
+def leaderboard():
+    """Top-K page of a leaderboard plus the current user's rank.
+
+    ``board`` is ``global``, ``weekly`` or an activity category.
+    """
+    name = request.args.get('board', 'global').lower()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), current_app.config['PAGE_SIZE_MAX'])
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if name not in leaderboards.names() and name not in generation.CATEGORIES:
+        return jsonify({'success': False, 'error': f"Unknown leaderboard: {name}"}), 400
+
+    top = leaderboards.top(name, limit, offset)
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_([user_id for user_id, _ in top])))
+    return jsonify({
+        'success': True,
+        'board': name,
+        'entries': [{'rank': offset + position + 1, 'user_id': user_id, 'username': usernames.get(user_id),
+                     'points': points} for position, (user_id, points) in enumerate(top)],
+        'me': leaderboards.rank(name, current_user.id)
+    })
+
+@main.route('/leaderboard/stats')
+@login_required
+def leaderboard_stats():
+    """Board sizes, rebuild time and update/lookup counters."""
+    return jsonify(leaderboards.stats())
+
+@main.route('/user_cache/stats')
+@login_required
+def user_cache_stats():
+    """Hit rate of the cached user loader."""
+    return jsonify(user_cache.stats())
+
+@main.route('/events')
+@login_required
+def events():
+    """Server-sent events for the current user: points, achievements,
+    challenge expiry and finished generation jobs."""
+    stream = push_channel.stream(current_user.id, current_user.points)
+    # Hand the connection back to the pool, the stream can stay open for hours
+    db.session.close()
+
+    return Response(stream,
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/get_points')
+@login_required
+def get_points():
+    """Current points balance, for pages without an event stream."""
+    return jsonify({'points': current_user.points or 0})
+
+@main.route('/push/stats')
+@login_required
+def push_stats():
+    """Open event streams, events published and delivered, and drops."""
+    return jsonify(push_channel.stats())
+
+@main.route('/fragments/stats')
+@login_required
+def fragment_stats():
+    """Page fragment cache hit rate and size, and render time per template."""
+    return jsonify(fragment_cache.stats())
+
+@main.route('/expiry/stats')
+@login_required
+def expiry_stats():
+    """Pending challenge deadlines, expiries and scheduler lag."""
+    return jsonify(expiry_scheduler.stats())
+
+@main.route('/assets/<path:filename>')
+def asset(filename):
+    """A fingerprinted static file, precompressed and cached as immutable."""
+    response = asset_pipeline.send(filename)
+    if response is None:
+        return jsonify({'error': 'Asset not found'}), 404
+    return response
+
+@main.route('/assets/stats')
+@login_required
+def asset_stats():
+    """Asset build size savings, build time and which encoders are available."""
+    return jsonify(asset_pipeline.stats())
+
+@main.route('/startup/stats')
+@login_required
+def startup_stats():
+    """Time spent in each create_app step when this process started."""
+    return jsonify(current_app.extensions['startup'].stats())
@@ -0,0 +1,112 @@
+"""Schema check at boot, in place of an unconditional ``create_all``.
+
+The models' tables, columns and indexes hash to a schema fingerprint. On
+SQLite it is stamped in ``PRAGMA user_version`` once the database is known
+to match, so later boots cost a single pragma read. Otherwise (a new or
+changed schema, or another database) missing tables are created and the
+existing ones are compared with the models. Columns that are missing are
+not added: startup stops with ``SchemaOutdated``, naming ``flask migrate``,
+which runs the scripts in ``migrations/`` in ``MIGRATIONS`` order. Each
+script skips the changes a database already has, so the whole sequence can
+run on any older database.
+"""
+import importlib.util
+import os
+import zlib
+from sqlalchemy import inspect
+
+# Later scripts read columns that earlier ones add (add_user_stats computes
+# streaks from activity.completed_at), so they run in this order
+MIGRATIONS = [
+    'add_user_notifications',
+    'add_challenge_completed_at',
+    'add_quest_completed_at',
+    'add_hot_query_indexes',
+    'add_activity_completed_at',
+    'add_user_stats',
+    'add_user_stats_streaks',
+    'add_keyset_pagination_index',
+    'add_user_data_version',
+    'add_points_ledger',
+    'add_step_tables',
+    'add_challenge_expiry',
+]
+
+
+class SchemaOutdated(Exception):
+    """Raised when the database is missing columns the models have."""
+
+
+def schema_fingerprint(metadata):
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        parts.append(table.name + ':' + ','.join(sorted(column.name for column in table.columns)))
+        parts.extend(sorted(index.name for index in table.indexes if index.name))
+    # user_version is a signed 32-bit integer
+    return zlib.crc32('\n'.join(parts).encode('utf-8')) & 0x7fffffff
+
+
+def column_names(db, table):
+    """The columns ``table`` has in the database, for migrations to check."""
+    return {column['name'] for column in inspect(db.session.connection()).get_columns(table)}
+
+
+def run_migrations(db, directory, progress=None):
+    """Run ``upgrade(db)`` of every script in ``MIGRATIONS`` in order.
+
+    Call inside an app context. ``progress`` is called with each name first.
+    """
+    for name in MIGRATIONS:
+        if progress:
+            progress(name)
+        spec = importlib.util.spec_from_file_location(f'migrations.{name}', os.path.join(directory, f'{name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(db)
+
+
+def missing_columns(engine, metadata):
+    """``table.column`` names the models have and the database doesn't."""
+    inspector = inspect(engine)
+    missing = []
+    for table in metadata.tables.values():
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in existing)
+    return missing
+
+
+def ensure_schema(db):
+    """Make sure the database has the models' schema; returns ``current``
+    (stamp matched) or ``verified`` (checked and stamped). Raises
+    ``SchemaOutdated`` when columns are missing, so the app never serves
+    against a schema it would fail on.
+
+    Call inside an app context.
+    """
+    from flask import current_app
+
+    timer = current_app.extensions.get('startup')
+    if timer is None:
+        return _ensure_schema(db)
+    with timer.step('schema'):
+        return _ensure_schema(db)
+
+
+def _ensure_schema(db):
+    engine = db.engine
+    expected = schema_fingerprint(db.metadata)
+    sqlite = engine.dialect.name == 'sqlite'
+    if sqlite:
+        with engine.connect() as connection:
+            if connection.exec_driver_sql('PRAGMA user_version').scalar() == expected:
+                return 'current'
+
+    db.create_all()
+    missing = missing_columns(engine, db.metadata)
+    if missing:
+        raise SchemaOutdated(f"Database is missing columns {', '.join(missing)}; "
+                             f"run `flask --app wanderlust.app migrate` before starting the app")
+    if sqlite:
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f'PRAGMA user_version = {expected}')
+    return 'verified'
@@ -0,0 +1,141 @@
+"""Serialization of list responses.
+
+The JSON list endpoints select only the columns a response carries and
+build dicts straight from the result tuples. No ORM objects are built or
+added to the identity map. Steps for a whole page come from one query on
+the step table. Encoding goes through ``app.json``, which uses orjson when
+it is installed (``JSON_BACKEND``) and Flask's stdlib provider otherwise.
+"""
+import os
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from . import db
+from .models import Challenge, ChallengeStep, Quest, QuestStep, step_to_dict
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, with the same output rules as
+    the default one (sorted keys, HTTP dates for datetimes)."""
+
+    def options(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for json.dumps options get the stdlib encoder
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.options()
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=option) + b'\n',
+                                        mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Use orjson for ``jsonify`` unless ``JSON_BACKEND`` is ``json`` or it
+    isn't installed."""
+    app.config.setdefault('JSON_BACKEND', os.getenv('JSON_BACKEND', 'orjson'))
+    if app.config['JSON_BACKEND'] == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+
+
+QUEST_COLUMNS = (Quest.id, Quest.title, Quest.description, Quest.difficulty, Quest.duration,
+                 Quest.user_id, Quest.created_at, Quest.completed_at, Quest.points)
+CHALLENGE_COLUMNS = (Challenge.id, Challenge.title, Challenge.description, Challenge.time_limit,
+                     Challenge.points_reward, Challenge.created_at, Challenge.completed_at,
+                     Challenge.accepted, Challenge.expires_at)
+STEP_COLUMNS = ('position', 'title', 'description', 'time_limit', 'points', 'completed_at')
+
+
+def quest_rows(*columns):
+    """A query for the quest list columns (plus ``columns``) as tuples."""
+    return db.session.query(*QUEST_COLUMNS, *columns)
+
+
+def challenge_rows(*columns):
+    """A query for the challenge list columns (plus ``columns``) as tuples."""
+    return db.session.query(*CHALLENGE_COLUMNS, *columns)
+
+
+def load_steps(step_model, parent_column, parent_ids):
+    """``{parent_id: [step dict, ...]}`` for a page of parents, in one query."""
+    if not parent_ids:
+        return {}
+    always_report_completed = step_model.always_report_completed
+    rows = db.session.execute(
+        select(parent_column, *[getattr(step_model, name) for name in STEP_COLUMNS])
+        .where(parent_column.in_(parent_ids))
+        .order_by(parent_column, step_model.position))
+    steps = {}
+    for row in rows:
+        steps.setdefault(row[0], []).append(step_to_dict(row, always_report_completed))
+    return steps
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def quest_dicts(rows):
+    """Rows from ``quest_rows()`` in the ``Quest.to_dict()`` shape."""
+    steps = load_steps(QuestStep, QuestStep.quest_id, [row.id for row in rows])
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'difficulty': row.difficulty,
+        'duration': row.duration,
+        'steps': steps.get(row.id, []),
+        'user_id': row.user_id,
+        'created_at': row.created_at.isoformat(),
+        'completed_at': _isoformat(row.completed_at),
+        'points': row.points
+    } for row in rows]
+
+
+def active_challenge_dicts(rows):
+    """Rows from ``challenge_rows(expired)`` for the active lists."""
+    steps = load_steps(ChallengeStep, ChallengeStep.challenge_id, [row.id for row in rows])
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'activities': steps.get(row.id, []),
+        'time_limit': row.time_limit,
+        'points_reward': row.points_reward,
+        'created_at': row.created_at.isoformat(),
+        'accepted': bool(row.accepted),
+        'expires_at': _isoformat(row.expires_at),
+        'expired': bool(row.expired)
+    } for row in rows]
+
+
+def completed_challenge_dicts(rows):
+    """Rows from ``challenge_rows()`` for the completed lists."""
+    steps = load_steps(ChallengeStep, ChallengeStep.challenge_id, [row.id for row in rows])
+    return [{
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'activities': steps.get(row.id, []),
+        'time_limit': row.time_limit,
+        'points_reward': row.points_reward,
+        'completed_at': _isoformat(row.completed_at)
+    } for row in rows]
@@ -0,0 +1,84 @@
+"""Cold-start timing.
+
+``create_app`` times each of its setup steps (and the import of the
+``wanderlust`` package before it) with a ``StartupTimer``, kept in
+``app.extensions['startup']`` and shown at ``/startup/stats``. With
+``STARTUP_PROFILE=1`` the breakdown is printed once the app is created.
+
+``flask profile-startup`` starts a fresh interpreter with ``-X importtime``
+and reports the slowest imports along with the steps.
+"""
+from contextlib import contextmanager
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+class StartupTimer:
+    def __init__(self):
+        self.steps = []
+        self.started = time.perf_counter()
+        self.total_ms = None
+
+    def add(self, name, elapsed_ms):
+        self.steps.append((name, round(elapsed_ms, 2)))
+
+    @contextmanager
+    def step(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def finish(self):
+        self.total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def report(self):
+        lines = [f"create_app: {self.total_ms} ms"]
+        for name, elapsed_ms in sorted(self.steps, key=lambda step: -step[1]):
+            lines.append(f"  {elapsed_ms:9.2f} ms  {name}")
+        return '\n'.join(lines)
+
+    def stats(self):
+        return {'create_app_ms': self.total_ms, 'steps': dict(self.steps)}
+
+
+def parse_importtime(output, top=20):
+    """The ``top`` modules by cumulative import time from ``-X importtime``
+    output, as ``(module, self_ms, cumulative_ms)``."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(modules, key=lambda module: -module[2])[:top]
+
+
+PROFILE_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from wanderlust import create_app
+imported = time.perf_counter()
+app = create_app()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'startup': app.extensions['startup'].stats()}))
+"""
+
+
+def profile_startup(top=20):
+    """Create the app in a fresh interpreter; returns the package import
+    time, the ``top`` slowest imports and the ``create_app`` timer."""
+    env = dict(os.environ, STARTUP_PROFILE='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROFILE_SCRIPT],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise Exception(f"Profiled startup failed: {result.stderr.strip()}")
+    profile = json.loads(result.stdout.strip().splitlines()[-1])
+
+    timer = StartupTimer()
+    timer.steps = list(profile['startup']['steps'].items())
+    timer.total_ms = profile['startup']['create_app_ms']
+    return profile['import_ms'], parse_importtime(result.stderr, top), timer
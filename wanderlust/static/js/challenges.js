@@ -2,9 +2,16 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize challenge features
     initializeChallenges();
     
-    // Update timers every minute
+    // Count down every minute; expiry itself is announced by the event stream
     updateTimers();
     setInterval(updateTimers, 60000);
+    document.addEventListener('push:challenge_expired', updateTimers);
+
+    // Challenges loaded by infinite scroll need their timers filled in
+    const activeGrid = document.querySelector('.active-challenges .challenges-grid');
+    if (activeGrid) {
+        activeGrid.addEventListener('items-loaded', updateTimers);
+    }
 });
 
 function initializeChallenges() {
@@ -41,15 +48,18 @@ function generateChallenge() {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.status === 'success') {
-            showAlert('success', 'New challenge generated!');
-            location.reload();
-        } else {
-            showAlert('error', data.message);
+        if (!data.success) {
+            throw new Error(data.error);
         }
+        // Pooled challenges come back immediately, live ones as a job
+        return data.job_id ? waitForJob(data.job_id) : data;
+    })
+    .then(() => {
+        showAlert('success', 'New challenge generated!');
+        location.reload();
     })
     .catch(error => {
-        showAlert('error', 'Failed to generate challenge');
+        showAlert('error', error.message || 'Failed to generate challenge');
     });
 }
 
@@ -120,12 +130,14 @@ function updateActivityUI(challengeId, activityIndex) {
 
 function updateTimers() {
     document.querySelectorAll('.challenge-timer').forEach(timer => {
+        if (!timer.dataset.endTime) return;
         const endTime = new Date(timer.dataset.endTime);
         const now = new Date();
         const timeLeft = endTime - now;
 
         if (timeLeft <= 0) {
-            timer.innerHTML = '<span class="expired">Expired</span>';
+            timer.querySelector('.time-remaining').textContent = 'Challenge ended';
+            timer.closest('.challenge-card').classList.add('expired');
         } else {
             const hours = Math.floor(timeLeft / (1000 * 60 * 60));
             const minutes = Math.floor((timeLeft % (1000 * 60 * 60)) / (1000 * 60));
@@ -16,8 +16,38 @@ document.addEventListener('DOMContentLoaded', function() {
     categoryButtons.forEach(button => {
         button.addEventListener('click', filterActivities);
     });
+
+    initInfiniteScroll();
+    initPushChannel();
 });
 
+// One server-sent event stream per page carries points changes, achievement
+// unlocks, challenge updates and finished jobs. Scripts listen for them as
+// 'push:<event>' on document instead of polling.
+const PUSH_EVENTS = ['points', 'achievement', 'challenge', 'challenge_completed', 'challenge_expired', 'job'];
+let pushChannel = null;
+
+function initPushChannel() {
+    const url = document.body.dataset.eventsUrl;
+    if (!url || !window.EventSource) return;
+
+    pushChannel = new EventSource(url);
+    PUSH_EVENTS.forEach(name => {
+        pushChannel.addEventListener(name, event => {
+            document.dispatchEvent(new CustomEvent(`push:${name}`, { detail: JSON.parse(event.data) }));
+        });
+    });
+
+    document.addEventListener('push:points', event => setPoints(event.detail.points));
+    document.addEventListener('push:achievement', event => {
+        showSuccess(`Achievement unlocked: ${event.detail.title} (+${event.detail.points} points)`);
+    });
+}
+
+function pushConnected() {
+    return pushChannel !== null && pushChannel.readyState === EventSource.OPEN;
+}
+
 async function generateActivity() {
     const category = document.querySelector('input[name="category"]:checked')?.value || 'random';
     const difficulty = document.querySelector('input[name="difficulty"]:checked')?.value || 'random';
@@ -98,18 +128,156 @@ function filterActivities(event) {
     });
 }
 
-function updatePoints() {
+// Generation requests that miss the warm pool are queued on the server; wait
+// for the job to finish and resolve with its result (e.g. { activity: {...} }).
+// The event stream announces the finished job; polling is only the fallback.
+function waitForJob(jobId, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        let timer = null;
+
+        function finish() {
+            document.removeEventListener('push:job', onPush);
+            clearTimeout(timer);
+        }
+
+        // Returns false while the job is still queued or running
+        function settle(job) {
+            if (job.status === 'done') {
+                resolve(job.result);
+            } else if (job.status === 'failed') {
+                reject(new Error(job.error || 'Generation failed'));
+            } else {
+                return false;
+            }
+            finish();
+            return true;
+        }
+
+        function onPush(event) {
+            if (event.detail.id === jobId) settle(event.detail);
+        }
+        document.addEventListener('push:job', onPush);
+
+        async function poll() {
+            try {
+                const response = await fetch(`/jobs/${jobId}`);
+                const data = await response.json();
+                if (!data.success) {
+                    finish();
+                    reject(new Error(data.error || 'Job not found'));
+                } else if (!settle(data.job)) {
+                    timer = setTimeout(poll, pushConnected() ? 15000 : interval);
+                }
+            } catch (error) {
+                finish();
+                reject(error);
+            }
+        }
+        poll();
+    });
+}
+
+// POST to a streaming generation endpoint and read its server-sent events.
+// onField({key, value, partial}) is called as the title/description arrive;
+// resolves with the final result (e.g. { quest: {...} }).
+async function streamGeneration(url, body, onField) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        },
+        body: body
+    });
+    if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'Failed to start generation');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            message.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) continue;
+
+            const payload = JSON.parse(data);
+            if (event === 'field' && onField) {
+                onField(payload);
+            } else if (event === 'done') {
+                return payload;
+            } else if (event === 'error') {
+                throw new Error(payload.error || 'Generation failed');
+            }
+        }
+    }
+    throw new Error('Generation stream ended unexpectedly');
+}
+
+// Lists render their first page on the server; each .infinite-scroll sentinel
+// fetches the next page of cards (data-url + ?cursor=) when it scrolls into
+// view and appends them to data-target. The server returns the cursor for
+// the page after that in the X-Next-Cursor header.
+function initInfiniteScroll() {
+    document.querySelectorAll('.infinite-scroll').forEach(sentinel => {
+        const target = document.querySelector(sentinel.dataset.target);
+        if (!target || !sentinel.dataset.next) return;
+
+        let loading = false;
+        const observer = new IntersectionObserver(async entries => {
+            if (!entries[0].isIntersecting || loading || !sentinel.dataset.next) return;
+            loading = true;
+            try {
+                const url = new URL(sentinel.dataset.url, window.location.origin);
+                url.searchParams.set('cursor', sentinel.dataset.next);
+                const response = await fetch(url);
+                if (!response.ok) throw new Error('Failed to load more items');
+
+                target.insertAdjacentHTML('beforeend', await response.text());
+                sentinel.dataset.next = response.headers.get('X-Next-Cursor') || '';
+                target.dispatchEvent(new CustomEvent('items-loaded'));
+                observer.unobserve(sentinel);
+                // Observing again re-checks visibility, so a short page keeps loading
+                if (sentinel.dataset.next) observer.observe(sentinel);
+            } catch (error) {
+                console.error('Error loading more items:', error);
+            } finally {
+                loading = false;
+            }
+        }, { rootMargin: '200px' });
+        observer.observe(sentinel);
+    });
+}
+
+function setPoints(points) {
     const pointsElement = document.getElementById('user-points');
     if (pointsElement) {
-        fetch('/get_points')
-            .then(response => response.json())
-            .then(data => {
-                pointsElement.textContent = data.points;
-            })
-            .catch(error => console.error('Error updating points:', error));
+        pointsElement.textContent = points;
     }
 }
 
+function updatePoints() {
+    // The event stream delivers the new balance by itself
+    if (pushConnected() || !document.getElementById('user-points')) return;
+    fetch('/get_points')
+        .then(response => response.json())
+        .then(data => setPoints(data.points))
+        .catch(error => console.error('Error updating points:', error));
+}
+
 function showSuccess(message) {
     const toast = document.createElement('div');
     toast.className = 'toast success fade-in';
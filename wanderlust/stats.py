@@ -0,0 +1,189 @@
+"""Incrementally maintained per-user statistics.
+
+``bump_stats`` applies counter deltas with a single atomic UPDATE inside the
+caller's transaction, so the ``user_stats`` row always commits together with
+the completion or generation that changed it. ``rebuild_user_stats``
+recomputes the counters from the source tables to verify or repair them,
+and the streaks from the days with a recorded completion time. Completions
+from before ``completed_at`` was recorded count toward the counters but not
+the streaks.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select, union
+from . import db
+from .models import Activity, Quest, Achievement, Challenge, User, UserStats
+
+ACTIVITY_POINTS = {
+    'easy': 10,
+    'medium': 25,
+    'hard': 50
+}
+
+QUEST_POINTS = {
+    'easy': 100,
+    'medium': 200,
+    'hard': 300
+}
+
+COUNTERS = [
+    'completed_activities', 'active_quests', 'completed_quests',
+    'active_challenges', 'completed_challenges',
+    'activity_points', 'quest_points', 'challenge_points', 'achievement_points'
+]
+
+STREAKS = ['current_streak', 'longest_streak', 'last_active_on']
+
+
+def empty_stats():
+    return dict(dict.fromkeys(COUNTERS, 0), current_streak=0, longest_streak=0, last_active_on=None)
+
+
+def bump_stats(user_id, **deltas):
+    """Add ``deltas`` (e.g. ``completed_activities=1``) to the user's counters.
+
+    If the user has no stats row yet, pending changes are flushed and the row
+    is computed from the source tables instead, which already includes them.
+    """
+    table = UserStats.__table__
+    values = {name: table.c[name] + delta for name, delta in deltas.items()}
+    values['updated_at'] = datetime.utcnow()
+    updated = db.session.execute(table.update().where(table.c.user_id == user_id).values(**values)).rowcount
+    if not updated:
+        db.session.flush()
+        _insert_computed(user_id)
+
+
+def touch_streak(user_id, today=None):
+    """Extend (or restart) the user's daily completion streak.
+
+    Call after ``bump_stats`` so the stats row exists.
+    """
+    table = UserStats.__table__
+    today = today or datetime.utcnow().date()
+    streak = case(
+        (table.c.last_active_on == today, table.c.current_streak),
+        (table.c.last_active_on == today - timedelta(days=1), table.c.current_streak + 1),
+        else_=1)
+    db.session.execute(table.update().where(table.c.user_id == user_id).values(
+        current_streak=streak,
+        longest_streak=case((streak > table.c.longest_streak, streak), else_=table.c.longest_streak),
+        last_active_on=today))
+
+
+def get_stats(user_id):
+    """Return the user's stats row, creating it from the source tables if needed."""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        _insert_computed(user_id)
+        db.session.commit()
+        stats = db.session.get(UserStats, user_id)
+    return stats
+
+
+def activity_points_sql():
+    """SQL expression for the points an activity is worth (see ``ACTIVITY_POINTS``)."""
+    return case(
+        *[(func.lower(Activity.difficulty) == difficulty, points) for difficulty, points in ACTIVITY_POINTS.items()],
+        else_=ACTIVITY_POINTS['easy'])
+
+
+def longest_run(days):
+    """Longest run of consecutive dates and the run ending at the last one."""
+    longest = current = 0
+    previous = None
+    for day in sorted(days):
+        current = current + 1 if previous is not None and day == previous + timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return longest, current
+
+
+def compute_stats(user_ids=None):
+    """Recompute counters and streaks from the source tables; returns
+    ``{user_id: {...}}``."""
+    results = {}
+
+    def collect(query, model, *names):
+        if user_ids is not None:
+            query = query.filter(model.user_id.in_(user_ids))
+        for row in query.group_by(model.user_id):
+            counters = results.setdefault(row[0], empty_stats())
+            for name, value in zip(names, row[1:]):
+                counters[name] = int(value or 0)
+
+    collect(db.session.query(Activity.user_id, func.count(Activity.id), func.sum(activity_points_sql()))
+            .filter(Activity.completed == True), Activity,
+            'completed_activities', 'activity_points')
+    collect(db.session.query(Quest.user_id,
+                             func.count(Quest.id) - func.count(Quest.completed_at),
+                             func.count(Quest.completed_at),
+                             func.sum(case((Quest.completed_at.isnot(None), Quest.points), else_=0))), Quest,
+            'active_quests', 'completed_quests', 'quest_points')
+    collect(db.session.query(Challenge.user_id,
+                             func.sum(case((Challenge.completed == True, 0), else_=1)),
+                             func.sum(case((Challenge.completed == True, 1), else_=0)),
+                             func.sum(case((Challenge.completed == True, Challenge.points_reward), else_=0))), Challenge,
+            'active_challenges', 'completed_challenges', 'challenge_points')
+    collect(db.session.query(Achievement.user_id, func.sum(Achievement.points_value)), Achievement,
+            'achievement_points')
+
+    # Streaks count days with a completion, the same days touch_streak sees
+    selects = []
+    for model, completed in ((Activity, Activity.completed == True), (Quest, Quest.completed_at.isnot(None)),
+                             (Challenge, Challenge.completed == True)):
+        select_days = select(model.user_id, func.date(model.completed_at, type_=db.Date)).where(
+            completed, model.completed_at.isnot(None))
+        if user_ids is not None:
+            select_days = select_days.where(model.user_id.in_(user_ids))
+        selects.append(select_days)
+    days = {}
+    for user_id, day in db.session.execute(union(*selects)):
+        days.setdefault(user_id, set()).add(day)
+    for user_id, active in days.items():
+        longest, current = longest_run(active)
+        results.setdefault(user_id, empty_stats()).update(
+            current_streak=current, longest_streak=longest, last_active_on=max(active))
+    return results
+
+
+def rebuild_user_stats(chunk_size=1000, dry_run=False):
+    """Recompute every user's stats from the source tables, chunk by chunk.
+
+    Returns ``(users_checked, users_repaired)``; with ``dry_run`` the
+    mismatches are only counted.
+    """
+    checked = repaired = 0
+    last_id = 0
+    while True:
+        user_ids = [row[0] for row in db.session.query(User.id).filter(User.id > last_id)
+                    .order_by(User.id).limit(chunk_size)]
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        computed = compute_stats(user_ids)
+        existing = {stats.user_id: stats for stats in UserStats.query.filter(UserStats.user_id.in_(user_ids))}
+        for user_id in user_ids:
+            expected = computed.get(user_id, empty_stats())
+            stats = existing.get(user_id)
+            checked += 1
+            if stats is not None and all(getattr(stats, name) == expected[name] for name in COUNTERS + STREAKS):
+                continue
+            repaired += 1
+            if dry_run:
+                continue
+            if stats is None:
+                stats = UserStats(user_id=user_id)
+                db.session.add(stats)
+            for name in COUNTERS + STREAKS:
+                setattr(stats, name, expected[name])
+            stats.updated_at = datetime.utcnow()
+        if not dry_run:
+            db.session.commit()
+    return checked, repaired
+
+
+def _insert_computed(user_id):
+    counters = compute_stats([user_id]).get(user_id, empty_stats())
+    db.session.execute(UserStats.__table__.insert().values(
+        user_id=user_id, updated_at=datetime.utcnow(), **counters))
@@ -0,0 +1,45 @@
+"""Completion of challenge and quest steps.
+
+Steps are rows (``ChallengeStep``, ``QuestStep``) keyed by parent and
+position, and each parent keeps ``steps_total`` / ``steps_completed``
+counters. Completing a step is one conditional ``UPDATE`` of that row plus
+an increment of the counter, so the parent is complete when the returned
+count reaches ``steps_total``; no step list is read or rewritten.
+"""
+from datetime import datetime
+from sqlalchemy.orm.attributes import set_committed_value
+from . import db
+from .models import Challenge, ChallengeStep, Quest, QuestStep
+from .versioning import bump_user_versions
+
+# Parent model -> (step model, foreign key column)
+STEP_MODELS = {
+    Challenge: (ChallengeStep, 'challenge_id'),
+    Quest: (QuestStep, 'quest_id'),
+}
+
+
+def complete_step(parent, position, when=None):
+    """Mark step ``position`` of ``parent`` completed; the caller commits.
+
+    Returns the parent's new ``steps_completed``, or None if there is no
+    such step or it was already completed.
+    """
+    step_model, parent_key = STEP_MODELS[type(parent)]
+    steps = step_model.__table__
+    result = db.session.execute(steps.update().where(
+        steps.c[parent_key] == parent.id,
+        steps.c.position == position,
+        steps.c.completed_at.is_(None)
+    ).values(completed_at=when or datetime.utcnow()))
+    if result.rowcount != 1:
+        return None
+
+    parents = type(parent).__table__
+    completed = db.session.execute(parents.update().where(parents.c.id == parent.id).values(
+        steps_completed=parents.c.steps_completed + 1).returning(parents.c.steps_completed)).scalar()
+    set_committed_value(parent, 'steps_completed', completed)
+    # Neither write goes through the ORM, so bump the list views' version here
+    bump_user_versions(db.session, [parent.user_id])
+    return completed
+
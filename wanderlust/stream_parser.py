@@ -0,0 +1,88 @@
+"""Incremental extraction of top-level string fields from streamed JSON.
+
+The model streams a JSON object a few characters at a time. ``FieldStreamParser``
+scans the text once, tracking nesting and string state, and reports the
+top-level string values (``title``, ``description``, ...) while they are still
+being written, so they can be shown before the object is complete.
+"""
+import json
+
+
+class FieldStreamParser:
+    def __init__(self, fields=None):
+        self.fields = set(fields) if fields else None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        self.buffer = []
+        self.last_key = None
+        self.expecting_value = False
+        self.current_field = None
+        self.values = {}
+
+    def feed(self, chunk):
+        """Consume more text and return a list of ``{'key', 'value', 'partial'}``
+        updates for the watched top-level string fields."""
+        updates = []
+        for char in chunk:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    self.buffer.append(char)
+                elif char == '\\':
+                    self.escape = True
+                    self.buffer.append(char)
+                elif char == '"':
+                    self.in_string = False
+                    text = _decode(''.join(self.buffer))
+                    if self.string_is_key:
+                        self.last_key = text
+                    elif self.current_field:
+                        self.values[self.current_field] = text
+                        updates.append({'key': self.current_field, 'value': text, 'partial': False})
+                        self.current_field = None
+                else:
+                    self.buffer.append(char)
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.buffer = []
+                self.string_is_key = self.depth == 1 and not self.expecting_value
+                if self.depth == 1 and self.expecting_value and self._watched(self.last_key):
+                    self.current_field = self.last_key
+                self.expecting_value = False
+            elif char in '{[':
+                self.depth += 1
+                self.expecting_value = False
+            elif char in '}]':
+                self.depth -= 1
+            elif char == ':' and self.depth == 1:
+                self.expecting_value = True
+            elif char == ',' and self.depth == 1:
+                self.expecting_value = False
+            elif not char.isspace():
+                self.expecting_value = False
+
+        # Report how far the field currently being written has got
+        if self.in_string and self.current_field and self.buffer:
+            partial = _decode(''.join(self.buffer), partial=True)
+            if partial:
+                updates.append({'key': self.current_field, 'value': partial, 'partial': True})
+        return updates
+
+    def _watched(self, key):
+        return key is not None and (self.fields is None or key in self.fields)
+
+
+def _decode(raw, partial=False):
+    if partial:
+        # Drop a trailing escape sequence that has not fully arrived yet
+        cut = raw.rfind('\\')
+        if cut != -1 and (len(raw) - cut < 2 or (raw[cut + 1] == 'u' and len(raw) - cut < 6)):
+            raw = raw[:cut]
+    try:
+        return json.loads('"' + raw + '"')
+    except ValueError:
+        return raw
@@ -0,0 +1,253 @@
+"""Synthetic data for benchmarks and query-plan checks at scale.
+
+``generate`` bulk-loads users with power-law (Pareto) numbers of
+activities, quests and challenges (with their step rows). Each user also
+gets the points ledger rows, the ``user_stats`` row and the achievements
+that their data implies, so the balances pass ``reconcile-points`` and ``repair-stats`` unchanged. Ids are
+assigned up front, so a parent and its step rows go out in the same
+batched ``executemany``, with no round trip for each row. Each chunk of
+users is one transaction with autoflush off. The same seed, user count
+and end date always produce the same rows, apart from the password salt.
+Every synthetic user logs in as ``synthetic<id>`` with ``password``.
+"""
+from datetime import datetime, time, timedelta
+import random
+from flask import current_app
+from sqlalchemy import func
+from werkzeug.security import generate_password_hash
+from . import db
+from .achievements import RULES, due_rules
+from .models import (Activity, Achievement, Challenge, ChallengeStep, PointsLedger, Quest, QuestStep, User,
+                     UserStats)
+from .stats import ACTIVITY_POINTS, QUEST_POINTS, longest_run
+
+CATEGORIES = ['food', 'culture', 'adventure']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+PLACES = ['Colaba', 'Bandra', 'Fort', 'Juhu', 'Dadar', 'Andheri', 'Worli', 'Matunga', 'Girgaon', 'Powai']
+# Pareto shape: most users have a handful of rows, a few have hundreds
+ALPHA = 1.5
+# Users are created over this many days before the end date
+SPAN_DAYS = 365
+# Order of insertion, parents before the rows that reference them
+TABLES = [User, Activity, Quest, QuestStep, Challenge, ChallengeStep, Achievement, PointsLedger, UserStats]
+
+
+def power_law(rng, mean, cap):
+    """A Pareto-distributed count with roughly the given mean."""
+    if mean <= 0:
+        return 0
+    scale = mean * (ALPHA - 1) / ALPHA
+    return min(cap, int(scale * rng.paretovariate(ALPHA)))
+
+
+class Generator:
+    def __init__(self, seed=0, end=None, mean_activities=20, mean_quests=5, mean_challenges=5, max_per_user=2000):
+        self.rng = random.Random(seed)
+        self.end = end or datetime.combine(datetime.utcnow().date(), time())
+        self.means = (mean_activities, mean_quests, mean_challenges)
+        self.max_per_user = max_per_user
+        self.password_hash = generate_password_hash('password')
+        self.next_ids = {model: (db.session.query(func.max(model.id)).scalar() or 0) + 1
+                         for model in TABLES if model is not UserStats}
+
+    def new_id(self, model):
+        self.next_ids[model] += 1
+        return self.next_ids[model] - 1
+
+    def moment(self, start, end):
+        return start + timedelta(seconds=self.rng.randint(0, max(0, int((end - start).total_seconds()))))
+
+    def user(self, rows):
+        """Append one user and everything they own to ``rows`` (table -> list)."""
+        rng = self.rng
+        user_id = self.new_id(User)
+        joined = self.end - timedelta(seconds=rng.randint(0, SPAN_DAYS * 86400))
+        ledger = []
+        counters = dict.fromkeys(['completed_activities', 'active_quests', 'completed_quests', 'active_challenges',
+                                  'completed_challenges', 'activity_points', 'quest_points', 'challenge_points',
+                                  'achievement_points'], 0)
+        days = set()
+        counts = [power_law(rng, mean, self.max_per_user) for mean in self.means]
+
+        for _ in range(counts[0]):
+            activity_id = self.new_id(Activity)
+            category, difficulty = rng.choice(CATEGORIES), rng.choice(DIFFICULTIES)
+            created = self.moment(joined, self.end)
+            completed_at = None
+            if rng.random() < 0.6:
+                completed_at = min(self.end, created + timedelta(minutes=rng.randint(30, 2880)))
+                points = ACTIVITY_POINTS[difficulty]
+                ledger.append(('activity', activity_id, points, completed_at))
+                counters['completed_activities'] += 1
+                counters['activity_points'] += points
+                days.add(completed_at.date())
+            place = rng.choice(PLACES)
+            rows[Activity].append({
+                'id': activity_id, 'user_id': user_id, 'title': f"{category.title()} walk in {place}",
+                'description': f"A {difficulty} {category} outing around {place}.", 'category': category,
+                'difficulty': difficulty, 'duration': rng.choice([30, 45, 60, 90, 120]),
+                'location': f"{place}, Mumbai", 'completed': completed_at is not None,
+                'completed_at': completed_at, 'created_at': created})
+
+        for _ in range(counts[1]):
+            quest_id = self.new_id(Quest)
+            difficulty = rng.choice(DIFFICULTIES)
+            created = self.moment(joined, self.end)
+            steps = rng.randint(3, 5)
+            done = steps if rng.random() < 0.4 else rng.randint(0, steps - 1)
+            completed_at = min(self.end, created + timedelta(minutes=rng.randint(60, 10080))) if done == steps else None
+            points = QUEST_POINTS[difficulty] if completed_at else 0
+            for position in range(steps):
+                rows[QuestStep].append({
+                    'id': self.new_id(QuestStep), 'quest_id': quest_id, 'position': position,
+                    'title': f"Step {position + 1}", 'description': 'Find the landmark and take a photo.',
+                    'time_limit': None, 'points': None,
+                    'completed_at': (completed_at or created) if position < done else None})
+            if completed_at:
+                ledger.append(('quest', quest_id, points, completed_at))
+                counters['completed_quests'] += 1
+                counters['quest_points'] += points
+                days.add(completed_at.date())
+            else:
+                counters['active_quests'] += 1
+            rows[Quest].append({
+                'id': quest_id, 'user_id': user_id, 'title': f"Quest of {rng.choice(PLACES)}",
+                'description': f"A {difficulty} trail in several steps.", 'difficulty': difficulty,
+                'duration': rng.choice([90, 150, 210]), 'created_at': created, 'completed_at': completed_at,
+                'points': points, 'steps_total': steps, 'steps_completed': done})
+
+        for _ in range(counts[2]):
+            challenge_id = self.new_id(Challenge)
+            created = self.moment(joined, self.end)
+            limits = [rng.choice([15, 30, 45]) for _ in range(rng.randint(3, 6))]
+            rewards = [rng.choice([10, 20, 30]) for _ in limits]
+            time_limit, reward = sum(limits), sum(rewards)
+            roll = rng.random()
+            accepted_at = created + timedelta(minutes=rng.randint(1, 600)) if roll < 0.7 else None
+            if accepted_at and accepted_at > self.end:
+                accepted_at = created
+            expires_at = (accepted_at or created) + timedelta(minutes=time_limit)
+            completed_at = None
+            done = 0
+            if roll < 0.4:
+                done = len(limits)
+                completed_at = accepted_at + timedelta(minutes=rng.randint(1, time_limit))
+                if completed_at > self.end:
+                    completed_at = accepted_at
+            elif accepted_at:
+                done = rng.randint(0, len(limits) - 1)
+            for position, (limit, points) in enumerate(zip(limits, rewards)):
+                rows[ChallengeStep].append({
+                    'id': self.new_id(ChallengeStep), 'challenge_id': challenge_id, 'position': position,
+                    'title': None, 'description': f"Task {position + 1}: ask a local about the area.",
+                    'time_limit': limit, 'points': points,
+                    'completed_at': (completed_at or accepted_at) if position < done else None})
+            if completed_at:
+                ledger.append(('challenge', challenge_id, reward, completed_at))
+                counters['completed_challenges'] += 1
+                counters['challenge_points'] += reward
+                days.add(completed_at.date())
+            else:
+                counters['active_challenges'] += 1
+            rows[Challenge].append({
+                'id': challenge_id, 'user_id': user_id, 'title': f"{rng.choice(PLACES)} dash",
+                'description': 'Beat the clock through the neighbourhood.', 'time_limit': time_limit,
+                'points_reward': reward, 'completed': completed_at is not None, 'completed_at': completed_at,
+                'created_at': created, 'steps_total': len(limits), 'steps_completed': done,
+                'accepted': accepted_at is not None, 'accepted_at': accepted_at, 'expires_at': expires_at,
+                # Pending challenges past their deadline are already expired
+                'expired_at': expires_at if completed_at is None and expires_at <= self.end else None})
+
+        longest_streak, current_streak = longest_run(days)
+        points = sum(entry[2] for entry in ledger)
+        metrics = {'activities': counters['completed_activities'], 'quests': counters['completed_quests'],
+                   'challenges': counters['completed_challenges'], 'points': points, 'streak': longest_streak}
+        unlocked = set()
+        # Achievement points can unlock the points rule, so repeat until nothing new is due
+        while True:
+            due = due_rules(RULES, metrics, unlocked)
+            if not due:
+                break
+            for rule in due:
+                achievement_id = self.new_id(Achievement)
+                unlocked.add(rule['title'])
+                unlocked_at = max([entry[3] for entry in ledger] or [joined])
+                rows[Achievement].append({
+                    'id': achievement_id, 'user_id': user_id, 'title': rule['title'],
+                    'description': rule['description'], 'badge_image': None, 'points_value': rule['points'],
+                    'unlocked_at': unlocked_at})
+                ledger.append(('achievement', achievement_id, rule['points'], unlocked_at))
+                counters['achievement_points'] += rule['points']
+                metrics['points'] += rule['points']
+
+        for source_type, source_id, delta, created in ledger:
+            rows[PointsLedger].append({'id': self.new_id(PointsLedger), 'user_id': user_id, 'source_type': source_type,
+                                       'source_id': source_id, 'delta': delta, 'created_at': created})
+        rows[UserStats].append(dict(counters, user_id=user_id, current_streak=current_streak,
+                                    longest_streak=longest_streak, last_active_on=max(days) if days else None,
+                                    updated_at=self.end))
+        rows[User].append({
+            'id': user_id, 'username': f"synthetic{user_id}", 'email': f"synthetic{user_id}@example.com",
+            'password_hash': self.password_hash, 'points': metrics['points'], 'email_notifications': True,
+            'push_notifications': True, 'created_at': joined, 'data_version': 0, 'data_updated_at': None})
+
+
+def bulk_insert(model, rows):
+    """``executemany`` the rows on the DB-API cursor.
+
+    Skips SQLAlchemy's per-row parameter processing, which costs more than
+    the inserts themselves. On SQLite, dates are written in the text format
+    SQLAlchemy uses.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    table = model.__table__
+    keys = list(rows[0])
+    compiled = table.insert().compile(dialect=dialect, column_keys=keys)
+    if dialect.positional:
+        keys = list(compiled.positiontup)
+    dates = set()
+    if dialect.name == 'sqlite':
+        dates = {index for index, key in enumerate(keys)
+                 if isinstance(table.c[key].type, (db.DateTime, db.Date))}
+    params = []
+    for row in rows:
+        values = [row[key] for key in keys]
+        for index in dates:
+            if values[index] is not None:
+                values[index] = values[index].isoformat(' ', 'microseconds') \
+                    if isinstance(values[index], datetime) else values[index].isoformat()
+        params.append(tuple(values) if dialect.positional else dict(zip(keys, values)))
+    connection.exec_driver_sql(str(compiled), params)
+
+
+def generate(users, seed=0, chunk_size=1000, end=None, progress=None, **means):
+    """Insert ``users`` synthetic users and their data; returns rows per table.
+
+    ``means`` sets ``mean_activities``, ``mean_quests``, ``mean_challenges``
+    and ``max_per_user``. ``progress`` is called with the users and rows
+    written so far after each chunk.
+    """
+    generator = Generator(seed, end, **means)
+    totals = {model.__tablename__: 0 for model in TABLES}
+    done = 0
+    with db.session.no_autoflush:
+        while done < users:
+            count = min(chunk_size, users - done)
+            rows = {model: [] for model in TABLES}
+            for _ in range(count):
+                generator.user(rows)
+            try:
+                for model in TABLES:
+                    if rows[model]:
+                        bulk_insert(model, rows[model])
+                        totals[model.__tablename__] += len(rows[model])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                current_app.logger.exception(f"Error generating synthetic data after {done} users")
+                raise
+            done += count
+            if progress:
+                progress(done, sum(totals.values()))
+    return totals
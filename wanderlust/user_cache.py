@@ -0,0 +1,133 @@
+"""Cached identity for authenticated requests.
+
+``UserCache.load`` is the Flask-Login user loader. It returns a
+``UserSnapshot`` built from a small in-process TTL/LRU cache of user fields,
+so requests that only need ``current_user.id`` (or the name and points shown
+in a template) never query the user table. Entries are dropped when a
+committed transaction bumps the user's change version, which covers points
+awards and settings updates. Anything else is read from the full ``User``
+row on first access.
+"""
+from collections import OrderedDict
+import os
+import threading
+import time
+from flask_login import UserMixin
+from sqlalchemy import event
+
+FIELDS = ('id', 'username', 'email', 'points', 'email_notifications', 'push_notifications',
+          'created_at', 'data_version', 'data_updated_at')
+
+
+class UserSnapshot(UserMixin):
+    """Read-only view of a user for one request. Assign to ``record()`` (the
+    ORM row) to change anything."""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+        self._record = None
+
+    def record(self):
+        """The full ``User`` row, loaded on first use."""
+        if self._record is None:
+            from . import db
+            from .models import User
+            self._record = db.session.get(User, self.id)
+        return self._record
+
+    def __getattr__(self, name):
+        # Only called for attributes not in the snapshot (password_hash,
+        # relationships, ...)
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.record(), name)
+
+
+class UserCache:
+    def __init__(self, app=None):
+        self.app = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0, 'evictions': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_TTL', float(os.getenv('USER_CACHE_TTL', 30)))
+        app.config.setdefault('USER_CACHE_SIZE', int(os.getenv('USER_CACHE_SIZE', 10000)))
+        self.app = app
+        app.extensions['user_cache'] = self
+
+        from . import db
+        if not event.contains(db.session, 'after_commit', invalidate_committed):
+            event.listen(db.session, 'after_commit', invalidate_committed)
+            event.listen(db.session, 'after_soft_rollback', discard_changed)
+
+    def load(self, user_id):
+        """Flask-Login user loader: a snapshot from cache, else from the DB."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        ttl = self.app.config['USER_CACHE_TTL']
+        now = time.monotonic()
+        if ttl > 0:
+            with self.lock:
+                entry = self.entries.get(user_id)
+                if entry is not None:
+                    if entry[0] > now:
+                        self.entries.move_to_end(user_id)
+                        self.counters['hits'] += 1
+                        return UserSnapshot(entry[1])
+                    del self.entries[user_id]
+                    self.counters['expired'] += 1
+        self.counters['misses'] += 1
+
+        from . import db
+        from .models import User
+        row = db.session.query(*[getattr(User, name) for name in FIELDS]).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        fields = dict(zip(FIELDS, row))
+        if ttl > 0:
+            self._remember(user_id, fields, now + ttl)
+        return UserSnapshot(fields)
+
+    def invalidate(self, *user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                if self.entries.pop(user_id, None) is not None:
+                    self.counters['invalidations'] += 1
+
+    def stats(self):
+        lookups = self.counters['hits'] + self.counters['misses']
+        return dict(
+            self.counters,
+            entries=len(self.entries),
+            hit_rate=round(self.counters['hits'] / lookups, 3) if lookups else None,
+            ttl=self.app.config['USER_CACHE_TTL'] if self.app else 0
+        )
+
+    def _remember(self, user_id, fields, expires):
+        with self.lock:
+            self.entries[user_id] = (expires, fields)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.app.config['USER_CACHE_SIZE']:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+
+def invalidate_committed(session):
+    """``after_commit`` hook: drop users (and their cached page fragments)
+    whose change version was bumped."""
+    from . import fragment_cache, user_cache
+
+    user_ids = session.info.pop('changed_user_ids', None)
+    if user_ids:
+        user_cache.invalidate(*user_ids)
+        fragment_cache.invalidate(*user_ids)
+
+
+def discard_changed(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('changed_user_ids', None)
@@ -0,0 +1,164 @@
+"""Per-user change versions and conditional responses.
+
+Every flush that adds, changes or deletes a user's activities, quests,
+challenges, achievements or points ledger rows, or changes the user row
+itself (settings), bumps ``User.data_version``. List views wrapped with
+``ChangeTracker.conditional`` send an ETag built from that version, so a
+revalidation whose ``If-None-Match`` still matches gets a 304 before the view
+runs its list query or renders anything.
+
+The version is read from the ``user`` row, not from the cached user, so
+it is never stale. The same query reads the user's next pending challenge
+deadline. Challenge lists compute ``expired`` from the clock, so a passed
+deadline has to change the tag even before the expiry thread marks the
+challenge and bumps the version.
+"""
+from datetime import datetime, timezone
+from functools import wraps
+import hashlib
+import os
+import threading
+from flask import make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, func
+
+
+class ChangeTracker:
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.Lock()
+        self.counters = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ETAG_SALT', os.getenv('ETAG_SALT', ''))
+        self.app = app
+        app.extensions['change_tracker'] = self
+
+        from . import db
+        if not event.contains(db.session, 'after_flush', bump_versions):
+            event.listen(db.session, 'after_flush', bump_versions)
+
+    def conditional(self, view):
+        """Serve ``view`` with a version-based ETag and Last-Modified, and
+        answer matching revalidations with 304 without calling it."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Flashed messages make a page one-off, so never validate those
+            if not current_user.is_authenticated or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            version, last_modified, next_deadline = self.validators(current_user.id)
+            etag = self.etag(current_user.id, version, next_deadline)
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+
+            if self._is_fresh(etag, last_modified):
+                self._count(request.endpoint, 'not_modified')
+                response = make_response('', 304)
+            else:
+                self._count(request.endpoint, 'full')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+
+    def validators(self, user_id):
+        """The user's ``data_version``, a Last-Modified time and their next
+        pending challenge deadline, in one query.
+
+        Last-Modified is the later of the last write and the latest deadline
+        that has passed without the challenge being marked expired yet.
+        """
+        from . import db
+        from .models import Challenge, User
+
+        now = datetime.utcnow()
+        pending = db.session.query(Challenge.expires_at).filter(
+            Challenge.user_id == user_id, Challenge.completed == False, Challenge.expired_at.is_(None))
+        next_deadline = pending.filter(Challenge.expires_at > now) \
+            .with_entities(func.min(Challenge.expires_at)).scalar_subquery()
+        passed_deadline = pending.filter(Challenge.expires_at <= now) \
+            .with_entities(func.max(Challenge.expires_at)).scalar_subquery()
+        row = db.session.query(User.data_version, User.data_updated_at, next_deadline, passed_deadline) \
+            .filter(User.id == user_id).first()
+        if row is None:
+            return 0, None, None
+        version, updated_at, next_at, passed_at = row
+        last_modified = max([moment for moment in (updated_at, passed_at) if moment is not None], default=None)
+        return version or 0, last_modified, next_at
+
+    def etag(self, user_id, version, next_deadline=None):
+        # The URL is part of the tag since each page or cursor is its own body.
+        # sha256 rather than hash(), which differs between processes
+        variant = hashlib.sha256((self.app.config['ETAG_SALT'] + request.full_path).encode('utf-8')).hexdigest()[:16]
+        deadline = next_deadline.strftime('%Y%m%d%H%M%S') if next_deadline else '0'
+        return f"{user_id}-{version}-{deadline}-{variant}"
+
+    def stats(self):
+        with self.lock:
+            endpoints = {endpoint: dict(counts) for endpoint, counts in self.counters.items()}
+        total = sum(counts['full'] + counts['not_modified'] for counts in endpoints.values())
+        not_modified = sum(counts['not_modified'] for counts in endpoints.values())
+        for counts in endpoints.values():
+            requests = counts['full'] + counts['not_modified']
+            counts['hit_rate'] = round(counts['not_modified'] / requests, 3) if requests else None
+        return {
+            'requests': total,
+            'not_modified': not_modified,
+            'hit_rate': round(not_modified / total, 3) if total else None,
+            'endpoints': endpoints
+        }
+
+    def _is_fresh(self, etag, last_modified):
+        if request.if_none_match:
+            # contains() only matches strong tags
+            return request.if_none_match.contains(etag)
+        if request.if_modified_since and last_modified is not None:
+            return last_modified <= request.if_modified_since
+        return False
+
+    def _count(self, endpoint, outcome):
+        with self.lock:
+            counts = self.counters.setdefault(endpoint, {'full': 0, 'not_modified': 0})
+            counts[outcome] += 1
+
+
+def changed_user_ids(session):
+    """Users whose data is touched by the objects pending in ``session``."""
+    from .models import Achievement, Activity, Challenge, PointsLedger, Quest, User
+
+    user_ids = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Activity, Quest, Challenge, Achievement, PointsLedger)):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and obj in session.dirty and session.is_modified(obj):
+            user_ids.add(obj.id)
+    user_ids.discard(None)
+    return user_ids
+
+
+def bump_versions(session, flush_context):
+    """``after_flush`` hook: bump ``data_version`` for every user whose data
+    was just written, in the same transaction."""
+    user_ids = changed_user_ids(session)
+    if user_ids:
+        bump_user_versions(session, user_ids)
+
+
+def bump_user_versions(session, user_ids):
+    """Bump ``data_version`` for ``user_ids`` in the session's transaction;
+    for writes that bypass the ORM, which ``bump_versions`` can't see."""
+    from .models import User
+
+    # Cached snapshots of these users go stale once this commits
+    session.info.setdefault('changed_user_ids', set()).update(user_ids)
+    table = User.__table__
+    session.connection().execute(table.update().where(table.c.id.in_(user_ids)).values(
+        data_version=table.c.data_version + 1, data_updated_at=datetime.utcnow()))